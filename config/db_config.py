@@ -20,6 +20,10 @@ class DBConfig:
     PASSWORD = os.getenv('DB_PASSWORD','QWER4321')
     CHARSET = os.getenv('DB_CHARSET', 'utf8mb4')
     
+    # 连接池配置（config/db_pool.py）
+    POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+    POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', '30'))
+    
     @classmethod
     def get_connection_params(cls):
         """
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据库连接池模块
+基于 DBConfig 的MySQL连接池：每个线程/任务取出一个独立的连接，用完归还；
+空闲一段时间的连接在取出时先 ping（服务端超时断开后自动重连），连接总数不超过上限
+"""
+
+import threading
+import time
+from collections import deque
+
+import pymysql
+
+from config.db_config import DBConfig
+
+
+# 连接已失效的错误，出现后连接不再放回连接池
+CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+
+class PooledConnection:
+    """
+    从连接池取出的连接：用法与 pymysql 连接相同，close() 或退出 with 语句时归还连接池
+    """
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        if self._connection is None:
+            raise pymysql.err.InterfaceError("连接已归还连接池")
+        return getattr(self._connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 连接类错误说明连接可能已断开，直接丢弃
+        self._release(discard=exc_type is not None and issubclass(exc_type, CONNECTION_ERRORS))
+        return False
+
+    def __del__(self):
+        # 忘记归还的连接在回收时关闭并释放名额
+        try:
+            self._release(discard=True)
+        except Exception:
+            pass
+
+    def _release(self, discard=False):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self._pool.release(connection, discard=discard)
+
+    def close(self):
+        """归还连接池"""
+        self._release()
+
+
+class ConnectionPool:
+    """MySQL连接池"""
+
+    def __init__(self, max_size=None, ping_interval=None, acquire_timeout=30, connect=None, **connect_params):
+        """
+        初始化连接池（连接在第一次使用时创建）
+
+        Args:
+            max_size: 最大连接数，默认 DBConfig.POOL_SIZE
+            ping_interval: 连接空闲超过该秒数后，取出时先 ping 检查，默认 DBConfig.POOL_PING_INTERVAL
+            acquire_timeout: 连接全部被占用时等待的秒数，超时抛出 TimeoutError
+            connect: 创建连接的函数，默认 pymysql.connect
+            **connect_params: 覆盖 DBConfig 中的连接参数
+        """
+        self.max_size = max_size or DBConfig.POOL_SIZE
+        self.ping_interval = DBConfig.POOL_PING_INTERVAL if ping_interval is None else ping_interval
+        self.acquire_timeout = acquire_timeout
+        self._connect = connect or pymysql.connect
+        self.params = DBConfig.get_connection_params()
+        # 默认返回字典行；自动提交，避免长期复用的连接一直读取同一个事务快照
+        self.params.update(cursorclass=pymysql.cursors.DictCursor, autocommit=True, connect_timeout=10)
+        self.params.update(connect_params)
+
+        self._idle = deque()  # (连接, 归还时间)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._closed = False
+
+    def connection(self):
+        """
+        取出一个连接
+
+        Returns:
+            PooledConnection: 连接，close() 或退出 with 语句时归还
+
+        Raises:
+            TimeoutError: 连接数已达上限且等待超时
+        """
+        if self._closed:
+            raise RuntimeError("连接池已关闭")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"连接池已满（{self.max_size} 个连接），等待 {self.acquire_timeout} 秒超时")
+        try:
+            return PooledConnection(self, self._checkout())
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkout(self):
+        """取出空闲连接（必要时 ping 检查），没有可用的空闲连接时新建"""
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                return self._connect(**self.params)
+            connection, released_at = item
+            if time.monotonic() - released_at < self.ping_interval:
+                return connection
+            try:
+                connection.ping(reconnect=True)
+                return connection
+            except Exception as e:
+                print(f"数据库连接已失效，重新连接: {e}")
+                self._close_quietly(connection)
+
+    def release(self, connection, discard=False):
+        """
+        归还连接
+
+        Args:
+            connection: pymysql 连接
+            discard: 是否丢弃该连接（连接出错时）
+        """
+        try:
+            if discard or self._closed or not getattr(connection, 'open', True):
+                self._close_quietly(connection)
+            else:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    @property
+    def idle_count(self):
+        """空闲连接数"""
+        return len(self._idle)
+
+    def close(self):
+        """关闭所有空闲连接；正在使用的连接归还时关闭"""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._close_quietly(connection)
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    获取项目共享的连接池（懒加载）
+
+    Returns:
+        ConnectionPool: 连接池
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def close_pool():
+    """关闭共享的连接池（程序退出时调用）"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
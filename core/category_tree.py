@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分类树
+由 hdl_category 的查询结果构建的只读分类树：节点带父指针，按编码的平铺索引可以常数时间查找任意节点，
+每个节点预先生成子分类选项列表和提示词中的选项文本，逐级LLM分类时不再重复构造。
+分类数据可以保存为本地快照（附带数据库中分类表的版本），启动时直接从快照构建
+"""
+
+import json
+import os
+from pathlib import Path
+
+
+# 各级分类编码的长度（一级2位、二级4位、三级6位）
+LEVEL_CODE_LENGTHS = {2: 1, 4: 2, 6: 3}
+
+DEFAULT_SNAPSHOT_PATH = "data/category_snapshot.json"
+SNAPSHOT_FORMAT = 1
+
+
+class CategoryNode:
+    """分类树节点"""
+
+    __slots__ = ('code', 'name', 'level', 'parent', 'children', 'choice', 'child_choices', 'options_text')
+
+    def __init__(self, code, name, level, parent=None):
+        self.code = code
+        self.name = name
+        self.level = level
+        self.parent = parent
+        self.children = []
+        # 作为候选项时的 {'code', 'name'}；child_choices/options_text 在树构建完成后生成
+        self.choice = {'code': code, 'name': name}
+        self.child_choices = []
+        self.options_text = ""
+
+    def __repr__(self):
+        return f"CategoryNode({self.code!r}, {self.name!r}, level={self.level})"
+
+    @property
+    def path_names(self):
+        """从一级分类到本节点的名称列表"""
+        names = []
+        node = self
+        while node is not None and node.level > 0:
+            names.append(node.name)
+            node = node.parent
+        return names[::-1]
+
+    @property
+    def path(self):
+        """分类路径（os.sep 连接）"""
+        return os.sep.join(self.path_names)
+
+
+class CategoryTree:
+    """只读分类树"""
+
+    def __init__(self, categories=(), version=None):
+        """
+        构建分类树
+
+        Args:
+            categories: hdl_category 查询结果，每行包含 category_code、cate_name、code_length，按 category_code 排序
+            version: 分类表版本（见 Classifier._fetch_category_version），未知时为 None
+        """
+        self.version = version
+        self.root = CategoryNode("", "", 0)
+        self.index = {}
+        self._legacy_dict = None
+
+        for cat in categories:
+            code = cat['category_code']
+            level = LEVEL_CODE_LENGTHS.get(cat['code_length'])
+            if level is None:
+                continue
+            parent = self.root if level == 1 else self.index.get(code[:len(code) - 2])
+            # 上级分类不存在的分类不挂到树上
+            if parent is None or parent.level != level - 1:
+                continue
+            node = CategoryNode(code, cat['cate_name'], level, parent)
+            parent.children.append(node)
+            self.index[code] = node
+
+        for node in [self.root, *self.index.values()]:
+            node.child_choices = [child.choice for child in node.children]
+            node.options_text = "\n".join(f"- {child.name}" for child in node.children)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __bool__(self):
+        return bool(self.root.children)
+
+    def get(self, code):
+        """
+        按编码查找节点
+
+        Returns:
+            CategoryNode: 节点；不存在时返回 None
+        """
+        return self.index.get(code)
+
+    def node_of(self, parent_code=None):
+        """parent_code 为 None 时返回根节点，否则返回对应节点（不存在时为 None）"""
+        return self.root if parent_code is None else self.index.get(parent_code)
+
+    def children_of(self, parent_code=None):
+        """
+        获取子分类候选项
+
+        Args:
+            parent_code: 父级分类编码，为 None 时返回一级分类
+
+        Returns:
+            list: [{'code', 'name'}, ...]（共享的预生成列表，调用方不要修改）
+        """
+        node = self.node_of(parent_code)
+        return node.child_choices if node is not None else []
+
+    def options_text(self, parent_code=None):
+        """子分类在提示词中的选项文本（每行 "- 名称"）"""
+        node = self.node_of(parent_code)
+        return node.options_text if node is not None else ""
+
+    def level_counts(self):
+        """
+        各级分类数量
+
+        Returns:
+            dict: {'level1': n, 'level2': n, 'level3': n}
+        """
+        counts = {'level1': 0, 'level2': 0, 'level3': 0}
+        for node in self.index.values():
+            counts[f"level{node.level}"] += 1
+        return counts
+
+    def to_dict(self):
+        """
+        转换为嵌套字典（get_all_categories 返回的结构，供界面显示）
+
+        Returns:
+            dict: {code: {'code', 'name', 'level', 'children': {...}}}
+        """
+        if self._legacy_dict is None:
+            def convert(nodes):
+                return {
+                    node.code: {
+                        'code': node.code,
+                        'name': node.name,
+                        'level': node.level,
+                        'children': convert(node.children)
+                    } for node in nodes
+                }
+            self._legacy_dict = convert(self.root.children)
+        return self._legacy_dict
+
+
+def save_snapshot(categories, version, path=DEFAULT_SNAPSHOT_PATH):
+    """
+    保存分类快照（先写临时文件再替换，读取方不会看到写了一半的文件）
+
+    Args:
+        categories: hdl_category 查询结果
+        version: 分类表版本
+        path: 快照文件路径
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        'format': SNAPSHOT_FORMAT,
+        'version': version,
+        'categories': [[cat['category_code'], cat['cate_name'], cat['code_length']] for cat in categories]
+    }
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    """
+    读取分类快照
+
+    Args:
+        path: 快照文件路径
+
+    Returns:
+        tuple: (分类行列表, 版本)；快照不存在、格式不符或已损坏时返回 None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != SNAPSHOT_FORMAT:
+            return None
+        categories = [
+            {'category_code': code, 'cate_name': name, 'code_length': length}
+            for code, name, length in data['categories']
+        ]
+        return categories, data.get('version')
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"读取分类快照失败 {path}: {e}")
+        return None
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文档分块与片段选择
+把提取的正文切成片段，按与候选分类的向量相似度挑出最相关的几段，
+在固定的token预算内拼成提示词中的正文摘录，使提示词长度不随文档长度增长
+"""
+
+import re
+
+import numpy as np
+
+
+# 句子边界：中文句末标点或换行之后、英文句末标点加空白之后（边界本身不消耗字符）
+SENTENCE_BOUNDARY = re.compile(r'(?<=[。！？；\n])|(?<=[.!?]\s)')
+CJK_PATTERN = re.compile(r'[㐀-鿿豈-﫿]')
+
+
+def estimate_tokens(text):
+    """
+    粗略估计文本的token数：中日韩字符约1个token，其余字符约4个一个token
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估计的token数
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _split_sentences(text):
+    """按句子边界切分，去掉空白句"""
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def split_text(text, chunk_chars=400, overlap_chars=50):
+    """
+    把正文切成长度接近 chunk_chars 的片段，尽量在句子边界处断开
+
+    Args:
+        text: 正文
+        chunk_chars: 每个片段的最大字符数
+        overlap_chars: 相邻片段重叠的字符数（保留上一片段末尾的句子作为上下文）
+
+    Returns:
+        list: 片段文本列表（按文档顺序）
+    """
+    if not text or not text.strip():
+        return []
+
+    pieces = []
+    for sentence in _split_sentences(text):
+        # 单句超长（如没有标点的表格行）时按长度硬切
+        for start in range(0, len(sentence), chunk_chars):
+            pieces.append(sentence[start:start + chunk_chars])
+
+    chunks = []
+    current = []
+    length = 0
+    for piece in pieces:
+        if current and length + len(piece) > chunk_chars:
+            chunks.append("".join(current).strip())
+            # 重叠：保留末尾若干句，总长不超过 overlap_chars
+            tail = []
+            tail_length = 0
+            for previous in reversed(current):
+                if tail_length + len(previous) > overlap_chars:
+                    break
+                tail.insert(0, previous)
+                tail_length += len(previous)
+            if tail_length + len(piece) > chunk_chars:
+                tail, tail_length = [], 0
+            current = tail
+            length = tail_length
+        current.append(piece)
+        length += len(piece)
+    if current:
+        chunks.append("".join(current).strip())
+    return chunks
+
+
+def _normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+def score_chunks(chunk_embeddings, candidate_embeddings, candidate_weights=None):
+    """
+    计算每个片段与候选分类的相关度：与各候选余弦相似度（乘以候选权重）的最大值
+
+    Args:
+        chunk_embeddings: 片段向量 (n_chunks, dim)
+        candidate_embeddings: 候选分类向量 (n_candidates, dim)
+        candidate_weights: 候选权重（如向量检索相似度），None表示等权
+
+    Returns:
+        np.ndarray: 每个片段的相关度 (n_chunks,)
+    """
+    if len(chunk_embeddings) == 0 or len(candidate_embeddings) == 0:
+        return np.zeros(len(chunk_embeddings), dtype=np.float32)
+    similarity = _normalize_rows(chunk_embeddings) @ _normalize_rows(candidate_embeddings).T
+    if candidate_weights is not None:
+        similarity = similarity * np.asarray(candidate_weights, dtype=np.float32)[None, :]
+    return similarity.max(axis=1)
+
+
+def select_top_chunks(chunks, scores, token_budget=600, max_chunks=3):
+    """
+    按相关度从高到低挑选片段，直到用完token预算，再按文档顺序返回
+
+    Args:
+        chunks: 片段文本列表
+        scores: 每个片段的相关度
+        token_budget: 选中片段的总token上限
+        max_chunks: 最多选择的片段数
+
+    Returns:
+        list: 选中片段的下标（按文档顺序）
+    """
+    selected = []
+    used = 0
+    for index in np.argsort(-np.asarray(scores), kind='stable'):
+        if len(selected) >= max_chunks:
+            break
+        tokens = estimate_tokens(chunks[index])
+        if used + tokens > token_budget:
+            continue
+        selected.append(int(index))
+        used += tokens
+    return sorted(selected)
@@ -9,151 +9,272 @@ import os
 import pymysql
 import json
 from pathlib import Path
-from config.db_config import DBConfig
+from config.db_pool import get_pool
 from llm.model import OpenAIOfficialEmbeddingFunction,sync_llm
+from core.category_tree import CategoryTree, DEFAULT_SNAPSHOT_PATH, load_snapshot, save_snapshot
+from core.code_index import ProjectCodeIndex
+from core.extractor import DocumentExtractor, MODE_PREVIEW
+from core.chunking import split_text, score_chunks, select_top_chunks, estimate_tokens
+from core.keyphrase import KeyphraseModel, DEFAULT_STATS_PATH as KEYPHRASE_STATS_PATH
+from core.file_manager import FileManager
+from core.metrics import MetricsRecorder
+from core.pipeline import Pipeline, PipelineNode
+from core.score_pipeline import (CategoryInterner, encode_query_results, distances_to_scores,
+                                 select_batch, filter_quantile_with_tie)
 import re
 import chromadb
-import numpy as np
-
-# 文档提取相关导入
-try:
-    import PyPDF2
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
-    print("警告: PyPDF2未安装，无法提取PDF文档内容")
-
-try:
-    from docx import Document
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
-    print("警告: python-docx未安装，无法提取DOCX文档内容")
-
-try:
-    import win32com.client
-    DOC_AVAILABLE = True
-except ImportError:
-    DOC_AVAILABLE = False
-    # 只在Windows系统上提示
-    import sys
-    if sys.platform == "win32":
-        print("警告: pywin32未安装，无法提取DOC文档内容（仅Windows需要）")
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 class Classifier:
     """文件分类器类"""
     
-    def __init__(self):
-        """初始化分类器"""
-        self.categories_cache = None
-        self.connection = None
+    def __init__(self, history_records=None):
+        """
+        初始化分类器
+        
+        Args:
+            history_records: 历史分类记录（FileManager.get_all_files()），用于学习项目编号前缀；
+                             为None时从默认的文件数据库只读地读取（FileManager.load_records）
+        """
+        self.category_tree = CategoryTree()
+        # 分类树本地快照：启动时直接加载，后台线程定期比较数据库中的分类表版本，有变化时构建新分类树并整体替换；
+        # 正在进行的分类使用开始时取得的分类树，结果带有该分类树的版本（taxonomy_version）
+        self.category_snapshot_path = DEFAULT_SNAPSHOT_PATH
+        self.category_refresh_interval = 300  # 秒，为0时不定期检查
+        self._category_refresh_lock = threading.Lock()
+        self._category_refresh_stop = threading.Event()
+        self._category_refresher = None
         self.vector_collection = None  # 向量库集合
+        self.category_collection = None  # 分类级向量集合（两阶段检索第一阶段）
+        self.chroma_client = None
+        self.embedding_function = None
         self.vector_db_path = "./file_classification_db"
         self.collection_name = "material_categories"
-        self._load_categories_from_db()
+        self.category_collection_name = self.collection_name + "_category"
+        # 检索模式: "flat" 直接检索物项集合; "two_stage" 先选候选小类再在其中检索物项;
+        # "ensemble" 用同一个查询向量并发检索多个物项集合，按分类合并候选
+        self.retrieval_mode = "flat"
+        self.category_top_n = 8  # 两阶段检索第一阶段保留的候选小类数
+        self.two_stage_overfetch = 2  # 两阶段检索第二阶段在候选小类并集内多取的倍数
+        self.ensemble_collection_names = ["material_categories", "material_categories_b"]
+        self.ensemble_collections = None
+        self._query_executor = None
+        # 融合分类只返回分类，不生成理由；理由在查看详情时由 explain_classification 按需生成
+        self.defer_reason = False
+        # 文件路径 -> 生成理由所需的上下文；只保留最近分类的 reason_context_limit 个文件，
+        # 更早的文件查看详情时以记录中的分类作为唯一候选生成理由
+        self.reason_context_limit = 500
+        self._reason_contexts = OrderedDict()
+        self._reason_lock = threading.Lock()
+        self._reason_cache = {}     # 文件路径 -> 已生成的理由
+        self._vector_lock = threading.RLock()  # 并发分类时保护向量库懒加载
+        self.fulltext_pipeline = None
+        # 文档正文提取（进程池 + 按内容哈希的磁盘缓存），融合分类提示词中附带正文摘录
+        self.extractor = DocumentExtractor()
+        # "preview" 只读取标题/主题/关键词、章节标题和开头几页；"full" 按字符预算读取正文
+        self.extract_mode = MODE_PREVIEW
+        self.fulltext_excerpt_chars = 1500
+        # 正文分块嵌入后，只把与候选分类最相关的片段放入提示词（总token数固定）
+        self.chunk_chars = 400
+        self.chunk_embed_batch_size = 16
+        self.max_document_chunks = 64
+        self.chunk_token_budget = 600
+        self.max_prompt_chunks = 3
+        self._category_path_embeddings = {}  # 分类路径 -> 向量
+        # 内容感知检索：用文件名 + 正文TF-IDF关键词组成的短查询代替文件名做向量检索
+        # （需要先运行 embed/build_keyphrase_stats.py 生成语料统计；修改后需重置 fulltext_pipeline）
+        self.content_query = True
+        self.keyphrase_max_terms = 6
+        self.keyphrase_query_chars = 64
+        self.metrics = MetricsRecorder()
+        self._load_categories()
+        self._load_code_index(history_records)
+        self._load_keyphrase_model()
     
-    def _get_connection(self):
-        """获取数据库连接"""
-        if self.connection is None:
-            try:
-                params = DBConfig.get_connection_params()
-                self.connection = pymysql.connect(**params)
-            except Exception as e:
-                print(f"数据库连接失败: {e}")
-                raise
-        return self.connection
+    def _load_code_index(self, history_records=None):
+        """从历史分类记录构建项目编号前缀索引"""
+        self.code_index = ProjectCodeIndex()
+        try:
+            if history_records is None:
+                history_records = FileManager.load_records()
+            self.code_index.fit(history_records)
+            print(f"编号前缀索引: {len(self.code_index)} 个前缀")
+        except Exception as e:
+            print(f"加载编号前缀索引失败: {e}")
     
-    def _load_categories_from_db(self):
-        """从MySQL数据库加载分类数据"""
+    def _load_keyphrase_model(self, stats_path=KEYPHRASE_STATS_PATH):
+        """加载关键词语料统计，不存在时内容感知检索不启用"""
+        self.keyphrase_model = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(pymysql.cursors.DictCursor)
-            
+            self.keyphrase_model = KeyphraseModel.load(stats_path)
+            if self.keyphrase_model is not None:
+                print(f"关键词语料统计: {self.keyphrase_model.doc_count} 个文档, {len(self.keyphrase_model)} 个n-gram")
+        except Exception as e:
+            print(f"加载关键词语料统计失败: {e}")
+    
+    def _get_connection(self):
+        """
+        从共享连接池取出数据库连接（每次调用取出一个，在 with 语句中使用，结束时归还）
+        
+        Returns:
+            PooledConnection: 连接
+        """
+        try:
+            return get_pool().connection()
+        except Exception as e:
+            print(f"数据库连接失败: {e}")
+            raise
+    
+    def _load_categories(self):
+        """
+        加载分类数据：有本地快照时直接使用快照，并立即在后台检查数据库版本；
+        没有快照时从数据库同步加载。之后由后台线程定期检查
+        """
+        snapshot = load_snapshot(self.category_snapshot_path)
+        if snapshot is None:
+            self._load_categories_from_db()
+            self.start_category_refresher(check_now=False)
+            return
+        
+        categories, version = snapshot
+        self.category_tree = CategoryTree(categories, version=version)
+        print(f"从快照加载 {len(categories)} 个分类（版本 {version}）")
+        self.start_category_refresher(check_now=True)
+    
+    @property
+    def taxonomy_version(self):
+        """当前分类树的版本"""
+        return self.category_tree.version
+    
+    def start_category_refresher(self, check_now=True):
+        """
+        启动后台分类刷新线程：每隔 category_refresh_interval 秒检查一次分类表版本
+        
+        Args:
+            check_now: 是否立即检查一次（从快照启动时为True）
+        """
+        if self._category_refresher is not None and self._category_refresher.is_alive():
+            return
+        if not check_now and not self.category_refresh_interval:
+            return
+        self._category_refresh_stop.clear()
+        
+        def run():
+            if check_now:
+                self._refresh_categories_if_changed()
+            while self.category_refresh_interval and not self._category_refresh_stop.wait(self.category_refresh_interval):
+                self._refresh_categories_if_changed()
+        
+        self._category_refresher = threading.Thread(target=run, name="category-refresher", daemon=True)
+        self._category_refresher.start()
+    
+    def stop_category_refresher(self, timeout=5):
+        """停止后台分类刷新线程"""
+        self._category_refresh_stop.set()
+        if self._category_refresher is not None:
+            self._category_refresher.join(timeout)
+            self._category_refresher = None
+    
+    def _fetch_category_version(self, conn):
+        """
+        查询分类表版本：记录数 + 各行编码和名称的CRC32异或值，只在服务端计算，返回一行
+        
+        Returns:
+            str: 版本字符串，如 "1523-9f3a0c21"
+        """
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute("""
+                SELECT
+                    COUNT(*) as total,
+                    COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', category_code, cate_name))), 0) as checksum
+                FROM hdl_category
+            """)
+            row = cursor.fetchone()
+        return f"{row['total']}-{int(row['checksum']):08x}"
+    
+    def _fetch_categories(self, conn):
+        """
+        查询全部分类及分类表版本
+        
+        Returns:
+            tuple: (分类行列表, 版本)
+        """
+        version = self._fetch_category_version(conn)
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
             # 查询所有分类，按category_code排序
-            sql = """
+            cursor.execute("""
                 SELECT 
                     category_code,
                     cate_name,
                     CHAR_LENGTH(category_code) as code_length
                 FROM hdl_category
                 ORDER BY category_code
-            """
-            cursor.execute(sql)
+            """)
             categories = cursor.fetchall()
-            
-            # 构建分类树结构
-            self.categories_cache = self._build_category_tree(categories)
-            
-            cursor.close()
+        return categories, version
+    
+    def _install_categories(self, categories, version):
+        """
+        构建新分类树（包括界面使用的嵌套字典）并整体替换当前分类树，然后保存快照。
+        替换是一次属性赋值，已经取得旧分类树的分类过程不受影响
+        """
+        tree = CategoryTree(categories, version=version)
+        tree.to_dict()
+        self.category_tree = tree
+        try:
+            save_snapshot(categories, version, self.category_snapshot_path)
+        except Exception as e:
+            print(f"保存分类快照失败: {e}")
+    
+    def _load_categories_from_db(self):
+        """从MySQL数据库加载分类数据；失败时保留已加载的分类树"""
+        try:
+            with self._category_refresh_lock, self._get_connection() as conn:
+                categories, version = self._fetch_categories(conn)
+                self._install_categories(categories, version)
             print(f"成功加载 {len(categories)} 个分类")
-            
         except pymysql.Error as e:
             print(f"数据库错误: {e}")
-            self.categories_cache = {}
         except Exception as e:
             print(f"加载分类数据失败: {e}")
-            self.categories_cache = {}
     
-    def _build_category_tree(self, categories):
+    def _refresh_categories_if_changed(self):
         """
-        构建分类树结构
+        比较数据库中的分类表版本和当前分类树的版本，不同时重新加载（在后台线程中运行）
         
-        Args:
-            categories: 从数据库查询的分类列表
-            
         Returns:
-            dict: 分类树结构
+            bool: 是否重新加载了分类
         """
-        tree = {}
-        
-        for cat in categories:
-            code = cat['category_code']
-            name = cat['cate_name']
-            length = cat['code_length']
-            
-            if length == 2:
-                # 一级分类
-                tree[code] = {
-                    'code': code,
-                    'name': name,
-                    'level': 1,
-                    'children': {}
-                }
-            elif length == 4:
-                # 二级分类
-                parent_code = code[:2]
-                if parent_code in tree:
-                    tree[parent_code]['children'][code] = {
-                        'code': code,
-                        'name': name,
-                        'level': 2,
-                        'children': {}
-                    }
-            elif length == 6:
-                # 三级分类
-                parent_code = code[:4]
-                grandparent_code = code[:2]
-                if grandparent_code in tree and parent_code in tree[grandparent_code]['children']:
-                    tree[grandparent_code]['children'][parent_code]['children'][code] = {
-                        'code': code,
-                        'name': name,
-                        'level': 3,
-                        'children': {}
-                    }
-        
-        return tree
+        try:
+            with self._category_refresh_lock, self._get_connection() as conn:
+                version = self._fetch_category_version(conn)
+                if version == self.category_tree.version:
+                    return False
+                categories, version = self._fetch_categories(conn)
+                self._install_categories(categories, version)
+            print(f"分类表已变化，重新加载 {len(categories)} 个分类（版本 {version}）")
+            return True
+        except Exception as e:
+            print(f"检查分类版本失败，继续使用当前分类: {e}")
+            return False
     
     def _refresh_categories(self):
         """刷新分类缓存"""
         self._load_categories_from_db()
     
-    def classify_files(self, file_paths, use_embedding=False):
+    def classify_files(self, file_paths, use_embedding=False, category_tree=None, code_hint_files=None):
         """
         对文件列表进行分类
         
         Args:
             file_paths: 文件路径列表
             use_embedding: 是否使用向量检索分类方法（默认False，使用LLM分类）
+            category_tree: 使用的分类树，为None时使用当前分类树；整批文件使用同一个分类树，
+                           调用方可以先取得 classifier.category_tree，用它的 version 标记结果
+            code_hint_files: 可选的集合，由项目编号前缀直接给出分类的文件路径会加入其中
+                             （这些结果来自前缀索引本身，不应再计入前缀索引）
             
         Returns:
             dict: {文件路径: 分类路径} 或 {文件路径: (分类路径, 相似度分数)} 的字典
@@ -163,26 +284,39 @@ class Classifier:
             }
         """
         results = {}
+        tree = category_tree or self.category_tree
         
         for file_path in file_paths:
+            # 项目编号前缀证据充分时直接给出分类，不再调用向量检索或LLM
+            code_hint = self.code_index.lookup(file_path)
+            if code_hint and code_hint.strong:
+                if use_embedding:
+                    results[file_path] = (code_hint.category_path, code_hint.confidence)
+                else:
+                    results[file_path] = code_hint.category_path
+                if code_hint_files is not None:
+                    code_hint_files.add(file_path)
+                continue
+            
             if use_embedding:
                 # 使用向量检索分类（返回分类路径和相似度分数）
                 result = self._classify_single_file_with_embedding(file_path, return_score=True)
                 results[file_path] = result
             else:
                 # 使用LLM逐级分类（原有方法）
-                category = self._classify_single_file(file_path)
+                category = self._classify_single_file(file_path, tree)
                 results[file_path] = category
         
         return results
     
-    def _classify_single_file(self, file_path):
+    def _classify_single_file(self, file_path, category_tree=None):
         """
         对单个文件进行分类（逐级分类）
         使用大模型根据文件名逐级判断分类
         
         Args:
             file_path: 文件路径
+            category_tree: 使用的分类树，为None时使用当前分类树
             
         Returns:
             str: 分类路径（使用路径分隔符，如 '钢材/型钢/角钢'）
@@ -192,7 +326,7 @@ class Classifier:
         file_name_without_ext = os.path.splitext(file_name)[0]
         
         # 从一级分类开始逐级判断
-        category_path = self._classify_with_llm(file_name_without_ext)
+        category_path = self._classify_with_llm(file_name_without_ext, category_tree)
         
         # 如果匹配到分类，返回路径；否则返回默认分类
         if category_path:
@@ -200,56 +334,36 @@ class Classifier:
         else:
             return "其他/未分类"
     
-    def _classify_with_llm(self, file_name):
+    def _classify_with_llm(self, file_name, category_tree=None):
         """
         使用大模型逐级分类文件
         
         Args:
             file_name: 文件名（不含扩展名）
+            category_tree: 使用的分类树，为None时使用当前分类树（各级判断都在同一个分类树上进行）
             
         Returns:
             list: 完整的分类路径列表，如 ['钢材', '型钢', '角钢']
         """
-        if not self.categories_cache:
+        tree = category_tree or self.category_tree
+        if not tree:
             return None
         
         category_path = []
+        node = tree.root
+        parent_name = None
         
-        # 第一步：判断一级分类
-        level1_categories = self._get_level_categories(1)
-        level1_result = self._llm_classify_level(file_name, level1_categories, 1)
-        
-        if not level1_result:
-            return None
-        
-        category_path.append(level1_result['name'])
-        level1_code = level1_result['code']
-        
-        # 检查是否有二级分类
-        if level1_code in self.categories_cache and self.categories_cache[level1_code]['children']:
-            # 第二步：判断二级分类
-            level2_categories = self._get_level_categories(2, parent_code=level1_code)
-            if level2_categories:
-                level2_result = self._llm_classify_level(file_name, level2_categories, 2, parent_name=level1_result['name'])
-                
-                if level2_result:
-                    category_path.append(level2_result['name'])
-                    level2_code = level2_result['code']
-                    
-                    # 检查是否有三级分类
-                    if (level1_code in self.categories_cache and 
-                        level2_code in self.categories_cache[level1_code]['children'] and
-                        self.categories_cache[level1_code]['children'][level2_code]['children']):
-                        # 第三步：判断三级分类
-                        level3_categories = self._get_level_categories(3, parent_code=level2_code)
-                        if level3_categories:
-                            level3_result = self._llm_classify_level(
-                                file_name, level3_categories, 3, 
-                                parent_name=f"{level1_result['name']}/{level2_result['name']}"
-                            )
-                            
-                            if level3_result:
-                                category_path.append(level3_result['name'])
+        # 逐级判断：一级 → 二级 → 三级，没有下级分类或判断失败时停止
+        while node.children:
+            result = self._llm_classify_level(
+                file_name, node.child_choices, node.level + 1,
+                parent_name=parent_name, categories_text=node.options_text
+            )
+            if not result:
+                break
+            node = tree.get(result['code'])
+            category_path.append(node.name)
+            parent_name = "/".join(category_path)
         
         return category_path if category_path else None
     
@@ -264,40 +378,14 @@ class Classifier:
         Returns:
             list: 分类列表，每个元素包含 {'code': 'xx', 'name': '分类名称'}
         """
-        categories = []
-        
         if level == 1:
-            # 一级分类
-            for code, cat in self.categories_cache.items():
-                categories.append({
-                    'code': code,
-                    'name': cat['name']
-                })
-        elif level == 2 and parent_code:
-            # 二级分类
-            if parent_code in self.categories_cache:
-                for code, cat in self.categories_cache[parent_code]['children'].items():
-                    categories.append({
-                        'code': code,
-                        'name': cat['name']
-                    })
-        elif level == 3 and parent_code:
-            # 三级分类
-            # parent_code是二级分类代码，需要找到对应的一级分类下的二级分类
-            for level1_code, level1_cat in self.categories_cache.items():
-                if parent_code in level1_cat['children']:
-                    level2_cat = level1_cat['children'][parent_code]
-                    if 'children' in level2_cat and level2_cat['children']:
-                        for code, cat in level2_cat['children'].items():
-                            categories.append({
-                                'code': code,
-                                'name': cat['name']
-                            })
-                    break
-        
-        return categories
+            return self.category_tree.children_of()
+        node = self.category_tree.get(parent_code) if parent_code else None
+        if node is None or node.level != level - 1:
+            return []
+        return node.child_choices
     
-    def _llm_classify_level(self, file_name, categories, level, parent_name=None):
+    def _llm_classify_level(self, file_name, categories, level, parent_name=None, categories_text=None):
         """
         使用大模型判断文件属于哪个分类
         
@@ -306,13 +394,15 @@ class Classifier:
             categories: 候选分类列表
             level: 分类层级（1, 2, 3）
             parent_name: 父级分类名称（用于提示词）
+            categories_text: 预先生成的分类选项文本（CategoryNode.options_text），为None时由 categories 生成
             
         Returns:
             dict: {'code': 'xx', 'name': '分类名称'} 或 None
         """
         try:
             # 构建分类选项文本
-            categories_text = "\n".join([f"- {cat['name']}" for cat in categories])
+            if categories_text is None:
+                categories_text = "\n".join([f"- {cat['name']}" for cat in categories])
             
             # 构建提示词
             if level == 1:
@@ -430,9 +520,9 @@ class Classifier:
         获取所有分类（用于调试或显示）
         
         Returns:
-            dict: 分类树结构
+            dict: 分类树结构 {code: {'code', 'name', 'level', 'children': {...}}}
         """
-        return self.categories_cache
+        return self.category_tree.to_dict()
     
     def _get_vector_collection(self):
         """
@@ -441,29 +531,198 @@ class Classifier:
         Returns:
             chromadb.Collection: 向量库集合对象
         """
-        if self.vector_collection is None:
-            try:
-                # 创建持久化客户端
-                chroma_client = chromadb.PersistentClient(path=self.vector_db_path)
+        with self._vector_lock:
+            if self.vector_collection is None:
+                try:
+                    # 创建持久化客户端
+                    self.chroma_client = chromadb.PersistentClient(path=self.vector_db_path)
                 
-                # 使用自定义的OpenAI嵌入函数
-                embedding_function = OpenAIOfficialEmbeddingFunction(
-                    api_key="xxxxxxxx",
-                    model="bge"
-                )
+                    # 使用自定义的OpenAI嵌入函数
+                    self.embedding_function = OpenAIOfficialEmbeddingFunction(
+                        api_key="xxxxxxxx",
+                        model="bge"
+                    )
                 
-                # 获取集合
-                self.vector_collection = chroma_client.get_collection(
-                    name=self.collection_name,
-                    embedding_function=embedding_function
-                )
-                print(f"向量库连接成功: {self.collection_name}")
-            except Exception as e:
-                print(f"向量库连接失败: {e}")
-                raise
+                    # 获取集合
+                    self.vector_collection = self.chroma_client.get_collection(
+                        name=self.collection_name,
+                        embedding_function=self.embedding_function
+                    )
+                    print(f"向量库连接成功: {self.collection_name}")
+                except Exception as e:
+                    print(f"向量库连接失败: {e}")
+                    raise
         
         return self.vector_collection
     
+    def _get_category_collection(self):
+        """
+        获取分类级向量集合（懒加载，由 embed/build_category_index.py 生成）
+        
+        Returns:
+            chromadb.Collection 或 None（集合不存在时）
+        """
+        with self._vector_lock:
+            if self.category_collection is None:
+                self._get_vector_collection()
+                try:
+                    self.category_collection = self.chroma_client.get_collection(
+                        name=self.category_collection_name
+                    )
+                except Exception as e:
+                    # 只在本次检索中改用单阶段检索，检索模式设置不变（集合生成后自动恢复两阶段检索）
+                    print(f"分类级向量集合不可用，本次改用单阶段检索: {e}")
+                    return None
+        return self.category_collection
+    
+    def _select_candidate_categories(self, query_embeddings):
+        """
+        两阶段检索第一阶段：在分类级集合中为每个查询选出候选小类
+        
+        Args:
+            query_embeddings: 查询向量列表
+            
+        Returns:
+            list: 每个查询的候选 small_class_code 列表；分类级集合不可用时返回 None
+        """
+        category_collection = self._get_category_collection()
+        if category_collection is None:
+            return None
+        response = category_collection.query(
+            query_embeddings=query_embeddings,
+            n_results=self.category_top_n,
+            include=["metadatas"]
+        )
+        return [[m['small_class_code'] for m in (metadatas or []) if m.get('small_class_code')]
+                for metadatas in response.get('metadatas') or []]
+    
+    def _get_ensemble_collections(self):
+        """
+        获取集成检索使用的物项集合（懒加载，不存在的集合在本次检索中跳过）
+        
+        Returns:
+            list: chromadb.Collection 列表
+        """
+        with self._vector_lock:
+            if self.ensemble_collections is not None:
+                return self.ensemble_collections
+            self._get_vector_collection()
+            collections = []
+            for name in self.ensemble_collection_names:
+                if name == self.collection_name:
+                    collections.append(self.vector_collection)
+                    continue
+                try:
+                    # 只用查询向量检索，不需要绑定嵌入函数
+                    collections.append(self.chroma_client.get_collection(name=name))
+                except Exception as e:
+                    print(f"集成检索本次跳过集合 {name}: {e}")
+            if self._query_executor is None:
+                self._query_executor = ThreadPoolExecutor(max_workers=max(1, len(self.ensemble_collection_names)))
+            # 所有集合都找到时才缓存；缺少的集合下次检索时重新查找（集合生成后自动加入）
+            if len(collections) == len(self.ensemble_collection_names):
+                self.ensemble_collections = collections
+        return collections
+    
+    def _query_ensemble(self, query_embeddings, k):
+        """
+        用同一批查询向量并发检索多个物项集合，每个查询的结果按距离合并
+        （同一分类出现在多个集合中时，由后处理按分类去重，保留相似度最高的一条）
+        
+        Returns:
+            tuple: (metadatas_batch, distances_batch, truncated)，truncated 见 _query_candidates
+        """
+        collections = self._get_ensemble_collections()
+        include = ["metadatas", "distances"]
+        futures = [
+            self._query_executor.submit(collection.query, query_embeddings=query_embeddings,
+                                        n_results=k, include=include)
+            for collection in collections
+        ]
+        responses = [future.result() for future in futures]
+        
+        metadatas_batch, distances_batch, truncated = [], [], []
+        for row in range(len(query_embeddings)):
+            merged = []
+            row_truncated = False
+            for response in responses:
+                metadatas = (response.get('metadatas') or [[]] * len(query_embeddings))[row]
+                distances = (response.get('distances') or [[]] * len(query_embeddings))[row]
+                merged.extend(zip(distances, metadatas))
+                # 任一集合的窗口被截断，合并结果就可能不完整
+                row_truncated = row_truncated or self._is_window_truncated(distances, k)
+            merged.sort(key=lambda item: item[0])
+            distances_batch.append([d for d, _ in merged])
+            metadatas_batch.append([m for _, m in merged])
+            truncated.append(row_truncated)
+        return metadatas_batch, distances_batch, truncated
+    
+    def _query_candidates(self, query_embeddings, k, category_codes=None):
+        """
+        在物项集合中检索候选物项
+        
+        Args:
+            query_embeddings: 查询向量列表
+            k: 每个查询的结果数量
+            category_codes: 每个查询限定的 small_class_code 列表（两阶段检索），None表示不限定
+            
+        Returns:
+            tuple: (metadatas_batch, distances_batch, truncated)，前两项与 collection.query 返回的结构一致，
+                   truncated 为每个查询的窗口之外是否可能还有相似度 ≥0.5 的结果（见 _is_window_truncated）
+        """
+        collection = self._get_vector_collection()
+        include = ["metadatas", "distances"]
+        
+        if category_codes is None and self.retrieval_mode == "ensemble":
+            return self._query_ensemble(query_embeddings, k)
+        
+        if category_codes is None:
+            response = collection.query(query_embeddings=query_embeddings, n_results=k, include=include)
+            distances_batch = response.get('distances') or [[] for _ in query_embeddings]
+            return (response.get('metadatas') or [[] for _ in query_embeddings], distances_batch,
+                    [self._is_window_truncated(distances, k) for distances in distances_batch])
+        
+        # 第二阶段：整批查询在所有候选小类的并集内检索一次（多取一些），再按各自的候选小类过滤；
+        # 过滤后不足k条而并集窗口之外还可能有该查询的结果时（被其他查询的候选小类挤出），单独检索该查询
+        metadatas_batch = [[] for _ in query_embeddings]
+        distances_batch = [[] for _ in query_embeddings]
+        truncated = [False] * len(query_embeddings)
+        rows = [row for row, codes in enumerate(category_codes) if codes]
+        if not rows:
+            return metadatas_batch, distances_batch, truncated
+        union_codes = sorted({code for row in rows for code in category_codes[row]})
+        union_k = k * self.two_stage_overfetch
+        response = collection.query(
+            query_embeddings=[query_embeddings[row] for row in rows],
+            n_results=union_k,
+            where={"small_class_code": {"$in": union_codes}},
+            include=include
+        )
+        crowded = []
+        for n, row in enumerate(rows):
+            codes = set(category_codes[row])
+            union_metadatas = (response.get('metadatas') or [[]] * len(rows))[n]
+            union_distances = (response.get('distances') or [[]] * len(rows))[n]
+            hits = [(d, m) for d, m in zip(union_distances, union_metadatas)
+                    if (m or {}).get('small_class_code') in codes][:k]
+            if len(hits) < k and self._is_window_truncated(union_distances, union_k):
+                crowded.append(row)
+                continue
+            distances_batch[row] = [d for d, _ in hits]
+            metadatas_batch[row] = [m for _, m in hits]
+            truncated[row] = self._is_window_truncated(distances_batch[row], k)
+        for row in crowded:
+            response = collection.query(
+                query_embeddings=[query_embeddings[row]],
+                n_results=k,
+                where={"small_class_code": {"$in": list(category_codes[row])}},
+                include=include
+            )
+            metadatas_batch[row] = (response.get('metadatas') or [[]])[0]
+            distances_batch[row] = (response.get('distances') or [[]])[0]
+            truncated[row] = self._is_window_truncated(distances_batch[row], k)
+        return metadatas_batch, distances_batch, truncated
+    
     def _classify_single_file_with_embedding(self, file_path, return_score=False):
         """
         使用向量检索对单个文件进行分类
@@ -558,7 +817,7 @@ class Classifier:
 
     def _filter_quantile_with_tie(self, data, score_key="similarity_score", quantile=0.9, min_advance=2):
         """
-        分位数筛选+同分归并（不损失高分同分）
+        分位数筛选+同分归并（不损失高分同分），按 category_path 去重
         
         Args:
             data: 数据列表，每个元素包含score_key字段
@@ -569,67 +828,22 @@ class Classifier:
         Returns:
             list: 筛选后的数据列表
         """
-        if not data:
-            return []
-        
-        # 1. 数据降序排序
-        sorted_data = sorted(data, key=lambda x: x[score_key], reverse=True)
-        n_total = len(sorted_data)
-        
-        if n_total <= min_advance:
-            return sorted_data  # 数据量少则全部晋级
-        
-        # 2. 提取得分列表，计算分位数门槛
-        scores = [d[score_key] for d in sorted_data]
-        threshold = np.quantile(scores, quantile)  # 基础门槛分
-        
-        # 3. 核心：筛选≥门槛的对象 + 归并所有同分（哪怕超比例）
-        # 先找所有≥门槛的对象
-        advance_candidates = [d for d in sorted_data if d[score_key] >= threshold]
-        
-        # 若有同分在门槛线上，确保全部纳入（比如门槛90，所有90分都进）
-        tie_score = threshold
-        tie_candidates = [d for d in sorted_data if abs(d[score_key] - tie_score) < 0.0001]
-        
-        # 合并：≥门槛的 + 补充可能漏的同分（避免分位数精度问题）
-        # 使用字典去重（基于category_path）
-        seen_paths = set()
-        advance_data = []
-        for d in advance_candidates + tie_candidates:
-            path = d.get('category_path', '')
-            if path not in seen_paths:
-                seen_paths.add(path)
-                advance_data.append(d)
-        
-        # 重新排序（保证高分在前）
-        advance_data = sorted(advance_data, key=lambda x: x[score_key], reverse=True)
-        
-        # 4. 兜底：若晋级数<2，取前2名（含同分）
-        if len(advance_data) < min_advance:
-            # 取前2名，若第2名有同分，全部纳入
-            if n_total >= 2:
-                top2_score = sorted_data[1][score_key]
-            else:
-                top2_score = sorted_data[0][score_key]
-            
-            seen_paths = set()
-            advance_data = []
-            for d in sorted_data:
-                if d[score_key] >= top2_score:
-                    path = d.get('category_path', '')
-                    if path not in seen_paths:
-                        seen_paths.add(path)
-                        advance_data.append(d)
-        
-        return advance_data
+        return filter_quantile_with_tie(data, score_key=score_key, quantile=quantile, min_advance=min_advance)
     
-    def _get_top_score_embedding_results(self, file_path, n_results=100):
+    def _get_top_score_embedding_results(self, file_path, n_results=100, initial_k=20, query_text=None):
         """
         使用向量检索获取分类结果，使用分位数筛选（0.9）+ 同分归并
         
+        检索是渐进的：先取 initial_k 条，窗口末尾的相似度仍 ≥0.5 时加倍扩大 k（最多 n_results 条），
+        直到窗口包含前 n_results 条中所有相似度 ≥0.5 的结果，再对整个窗口做一次筛选，
+        结果与一次检索 n_results 条相同。查询只取距离和元数据，不取文档正文。每次查询的 k、轮数和返回数据量记录在
+        self.metrics 的 'vector_query' 事件中。
+        
         Args:
             file_path: 文件路径
-            n_results: 向量检索返回的结果数量（默认100）
+            n_results: 向量检索返回的最大结果数量（默认100）
+            initial_k: 首轮检索数量（默认20）
+            query_text: 检索查询，为None时使用文件名（见 _build_keyphrase_query）
             
         Returns:
             list: 筛选后的分类结果列表，每个元素包含 {
@@ -641,89 +855,131 @@ class Classifier:
             如果没有找到结果或相似度 < 0.5，返回空列表
         """
         try:
-            # 提取文件名（不含扩展名）
-            file_name = os.path.basename(file_path)
-            file_name_without_ext = os.path.splitext(file_name)[0]
-            
-            if not file_name_without_ext or not file_name_without_ext.strip():
-                return []
-            
-            # 获取向量库集合
-            collection = self._get_vector_collection()
-            
-            # 在向量库中检索多个相似的物项（检索100个结果）
-            results = collection.query(
-                query_texts=[file_name_without_ext],
-                n_results=n_results
-            )
-            
-            if not results or not results.get('metadatas') or not results['metadatas'][0]:
-                return []
-            
-            # 处理结果
-            classification_results = []
-            metadatas = results['metadatas'][0]
-            distances = results.get('distances', [[]])[0] if results.get('distances') else []
-            
-            # 遍历所有结果，计算相似度并构建分类信息
-            for i, metadata in enumerate(metadatas):
-                distance = distances[i] if i < len(distances) else None
-                
-                if distance is None:
-                    continue
-                
-                # 计算相似度分数
-                similarity_score = 1 - (distance / 2.0) if distance <= 2.0 else 0.0
-                similarity_score = max(0.0, min(1.0, similarity_score))
-                
-                # 只保留相似度分数足够高的结果（>= 0.5）
-                if similarity_score < 0.5:
-                    continue
-                
-                # 构建分类路径
-                category_path = []
-                if metadata.get('big_class_name'):
-                    category_path.append(metadata['big_class_name'])
-                if metadata.get('middle_class_name'):
-                    category_path.append(metadata['middle_class_name'])
-                if metadata.get('small_class_name'):
-                    category_path.append(metadata['small_class_name'])
-                
-                if category_path:
-                    category_result = os.sep.join(category_path)
-                    classification_results.append({
-                        'category_path': category_result,
-                        'similarity_score': similarity_score,
-                        'distance': distance,
-                        'metadata': metadata
-                    })
-            
-            # 如果没有有效结果，返回空列表
-            if not classification_results:
-                return []
+            return self._get_top_score_embedding_results_batch([file_path], n_results=n_results,
+                                                               initial_k=initial_k,
+                                                               query_texts=[query_text])[0]
+        except Exception as e:
+            print(f"向量检索获取筛选结果错误: {e}")
+            return []
+    
+    def _get_top_score_embedding_results_batch(self, file_paths, n_results=100, initial_k=20, query_texts=None):
+        """
+        批量版本的 _get_top_score_embedding_results：一次嵌入所有查询，
+        一次检索，后处理在整批的距离矩阵上完成
+        
+        Args:
+            file_paths: 文件路径列表
+            n_results: 向量检索返回的最大结果数量
+            initial_k: 首轮检索数量
+            query_texts: 与 file_paths 对应的检索查询，元素为None时使用文件名
             
-            # 使用分位数筛选（0.9分位数）+ 同分归并
-            filtered_results = self._filter_quantile_with_tie(
-                classification_results, 
-                score_key="similarity_score", 
-                quantile=0.9, 
-                min_advance=2
+        Returns:
+            list: 与 file_paths 一一对应的筛选结果列表
+        """
+        names = [os.path.splitext(os.path.basename(path))[0] for path in file_paths]
+        if query_texts:
+            names = [query or name for query, name in zip(query_texts, names)]
+        results = [[] for _ in file_paths]
+        active = [i for i, name in enumerate(names) if name and name.strip()]
+        if not active:
+            return results
+        
+        # 获取向量库集合
+        self._get_vector_collection()
+        
+        # 查询向量只计算一次，扩大k时复用
+        query_embeddings = dict(zip(active, self.embedding_function([names[i] for i in active])))
+        
+        # 两阶段检索：先在分类级集合中选出候选小类（分类级集合不可用时本次按单阶段检索）
+        category_codes = None
+        mode = self.retrieval_mode
+        if mode == "two_stage":
+            selected = self._select_candidate_categories([query_embeddings[i] for i in active])
+            if selected is not None:
+                category_codes = dict(zip(active, selected))
+            else:
+                mode = "flat"
+        
+        interner = CategoryInterner()
+        payload_bytes = [0] * len(file_paths)
+        pending = active
+        k = min(initial_k, n_results)
+        rounds = 0
+        while pending:
+            rounds += 1
+            metadatas_batch, distances_batch, truncated = self._query_candidates(
+                [query_embeddings[i] for i in pending],
+                k,
+                [category_codes[i] for i in pending] if category_codes else None
             )
             
-            return filtered_results
+            # 窗口之外没有相似度 ≥0.5 的结果时，窗口内的有效结果与检索 n_results 条时相同，
+            # 分位数门槛在这些结果上计算；否则扩大k重新检索
+            done = [row for row in range(len(pending)) if not (truncated[row] and k < n_results)]
+            still_pending = [pending[row] for row in range(len(pending)) if truncated[row] and k < n_results]
+            for row, i in enumerate(pending):
+                payload_bytes[i] += (len(json.dumps(metadatas_batch[row], ensure_ascii=False).encode('utf-8'))
+                                     + 8 * len(distances_batch[row]))
+            
+            if done:
+                distances, category_ids = encode_query_results([metadatas_batch[row] for row in done],
+                                                               [distances_batch[row] for row in done], interner)
+                scores = distances_to_scores(distances)
+                positions = select_batch(scores, category_ids, quantile=0.9, min_advance=2, min_score=0.5)
+                for n, row in enumerate(done):
+                    i = pending[row]
+                    metadatas = metadatas_batch[row]
+                    results[i] = [{
+                        'category_path': interner.paths[category_ids[n, p]],
+                        'similarity_score': float(scores[n, p]),
+                        'distance': float(distances[n, p]),
+                        'metadata': metadatas[p]
+                    } for p in positions[n]]
+                    self.metrics.record(
+                        'vector_query',
+                        query=names[i],
+                        mode=mode,
+                        k=k,
+                        rounds=rounds,
+                        returned=len(distances_batch[row]),
+                        kept=len(results[i]),
+                        payload_bytes=payload_bytes[i]
+                    )
+            
+            pending = still_pending
+            k = min(k * 2, n_results)
+        
+        return results
+    
+    def _is_window_truncated(self, row_distances, k, min_score=0.5):
+        """
+        判断一个查询的检索窗口之外是否可能还有相似度 ≥ min_score 的结果（需要扩大k）
+        
+        Args:
+            row_distances: 本轮一个查询返回的距离（升序）
+            k: 本轮请求的数量
+            min_score: 相似度下限
             
-        except Exception as e:
-            print(f"向量检索获取筛选结果错误: {e}")
-            return []
+        Returns:
+            bool: True表示窗口末尾的相似度仍不低于下限，窗口之外的结果可能通过下限
+        """
+        # 集合里已经没有更多结果
+        if len(row_distances) < k:
+            return False
+        return bool(distances_to_scores([row_distances[-1]])[0] >= min_score)
     
-    def _classify_with_fulltext_and_llm(self, file_path, embedding_results, llm_category_path=None):
+    def _classify_with_fulltext_and_llm(self, file_path, embedding_results, llm_category_path=None, code_hint=None,
+                                        document_text=None, document_info=None):
         """
-        基于文件名、向量检索结果和LLM逐级分类结果，使用LLM进行最终分类判断
+        基于文件名、文档正文、向量检索结果和LLM逐级分类结果，使用LLM进行最终分类判断
         
         Args:
             file_path: 文件路径
             embedding_results: 向量检索筛选后的结果列表
             llm_category_path: LLM逐级分类的结果（可选）
+            code_hint: 项目编号前缀提示 CodeHint（可选）
+            document_text: 选中的正文片段或提取的正文（可选），最多取 fulltext_excerpt_chars 个字符放入提示词
+            document_info: 提取结果（可选），其中的标题、主题、关键词和章节标题会放入提示词
             
         Returns:
             dict: {
@@ -763,9 +1019,26 @@ class Classifier:
                         'source': 'LLM逐级分类'
                     })
             
+            # 项目编号前缀提示：完整分类路径作为候选，分类分支只作为参考信息
+            hint_text = ""
+            if code_hint:
+                hint_text = f"\n历史参考：{code_hint.describe()}\n"
+                if (len(code_hint.category_path.split(os.sep)) == 3 and
+                        not any(cat['path'] == code_hint.category_path for cat in candidate_categories)):
+                    candidate_categories.append({
+                        'path': code_hint.category_path,
+                        'score': None,
+                        'source': '项目编号前缀'
+                    })
+            
             if not candidate_categories:
                 return None
             
+            content_text = self._format_document_signals(document_info)
+            if document_text and document_text.strip():
+                excerpt = document_text.strip()[:self.fulltext_excerpt_chars]
+                content_text += f"\n文档内容摘录：\n{excerpt}\n"
+            
             # 构建分类选项文本
             categories_text = "\n".join([
                 f"{i+1}. {cat['path']} ({cat['source']}"
@@ -773,39 +1046,40 @@ class Classifier:
             ])
             
             # 构建提示词
-            prompt = f"""你是一个专业的文档分类助手。请根据文件名，从以下候选分类中选择最合适的分类。
+            prompt = f"""你是一个专业的文档分类助手。请根据文件名和文档内容，从以下候选分类中选择最合适的分类。
 
 文件名：{file_name_without_ext}
-
+{hint_text}{content_text}
 候选分类列表：
 {categories_text}
 
-请仔细分析文件名，判断文档最应该属于哪个分类。你需要考虑：
-1. 文件名中的关键词和术语
+请仔细分析文件名和文档内容，判断文档最应该属于哪个分类。你需要考虑：
+1. 文件名和文档内容中的关键词和术语
 2. 文件名中提到的物项、设备或材料
 3. 文件名的技术领域和应用场景
 4. 向量检索的相似度分数（如果提供）
 5. LLM逐级分类的结果（如果提供）
+6. 同一项目编号前缀的历史分类（如果提供）
+7. 文档标题、主题、关键词和章节标题（如果提供）
 
-重要：你的最终回答必须严格按照以下JSON格式输出，不要添加任何其他文字：
-{{"category":"大类/中类/小类", "reason":"你的分类理由，说明为什么选择这个分类"}}
-
-其中：
-- "category" 必须是上面候选分类列表中的一个完整分类路径
-- "reason" 是你选择该分类的详细理由，应该基于文件名进行分析，并说明为什么选择这个分类而不是其他候选分类
+{self._fusion_output_instruction()}
 
 请直接输出JSON格式，不要在前面添加任何提示文字。"""
             
-            # 调用大模型
-            response = sync_llm.chat.completions.create(
-                model="qwen3-max",
-                messages=[
-                    {"role": "system", "content": "你是一个专业的文档分类助手，擅长根据文件名判断文档的分类。你必须严格按照用户要求的JSON格式返回结果，不要添加任何额外的文字说明。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
+            # 调用大模型（不生成理由时只需输出分类路径，输出token大幅减少）
+            with self.metrics.timer('llm_fusion', file=file_name_without_ext,
+                                    defer_reason=self.defer_reason) as fields:
+                response = sync_llm.chat.completions.create(
+                    model="qwen3-max",
+                    messages=[
+                        {"role": "system", "content": "你是一个专业的文档分类助手，擅长根据文件名判断文档的分类。你必须严格按照用户要求的JSON格式返回结果，不要添加任何额外的文字说明。"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=60 if self.defer_reason else 500
+                )
+                if getattr(response, 'usage', None) is not None:
+                    fields['completion_tokens'] = response.usage.completion_tokens
             
             result_text = response.choices[0].message.content.strip()
             
@@ -826,6 +1100,16 @@ class Classifier:
                             break
                     
                     if valid_category:
+                        if self.defer_reason:
+                            # 记录上下文，查看详情时再生成理由
+                            self._remember_reason_context(file_path, {
+                                'file_name': file_name_without_ext,
+                                'hint_text': hint_text,
+                                'content_text': content_text,
+                                'categories_text': categories_text,
+                                'category_path': valid_category
+                            })
+                            reason = None
                         return {
                             'category_path': valid_category,
                             'reason': reason
@@ -862,82 +1146,412 @@ class Classifier:
             print(f"基于文件名的LLM分类错误: {e}")
             return None
     
-    def classify_with_fulltext_llm(self, file_path):
+    def _fusion_output_instruction(self):
+        """融合分类提示词中的输出格式要求（是否包含理由取决于 defer_reason）"""
+        if self.defer_reason:
+            return """重要：你的最终回答必须严格按照以下JSON格式输出，不要添加任何其他文字，也不要输出理由：
+{"category":"大类/中类/小类"}
+
+其中 "category" 必须是上面候选分类列表中的一个完整分类路径"""
+        return """重要：你的最终回答必须严格按照以下JSON格式输出，不要添加任何其他文字：
+{"category":"大类/中类/小类", "reason":"你的分类理由，说明为什么选择这个分类"}
+
+其中：
+- "category" 必须是上面候选分类列表中的一个完整分类路径
+- "reason" 是你选择该分类的详细理由，应该基于文件名进行分析，并说明为什么选择这个分类而不是其他候选分类"""
+    
+    def _remember_reason_context(self, file_path, context):
+        """记录生成理由所需的上下文（超出 reason_context_limit 时丢弃最早的）"""
+        file_path = str(file_path)
+        with self._reason_lock:
+            self._reason_contexts[file_path] = context
+            self._reason_contexts.move_to_end(file_path)
+            while len(self._reason_contexts) > self.reason_context_limit:
+                self._reason_contexts.popitem(last=False)
+            self._reason_cache.pop(file_path, None)
+    
+    def explain_classification(self, file_path, category_path=None):
         """
-        使用文件名、向量检索和LLM逐级分类结果进行最终分类判断
+        按需生成分类理由（结果缓存，同一文件只生成一次）
         
-        工作流程：
-        1. 同时进行向量检索（使用分位数筛选0.9）和LLM逐级分类
-        2. 将向量检索筛选后的结果和LLM逐级分类结果一起传入 _classify_with_fulltext_and_llm
-        3. 由模型判断最终分类
+        Args:
+            file_path: 文件路径
+            category_path: 分类路径；本次运行中没有该文件的分类上下文时使用
+            
+        Returns:
+            str: 分类理由，生成失败时返回 None
         """
+        file_path = str(file_path)
+        if file_path in self._reason_cache:
+            return self._reason_cache[file_path]
+        
+        with self._reason_lock:
+            context = self._reason_contexts.get(file_path)
+        if context is None:
+            if not category_path:
+                return None
+            context = {
+                'file_name': os.path.splitext(os.path.basename(file_path))[0],
+                'hint_text': "",
+                'categories_text': f"1. {category_path}",
+                'category_path': category_path
+            }
+        
+        prompt = f"""你是一个专业的文档分类助手。下面的文档已被归入分类"{context['category_path']}"，请说明分类理由。
+
+文件名：{context['file_name']}
+{context['hint_text']}{context.get('content_text', '')}
+候选分类列表：
+{context['categories_text']}
+
+请基于文件名中的关键词、物项、设备或材料以及技术领域进行分析，说明为什么选择这个分类而不是其他候选分类。
+直接输出理由文字，不要输出JSON。"""
+        
         try:
-            file_name = os.path.basename(file_path)
-            file_name_without_ext = os.path.splitext(file_name)[0]
-            
-            # 1. 向量检索获取筛选后的结果（使用分位数筛选0.9）
-            embedding_results = self._get_top_score_embedding_results(file_path, n_results=100)
-            
-            # 2. 同时进行LLM逐级分类
-            llm_category_path = None
-            try:
-                llm_category_path = self._classify_with_llm(file_name_without_ext)
-            except Exception as e:
-                print(f"LLM逐级分类错误: {e}")
-            
-            # 3. 如果向量检索没有结果，且LLM逐级分类也没有结果
-            if not embedding_results and not llm_category_path:
-                return {
-                    'category_path': '其他/未分类',
-                    'reason': '向量检索和LLM逐级分类均未找到匹配分类',
-                    'similarity_score': None
-                }
-            
-            # 4. 如果向量检索没有结果，但LLM逐级分类有结果
-            if not embedding_results and llm_category_path:
-                category_result = os.sep.join(llm_category_path) if isinstance(llm_category_path, list) else llm_category_path
-                return {
-                    'category_path': category_result,
-                    'reason': '向量检索未找到匹配结果，使用LLM逐级分类结果',
-                    'similarity_score': None
-                }
-            
-            llm_result = self._classify_with_fulltext_and_llm(file_path, embedding_results, llm_category_path)
-            print(llm_result)
+            with self.metrics.timer('llm_explain', file=context['file_name']):
+                response = sync_llm.chat.completions.create(
+                    model="qwen3-max",
+                    messages=[
+                        {"role": "system", "content": "你是一个专业的文档分类助手，擅长解释文档的分类依据。"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=500
+                )
+            reason = response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"生成分类理由错误: {e}")
+            return None
+        
+        with self._reason_lock:
+            self._reason_cache[file_path] = reason
+            self._reason_contexts.pop(file_path, None)
+        return reason
+    
+    def explain_record(self, file_manager, file_path):
+        """
+        取得文件记录的分类理由：记录中没有理由时按需生成，并保存到记录中
+        
+        Args:
+            file_manager: 保存分类结果的 FileManager
+            file_path: 文件路径
             
-            if llm_result:
-                # 添加相似度分数（如果有）
-                if embedding_results:
-                    llm_result['similarity_score'] = embedding_results[0]['similarity_score']
-                else:
-                    llm_result['similarity_score'] = None
-                return llm_result
-            else:
-                # 如果LLM分类失败，优先使用向量检索结果，其次使用LLM逐级分类结果
-                if embedding_results:
-                    return {
-                        'category_path': embedding_results[0]['category_path'],
-                        'reason': 'LLM分类失败，使用向量检索相似度最高的分类',
-                        'similarity_score': embedding_results[0]['similarity_score']
-                    }
-                elif llm_category_path:
-                    category_result = os.sep.join(llm_category_path) if isinstance(llm_category_path, list) else llm_category_path
-                    return {
-                        'category_path': category_result,
-                        'reason': 'LLM分类失败，使用LLM逐级分类结果',
-                        'similarity_score': None
-                    }
-                else:
-                    return {
-                        'category_path': '其他/未分类',
-                        'reason': 'LLM分类失败，且无其他可用结果',
-                        'similarity_score': None
-                    }
-                
+        Returns:
+            str: 分类理由，记录不存在或生成失败时返回 None
+        """
+        file_info = file_manager.get_file(file_path)
+        if not file_info:
+            return None
+        if file_info.get('reason'):
+            return file_info['reason']
+        
+        reason = self.explain_classification(file_path, file_info['category'])
+        if reason:
+            file_manager.update_file(file_path, reason=reason)
+        return reason
+    
+    def classify_with_fulltext_llm(self, file_path, category_tree=None):
+        """
+        使用文件名、向量检索和LLM逐级分类结果进行最终分类判断
+        
+        工作流程（在 fulltext_pipeline 上按依赖关系执行，见 _build_fulltext_pipeline）：
+        0. 查询项目编号前缀索引，证据充分时直接返回，否则作为提示传给后续步骤
+        1. 同时进行向量检索（使用分位数筛选0.9）、LLM逐级分类和文档正文提取
+        2. 将向量检索筛选后的结果、LLM逐级分类结果和正文摘录一起传入 _classify_with_fulltext_and_llm
+        3. 由模型判断最终分类，失败时依次回退到向量检索、LLM逐级分类的结果
+        
+        结果字典中的 'taxonomy_version' 是分类使用的分类树版本
+        """
+        try:
+            context = self._get_fulltext_pipeline().run(self._fulltext_inputs(file_path, category_tree))
+            return self._fulltext_result_of(context)
         except Exception as e:
             print(f"文件名LLM分类错误: {e}")
             return None
     
+    def classify_files_with_fulltext_llm(self, file_paths, max_parallel=4, category_tree=None):
+        """
+        并发地对多个文件执行 classify_with_fulltext_llm
+        
+        Args:
+            file_paths: 文件路径列表
+            max_parallel: 同时处理的文件数
+            category_tree: 使用的分类树，为None时使用当前分类树（整批文件使用同一个）
+            
+        Returns:
+            dict: {文件路径: 分类结果字典或None}
+        """
+        tree = category_tree or self.category_tree
+        contexts = self._get_fulltext_pipeline().run_many(
+            [self._fulltext_inputs(file_path, tree) for file_path in file_paths],
+            max_parallel=max_parallel
+        )
+        return {file_path: (self._fulltext_result_of(context) if context else None)
+                for file_path, context in zip(file_paths, contexts)}
+    
+    def _fulltext_inputs(self, file_path, category_tree=None):
+        """全文LLM分类流水线的输入：文件路径和开始时取得的分类树"""
+        return {'file_path': file_path, 'category_tree': category_tree or self.category_tree}
+    
+    def _fulltext_result_of(self, context):
+        """从流水线上下文取出分类结果，并标记分类树版本"""
+        result = context.get('result')
+        tree = context.get('category_tree')
+        if result is not None and tree is not None:
+            result['taxonomy_version'] = tree.version
+        return result
+    
+    def _get_fulltext_pipeline(self):
+        """获取全文LLM分类流水线（懒加载）"""
+        if self.fulltext_pipeline is None:
+            self.fulltext_pipeline = self._build_fulltext_pipeline()
+        return self.fulltext_pipeline
+    
+    def _build_fulltext_pipeline(self):
+        """
+        构建全文LLM分类流水线
+        
+        节点：code_hint → (embedding, stepwise_llm, extract) → chunks → fusion → result
+        启用内容感知检索时为 extract → keyphrases → embedding，向量检索使用关键词查询
+        可以通过 self.fulltext_pipeline.add_node 增加或替换节点
+        
+        Returns:
+            Pipeline: 流水线
+        """
+        def file_name_of(ctx):
+            return os.path.splitext(os.path.basename(ctx['file_path']))[0]
+        
+        def not_resolved(ctx):
+            hint = ctx.get('code_hint')
+            return not (hint and hint.strong)
+        
+        content_query = self.content_query and self.keyphrase_model is not None
+        
+        nodes = [
+            PipelineNode(
+                'code_hint',
+                lambda ctx: self.code_index.lookup(os.path.basename(ctx['file_path']))
+            ),
+            PipelineNode(
+                'keyphrases',
+                lambda ctx: self._build_keyphrase_query(ctx['file_path'], ctx['extract']),
+                deps=['extract'],
+                when=lambda ctx: content_query and bool(ctx.get('extract')),
+                timeout=10,
+                fallback=lambda ctx, error: None
+            ),
+            PipelineNode(
+                'embedding',
+                lambda ctx: self._get_top_score_embedding_results(
+                    ctx['file_path'], n_results=100, query_text=(ctx.get('keyphrases') or {}).get('query')),
+                deps=['code_hint', 'keyphrases'] if content_query else ['code_hint'],
+                when=not_resolved,
+                timeout=30,
+                max_concurrency=8,
+                fallback=lambda ctx, error: []
+            ),
+            PipelineNode(
+                'stepwise_llm',
+                lambda ctx: self._classify_with_llm(file_name_of(ctx), ctx.get('category_tree')),
+                deps=['code_hint'],
+                when=not_resolved,
+                timeout=120,
+                max_concurrency=4
+            ),
+            PipelineNode(
+                'extract',
+                lambda ctx: self._extract_document(ctx['file_path']),
+                deps=['code_hint'],
+                when=lambda ctx: not_resolved(ctx) and self.extractor.supports(ctx['file_path']),
+                # 提取器内部有单文件超时，这里再留出计算哈希和启动工作进程的余量
+                timeout=self.extractor.timeout + 15,
+                max_concurrency=self.extractor.max_workers
+            ),
+            PipelineNode(
+                'chunks',
+                lambda ctx: self._select_document_chunks(ctx['file_path'], ctx['extract']['text'], ctx['embedding']),
+                deps=['embedding', 'extract'],
+                when=lambda ctx: bool((ctx.get('extract') or {}).get('text')) and bool(ctx.get('embedding')),
+                timeout=30,
+                max_concurrency=8
+            ),
+            PipelineNode(
+                'fusion',
+                # 片段选择失败时退回正文开头的摘录
+                lambda ctx: self._classify_with_fulltext_and_llm(
+                    ctx['file_path'], ctx['embedding'], ctx['stepwise_llm'], ctx['code_hint'],
+                    ctx['chunks'] or (ctx['extract'] or {}).get('text'), ctx['extract']),
+                deps=['code_hint', 'embedding', 'stepwise_llm', 'chunks'],
+                when=lambda ctx: not_resolved(ctx) and bool(ctx.get('embedding')),
+                timeout=60,
+                max_concurrency=4
+            ),
+            PipelineNode(
+                'result',
+                self._assemble_fulltext_result,
+                deps=['code_hint', 'embedding', 'stepwise_llm', 'fusion']
+            ),
+        ]
+        return Pipeline(nodes, metrics=self.metrics, name="fulltext_llm")
+    
+    def _extract_document(self, file_path):
+        """
+        按 extract_mode 提取文档内容，失败时返回 None（分类仍可仅依据文件名进行）
+        
+        Returns:
+            dict: 提取结果（含 'text' 以及 'title'/'subject'/'keywords'/'headings'）或 None
+        """
+        with self.metrics.timer('extract', file=os.path.basename(str(file_path)), mode=self.extract_mode) as fields:
+            result = self.extractor.extract(file_path, mode=self.extract_mode)
+            fields['cached'] = result.get('cached', False)
+            fields['chars'] = len(result.get('text') or '')
+            fields['truncated'] = result.get('truncated', False)
+        if result.get('error'):
+            print(f"提取文档内容失败 {file_path}: {result['error']}")
+            return None
+        return result
+    
+    def _build_keyphrase_query(self, file_path, document_info):
+        """
+        用文件名和正文（含标题、主题、关键词、章节标题）的TF-IDF关键词组成简短的检索查询
+        
+        Returns:
+            dict: {'query': 查询字符串, 'terms': [(关键词, 权重), ...]}
+        """
+        file_name = os.path.splitext(os.path.basename(str(file_path)))[0]
+        parts = [document_info.get(field) or '' for field in ('title', 'subject', 'keywords')]
+        parts.extend(document_info.get('headings') or [])
+        parts.append(document_info.get('text') or '')
+        with self.metrics.timer('keyphrase', file=os.path.basename(str(file_path))) as fields:
+            query, terms = self.keyphrase_model.build_query(
+                file_name, "\n".join(parts),
+                max_terms=self.keyphrase_max_terms,
+                max_chars=max(self.keyphrase_query_chars, len(file_name))
+            )
+            fields['terms'] = len(terms)
+            fields['query_chars'] = len(query)
+        return {'query': query, 'terms': terms}
+    
+    def _format_document_signals(self, document_info):
+        """
+        把提取到的标题、主题、关键词和章节标题整理成提示词中的几行
+        
+        Returns:
+            str: 提示词片段，没有可用信息时返回空字符串
+        """
+        if not document_info:
+            return ""
+        lines = []
+        for field, label in (('title', '文档标题'), ('subject', '文档主题'), ('keywords', '关键词')):
+            if document_info.get(field):
+                lines.append(f"{label}：{document_info[field]}")
+        headings = document_info.get('headings') or []
+        if headings:
+            lines.append("章节标题：" + "；".join(headings[:10]))
+        return "\n" + "\n".join(lines) + "\n" if lines else ""
+    
+    def _embed_category_paths(self, category_paths):
+        """
+        获取分类路径的向量（路径各级名称用空格连接后嵌入，结果缓存）
+        
+        Returns:
+            list: 与 category_paths 一一对应的向量
+        """
+        missing = [path for path in dict.fromkeys(category_paths) if path not in self._category_path_embeddings]
+        if missing:
+            embeddings = self.embedding_function([path.replace(os.sep, ' ') for path in missing])
+            self._category_path_embeddings.update(zip(missing, embeddings))
+        return [self._category_path_embeddings[path] for path in category_paths]
+    
+    def _select_document_chunks(self, file_path, document_text, embedding_results):
+        """
+        把正文分块并分批嵌入，按与候选分类的相关度选出片段，总长度不超过 chunk_token_budget
+        
+        Args:
+            file_path: 文件路径
+            document_text: 提取的正文
+            embedding_results: 向量检索筛选后的候选分类
+            
+        Returns:
+            str: 选中的片段（按文档顺序，以省略号分隔），没有可用片段时返回 None
+        """
+        chunks = split_text(document_text, self.chunk_chars)[:self.max_document_chunks]
+        candidates = list(dict.fromkeys(result['category_path'] for result in embedding_results))
+        if not chunks or not candidates:
+            return None
+        
+        self._get_vector_collection()
+        with self.metrics.timer('chunk_select', file=os.path.basename(str(file_path))) as fields:
+            chunk_embeddings = []
+            for start in range(0, len(chunks), self.chunk_embed_batch_size):
+                chunk_embeddings.extend(self.embedding_function(chunks[start:start + self.chunk_embed_batch_size]))
+            
+            # 候选分类取各自最高的检索相似度作为权重
+            weights = {}
+            for result in embedding_results:
+                weights.setdefault(result['category_path'], result['similarity_score'])
+            scores = score_chunks(chunk_embeddings, self._embed_category_paths(candidates),
+                                  [weights[path] for path in candidates])
+            selected = select_top_chunks(chunks, scores, token_budget=self.chunk_token_budget,
+                                         max_chunks=self.max_prompt_chunks)
+            fields['chunks'] = len(chunks)
+            fields['selected'] = len(selected)
+            fields['tokens'] = sum(estimate_tokens(chunks[i]) for i in selected)
+        
+        if not selected:
+            return None
+        return "\n……\n".join(chunks[i] for i in selected)
+    
+    def _assemble_fulltext_result(self, ctx):
+        """
+        流水线最后一步：根据各节点结果给出最终分类（含回退逻辑）
+        
+        Returns:
+            dict: {'category_path', 'reason', 'similarity_score'}，
+                  由项目编号前缀直接给出的结果另有 'code_hint': True
+        """
+        code_hint = ctx.get('code_hint')
+        if code_hint and code_hint.strong:
+            return {
+                'category_path': code_hint.category_path,
+                'reason': f'项目编号前缀命中：{code_hint.describe()}',
+                'similarity_score': code_hint.confidence,
+                'code_hint': True
+            }
+        
+        embedding_results = ctx.get('embedding')
+        llm_category_path = ctx.get('stepwise_llm')
+        llm_result = ctx.get('fusion')
+        
+        # 如果向量检索没有结果，且LLM逐级分类也没有结果
+        if not embedding_results and not llm_category_path:
+            return {
+                'category_path': '其他/未分类',
+                'reason': '向量检索和LLM逐级分类均未找到匹配分类',
+                'similarity_score': None
+            }
+        
+        # 如果向量检索没有结果，但LLM逐级分类有结果
+        if not embedding_results and llm_category_path:
+            category_result = os.sep.join(llm_category_path) if isinstance(llm_category_path, list) else llm_category_path
+            return {
+                'category_path': category_result,
+                'reason': '向量检索未找到匹配结果，使用LLM逐级分类结果',
+                'similarity_score': None
+            }
+        
+        if llm_result:
+            # 添加相似度分数
+            llm_result['similarity_score'] = embedding_results[0]['similarity_score']
+            return llm_result
+        
+        # 如果LLM分类失败，使用向量检索结果
+        return {
+            'category_path': embedding_results[0]['category_path'],
+            'reason': 'LLM分类失败，使用向量检索相似度最高的分类',
+            'similarity_score': embedding_results[0]['similarity_score']
+        }
+    
     def _fallback_to_llm_classify(self, file_path, reason):
         """
         回退到逐级LLM分类方法
@@ -983,8 +1597,13 @@ class Classifier:
             }
     
     def close(self):
-        """关闭数据库连接"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
+        """停止后台线程，释放资源（数据库连接由共享连接池管理）"""
+        self.stop_category_refresher()
+        if self._query_executor:
+            self._query_executor.shutdown(wait=False)
+            self._query_executor = None
+        if self.fulltext_pipeline:
+            self.fulltext_pipeline.close()
+            self.fulltext_pipeline = None
+        self.extractor.close()
 
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+项目编号前缀索引
+从文件名中提取文档编号（如 JDYYD-021-CG-013），根据历史分类记录学习
+编号前缀 → 分类路径 的统计，在向量检索和LLM之前给出快速判断或分类提示
+"""
+
+import os
+import re
+from collections import Counter, defaultdict
+
+
+# 文档编号：字母开头，至少包含一个连字符，如 JDYYD-021-CG-013、YFJD2-013-SB9-001、QBGCA-CG-052
+CODE_PATTERN = re.compile(r'(?<![A-Za-z0-9])[A-Z][A-Z0-9]*(?:-[A-Z0-9]+)+')
+
+UNCLASSIFIED = "其他/未分类"
+
+
+class CodeHint:
+    """编号前缀查询结果"""
+
+    __slots__ = ('code', 'prefix', 'category_path', 'count', 'support', 'strong')
+
+    def __init__(self, code, prefix, category_path, count, support, strong):
+        self.code = code
+        self.prefix = prefix
+        self.category_path = category_path  # 完整分类路径或分类分支（如 '泵及泵配件/离心泵'）
+        self.count = count
+        self.support = support
+        self.strong = strong
+
+    @property
+    def confidence(self):
+        return self.count / self.support if self.support else 0.0
+
+    def describe(self):
+        """用于提示词的一行说明"""
+        return (f"文件编号 {self.code} 的前缀 {self.prefix} 在历史记录中 "
+                f"{self.count}/{self.support} 次归入 {self.category_path}")
+
+    def __repr__(self):
+        return (f"CodeHint(prefix={self.prefix!r}, category_path={self.category_path!r}, "
+                f"{self.count}/{self.support}, strong={self.strong})")
+
+
+class ProjectCodeIndex:
+    """编号前缀 → 分类路径 统计索引"""
+
+    def __init__(self, min_support=3, min_confidence=0.8, hint_confidence=0.6):
+        """
+        初始化索引
+
+        Args:
+            min_support: 前缀至少出现的历史文件数，才参与判断
+            min_confidence: 直接给出分类所需的占比（强证据）
+            hint_confidence: 作为分类分支提示所需的占比
+        """
+        self.min_support = min_support
+        self.min_confidence = min_confidence
+        self.hint_confidence = hint_confidence
+        # 前缀 -> Counter(完整分类路径)
+        self.prefix_stats = defaultdict(Counter)
+
+    @staticmethod
+    def extract_codes(file_name):
+        """
+        从文件名中提取文档编号
+
+        Args:
+            file_name: 文件名或文件路径
+
+        Returns:
+            list: 编号列表，如 ['JDYYD-021-CG-013']
+        """
+        base = os.path.splitext(os.path.basename(str(file_name)))[0]
+        return CODE_PATTERN.findall(base)
+
+    @staticmethod
+    def code_prefixes(code):
+        """
+        生成编号的前缀（不含完整编号本身，完整编号一般只对应单个文件）
+
+        Args:
+            code: 文档编号，如 'JDYYD-021-CG-013'
+
+        Returns:
+            list: 由长到短的前缀，如 ['JDYYD-021-CG', 'JDYYD-021', 'JDYYD']
+        """
+        parts = code.split('-')
+        return ['-'.join(parts[:i]) for i in range(len(parts) - 1, 0, -1)]
+
+    def learn(self, file_path, category_path):
+        """
+        记录一条分类结果
+
+        Args:
+            file_path: 文件路径或文件名
+            category_path: 分类路径（字符串或元组(路径, 分数)）
+        """
+        if isinstance(category_path, tuple):
+            category_path = category_path[0]
+        if not category_path or category_path == UNCLASSIFIED:
+            return
+        for code in self.extract_codes(file_path):
+            for prefix in self.code_prefixes(code):
+                self.prefix_stats[prefix][category_path] += 1
+
+    def fit(self, records):
+        """
+        从历史记录学习（records 为 FileManager.get_all_files() 的返回值）
+
+        Args:
+            records: 文件信息列表，每个元素包含 'file_name'/'original_path' 和 'category'；
+                     由项目编号前缀直接给出的结果（'code_hint' 为真）跳过，避免错误的前缀自我强化
+        """
+        for record in records:
+            if record.get('code_hint'):
+                continue
+            name = record.get('file_name') or record.get('original_path')
+            if name:
+                self.learn(name, record.get('category'))
+        return self
+
+    def _branch_counts(self, counter, depth):
+        """按分类路径前 depth 级汇总计数"""
+        branches = Counter()
+        for path, count in counter.items():
+            parts = path.split(os.sep)
+            if len(parts) >= depth:
+                branches[os.sep.join(parts[:depth])] += count
+        return branches
+
+    def lookup(self, file_name):
+        """
+        查询文件名对应的分类
+
+        最长的、有足够历史支持的前缀优先：若其最常见的完整分类占比达到 min_confidence，
+        返回强结果；否则返回占比达到 hint_confidence 的最深分类分支作为提示。
+
+        Args:
+            file_name: 文件名或文件路径
+
+        Returns:
+            CodeHint 或 None
+        """
+        best_hint = None
+        for code in self.extract_codes(file_name):
+            for prefix in self.code_prefixes(code):
+                counter = self.prefix_stats.get(prefix)
+                if not counter:
+                    continue
+                support = sum(counter.values())
+                if support < self.min_support:
+                    continue
+
+                category_path, count = counter.most_common(1)[0]
+                if count / support >= self.min_confidence:
+                    return CodeHint(code, prefix, category_path, count, support, True)
+
+                if best_hint is None:
+                    # 完整路径不够集中时，退到更粗的分类分支
+                    for depth in (2, 1):
+                        branches = self._branch_counts(counter, depth)
+                        if not branches:
+                            continue
+                        branch, branch_count = branches.most_common(1)[0]
+                        if branch_count / support >= self.hint_confidence:
+                            best_hint = CodeHint(code, prefix, branch, branch_count, support, False)
+                            break
+        return best_hint
+
+    def __len__(self):
+        return len(self.prefix_stats)
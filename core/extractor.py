@@ -0,0 +1,643 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文档内容提取
+在独立的工作进程中提取 PDF/DOCX/DOC/文本文件的正文：每个文件有超时和内存上限，
+按页/段落流式读取，达到字符预算后立即停止；结果按文件内容哈希缓存在磁盘上，
+重复运行时不再解析。
+工作进程由多个分类线程共享，每个进程同时只执行一个文件，超时从该文件开始执行时计算，
+超时或异常退出时只终止并替换这一个进程，不影响其他线程正在执行的文件
+"""
+
+import os
+import sys
+import json
+import time
+import multiprocessing
+import multiprocessing.connection
+import re
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from core.hashing import file_content_hash
+from core.ole2_reader import OleFile, iter_doc_text, read_summary_information
+
+# 文档提取相关导入
+try:
+    import PyPDF2
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+    print("警告: PyPDF2未安装，无法提取PDF文档内容")
+
+try:
+    from docx import Document
+    DOCX_AVAILABLE = True
+except ImportError:
+    DOCX_AVAILABLE = False
+    print("警告: python-docx未安装，无法提取DOCX文档内容")
+
+try:
+    import win32com.client
+    DOC_AVAILABLE = True
+except ImportError:
+    DOC_AVAILABLE = False
+    # 只在Windows系统上提示
+    if sys.platform == "win32":
+        print("警告: pywin32未安装，OLE2读取失败的DOC文档无法用Word提取")
+
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.csv'}
+SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.doc'} | TEXT_EXTENSIONS
+
+# 缓存格式版本，提取逻辑变化时递增，使旧缓存失效
+CACHE_VERSION = 4
+
+# 工作进程启动（导入解析库）的最长等待时间（秒），不计入文件的提取超时
+WORKER_START_TIMEOUT = 60
+
+# 提取模式：full 按字符预算读取正文；preview 只读取元数据、章节标题和开头几页
+MODE_FULL = "full"
+MODE_PREVIEW = "preview"
+
+MAX_HEADINGS = 20
+# 模板中的书签名（如 "SQ密级"、"PO_SQ编写5"）不是章节标题
+BOOKMARK_NAME = re.compile(r'^(?:[A-Z]+_)*[A-Z]{2,}\S*$')
+METADATA_FIELDS = ('title', 'subject', 'keywords')
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+CORE_PROPERTY_TAGS = {
+    '{http://purl.org/dc/elements/1.1/}title': 'title',
+    '{http://purl.org/dc/elements/1.1/}subject': 'subject',
+    '{http://schemas.openxmlformats.org/package/2006/metadata/core-properties}keywords': 'keywords',
+}
+
+# PDF字体编码无法解析时会产生控制字符，写入提示词前去掉（保留换行和制表符）
+CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b-\x1f\x7f]')
+
+
+class TextBudget:
+    """按字符预算累积文本，超出预算后不再接收"""
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+        self.truncated = False
+
+    def add(self, text):
+        """
+        追加一段文本
+
+        Returns:
+            bool: True 表示预算已用完，调用方应停止读取
+        """
+        text = CONTROL_CHARS.sub('', text or '')
+        if not text:
+            return self.full
+        if self.parts:
+            text = "\n" + text  # 与 text 属性的拼接方式一致，换行也计入预算
+        remaining = self.max_chars - self.length
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self.parts.append(text)
+        self.length += len(text)
+        return self.full
+
+    @property
+    def full(self):
+        return self.length >= self.max_chars
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+
+def _limit_memory(memory_limit_mb):
+    """工作进程初始化：限制进程地址空间（仅POSIX系统有效）"""
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+        limit = int(memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _extract_pdf(file_path, budget):
+    """逐页提取PDF，返回已读取的页数"""
+    reader = PyPDF2.PdfReader(file_path)
+    pages = 0
+    for page in reader.pages:
+        pages += 1
+        if budget.add(page.extract_text() or ""):
+            break
+    return pages
+
+
+def _extract_docx(file_path, budget):
+    """逐段提取DOCX（含表格），返回已读取的段落数"""
+    document = Document(file_path)
+    count = 0
+    for paragraph in document.paragraphs:
+        count += 1
+        if budget.add(paragraph.text):
+            return count
+    for table in document.tables:
+        for row in table.rows:
+            count += 1
+            if budget.add(" ".join(cell.text for cell in row.cells)):
+                return count
+    return count
+
+
+def _extract_doc(file_path, budget):
+    """逐片段提取DOC：优先使用纯Python的OLE2读取器，失败时在Windows上回退到Word COM接口"""
+    try:
+        pieces = 0
+        # 域指令和控制字符会被去掉，按原始字符数限制会取不满预算，这里由预算决定何时停止
+        for text in iter_doc_text(file_path):
+            pieces += 1
+            if budget.add(text):
+                break
+        return pieces
+    except ValueError as e:
+        if not DOC_AVAILABLE:
+            raise
+        print(f"OLE2读取失败，改用Word提取: {e}")
+    return _extract_doc_with_word(file_path, budget)
+
+
+def _extract_doc_with_word(file_path, budget):
+    """通过Word COM接口提取DOC（仅Windows）"""
+    word = win32com.client.DispatchEx("Word.Application")
+    word.Visible = False
+    try:
+        document = word.Documents.Open(os.path.abspath(file_path), ReadOnly=True)
+        try:
+            budget.add(document.Content.Text)
+        finally:
+            document.Close(False)
+    finally:
+        word.Quit()
+    return 1
+
+
+def _clean_metadata_value(value):
+    """整理元数据值：合并空白、截断，去掉密级标签等XML内容"""
+    value = " ".join(str(value or "").split())
+    if not value or value.startswith('<'):
+        return ""
+    return value[:200]
+
+
+def _preview_pdf(file_path, budget, max_pages, info):
+    """读取PDF文档信息、一级书签和前几页"""
+    reader = PyPDF2.PdfReader(file_path)
+    metadata = reader.metadata or {}
+    for field in METADATA_FIELDS:
+        info[field] = _clean_metadata_value(metadata.get('/' + field.capitalize()))
+    try:
+        for item in reader.outline:
+            # 嵌套列表是下级书签，只取一级
+            if isinstance(item, list) or not getattr(item, 'title', None):
+                continue
+            title = str(item.title).strip()
+            if title and not BOOKMARK_NAME.match(title):
+                info['headings'].append(title)
+                if len(info['headings']) >= MAX_HEADINGS:
+                    break
+    except Exception:
+        pass
+    pages = 0
+    for page in reader.pages:
+        if pages >= max_pages:
+            budget.truncated = True
+            break
+        pages += 1
+        if budget.add(page.extract_text() or ""):
+            break
+    return pages
+
+
+def _is_docx_heading(paragraph):
+    """段落是否为标题：标题样式（Heading*/Title/标题*/中文模板的数字样式ID）或设置了大纲级别"""
+    properties = paragraph.find(W_NS + 'pPr')
+    if properties is None:
+        return False
+    if properties.find(W_NS + 'outlineLvl') is not None:
+        return True
+    style = properties.find(W_NS + 'pStyle')
+    if style is None:
+        return False
+    style_id = style.get(W_NS + 'val', '')
+    return style_id.lower().startswith(('heading', 'title')) or style_id.startswith('标题') or style_id.isdigit()
+
+
+def _preview_docx(file_path, budget, info):
+    """读取 docProps/core.xml，并用 iterparse 流式读取 document.xml 的开头段落（不构建完整DOM）"""
+    with zipfile.ZipFile(file_path) as archive:
+        try:
+            core = ET.fromstring(archive.read('docProps/core.xml'))
+            for element in core:
+                field = CORE_PROPERTY_TAGS.get(element.tag)
+                if field:
+                    info[field] = _clean_metadata_value(element.text)
+        except KeyError:
+            pass
+
+        count = 0
+        with archive.open('word/document.xml') as document:
+            stack = []
+            body = None
+            for event, element in ET.iterparse(document, events=('start', 'end')):
+                if event == 'start':
+                    stack.append(element)
+                    if element.tag == W_NS + 'body':
+                        body = element
+                    continue
+                stack.pop()
+                if element.tag == W_NS + 'p':
+                    text = "".join(t.text or "" for t in element.iter(W_NS + 't')).strip()
+                    if text:
+                        count += 1
+                        if len(info['headings']) < MAX_HEADINGS and len(text) <= 80 and _is_docx_heading(element):
+                            info['headings'].append(text)
+                        if budget.add(text):
+                            break
+                # 已处理的正文顶层元素从树上移除，内存占用不随文档长度增长
+                if body is not None and len(stack) == 2 and stack[-1] is body:
+                    body.remove(element)
+        return count
+
+
+def _preview_doc(file_path, budget, info):
+    """读取DOC摘要信息和正文开头"""
+    with OleFile(file_path) as ole:
+        summary = read_summary_information(ole)
+    for field in METADATA_FIELDS:
+        info[field] = _clean_metadata_value(summary.get(field))
+    return _extract_doc(file_path, budget)
+
+
+def _extract_text_file(file_path, budget):
+    """分块读取纯文本文件"""
+    chunks = 0
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                break
+            chunks += 1
+            if budget.add(chunk):
+                break
+    return chunks
+
+
+def extract_text(file_path, max_chars, mode=MODE_FULL, max_pages=2):
+    """
+    在当前进程中提取文档正文（进程池工作函数）
+
+    Args:
+        file_path: 文件路径
+        max_chars: 字符预算
+        mode: MODE_FULL 读取正文；MODE_PREVIEW 读取元数据、章节标题和开头部分
+        max_pages: 预览模式下PDF最多读取的页数
+
+    Returns:
+        dict: {'text', 'truncated', 'pages', 'error', 'mode', 'title', 'subject', 'keywords', 'headings'}
+    """
+    budget = TextBudget(max_chars)
+    ext = os.path.splitext(file_path)[1].lower()
+    info = {field: "" for field in METADATA_FIELDS}
+    info['headings'] = []
+    pages = 0
+    error = None
+    preview = mode == MODE_PREVIEW
+    try:
+        if ext == '.pdf':
+            if not PDF_AVAILABLE:
+                raise RuntimeError("PyPDF2未安装")
+            pages = _preview_pdf(file_path, budget, max_pages, info) if preview else _extract_pdf(file_path, budget)
+        elif ext == '.docx':
+            if preview:
+                pages = _preview_docx(file_path, budget, info)
+            elif not DOCX_AVAILABLE:
+                raise RuntimeError("python-docx未安装")
+            else:
+                pages = _extract_docx(file_path, budget)
+        elif ext == '.doc':
+            pages = _preview_doc(file_path, budget, info) if preview else _extract_doc(file_path, budget)
+        elif ext in TEXT_EXTENSIONS:
+            pages = _extract_text_file(file_path, budget)
+        else:
+            raise RuntimeError(f"不支持的文件类型: {ext}")
+    except MemoryError:
+        error = "提取时超出内存上限"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return dict(
+        info,
+        text=budget.text,
+        truncated=budget.truncated,
+        pages=pages,
+        error=error,
+        mode=mode
+    )
+
+
+def _worker_main(conn, memory_limit_mb):
+    """工作进程主循环：启动后先发送就绪消息，再逐个接收 extract_text 的参数并返回结果，收到 None 或连接关闭时退出"""
+    _limit_memory(memory_limit_mb)
+    conn.send("ready")
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        conn.send(extract_text(*job))
+
+
+class _Worker:
+    """一个提取工作进程及其连接（创建时等待进程就绪，启动耗时不计入文件的提取超时）"""
+
+    def __init__(self, context, memory_limit_mb):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        try:
+            ready = self.conn.poll(WORKER_START_TIMEOUT) and self.conn.recv() == "ready"
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self.kill()
+            raise RuntimeError("提取进程启动失败")
+
+    def kill(self):
+        """终止进程（超时或异常退出后调用）"""
+        try:
+            self.process.terminate()
+            self.process.join(timeout=5)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def stop(self):
+        """通知进程退出"""
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        except Exception:
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class DocumentExtractor:
+    """带磁盘缓存的文档正文提取器"""
+
+    def __init__(self, cache_dir="data/extract_cache", max_chars=20000, timeout=30,
+                 memory_limit_mb=1024, max_workers=None, preview_chars=3000, preview_pages=2):
+        """
+        初始化提取器
+
+        Args:
+            cache_dir: 提取结果缓存目录
+            max_chars: 每个文件最多提取的字符数
+            timeout: 每个文件的提取超时（秒）
+            memory_limit_mb: 每个工作进程的内存上限（MB），None表示不限
+            max_workers: 工作进程数，默认为CPU核数（最多4个）
+            preview_chars: 预览模式的字符预算
+            preview_pages: 预览模式下PDF读取的页数
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_chars = max_chars
+        self.preview_chars = preview_chars
+        self.preview_pages = preview_pages
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        # 使用spawn启动工作进程，避免在多线程的分类流水线中fork
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()  # 保护空闲进程列表
+        self._slots = threading.BoundedSemaphore(self.max_workers)  # 所有线程合计最多 max_workers 个进程在执行
+        self._idle = []
+
+    @staticmethod
+    def supports(file_path):
+        """是否支持提取该类型的文件"""
+        return os.path.splitext(str(file_path))[1].lower() in SUPPORTED_EXTENSIONS
+
+    def _budget(self, mode):
+        return self.preview_chars if mode == MODE_PREVIEW else self.max_chars
+
+    def _cache_path(self, content_hash, mode=MODE_FULL):
+        # 哈希带算法前缀（如 "blake2b:..."），按十六进制部分分目录
+        digest = content_hash.split(':')[-1]
+        suffix = ".preview.json" if mode == MODE_PREVIEW else ".json"
+        return self.cache_dir / digest[:2] / f"{content_hash.replace(':', '_')}{suffix}"
+
+    def _load_cached(self, content_hash, mode=MODE_FULL):
+        """读取缓存；缓存的字符预算（或预览页数）不够时视为未命中"""
+        cache_path = self._cache_path(content_hash, mode)
+        if not cache_path.exists():
+            return None
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except Exception:
+            return None
+        if cached.get('version') != CACHE_VERSION:
+            return None
+        max_chars = self._budget(mode)
+        if cached.get('truncated') and (cached.get('max_chars', 0) < max_chars or
+                                        (mode == MODE_PREVIEW and cached.get('max_pages', 0) < self.preview_pages)):
+            return None
+        if len(cached.get('text', '')) > max_chars:
+            cached['text'] = cached['text'][:max_chars]
+            cached['truncated'] = True
+        return cached
+
+    def _save_cached(self, content_hash, result, mode=MODE_FULL):
+        cache_path = self._cache_path(content_hash, mode)
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            record = dict(result, version=CACHE_VERSION, max_chars=self._budget(mode),
+                          max_pages=self.preview_pages, hash=content_hash)
+            tmp_path = cache_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"保存提取缓存失败: {e}")
+
+    def _acquire_worker(self, blocking):
+        """
+        取得一个空闲的工作进程（没有空闲进程时启动新进程）
+
+        Args:
+            blocking: 所有进程都在执行时是否等待
+
+        Returns:
+            _Worker 或 None（不等待且没有可用进程时）
+        """
+        if not self._slots.acquire(blocking=blocking):
+            return None
+        with self._lock:
+            worker = self._idle.pop() if self._idle else None
+        if worker is not None and not worker.process.is_alive():
+            worker.kill()
+            worker = None
+        try:
+            return worker or _Worker(self._context, self.memory_limit_mb)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release_worker(self, worker, reuse=True):
+        """归还工作进程；reuse=False 时终止该进程（超时、异常退出）"""
+        if reuse:
+            with self._lock:
+                self._idle.append(worker)
+        else:
+            worker.kill()
+        self._slots.release()
+
+    def extract(self, file_path, mode=MODE_FULL):
+        """
+        提取单个文件的正文
+
+        Args:
+            file_path: 文件路径
+            mode: MODE_FULL 或 MODE_PREVIEW
+
+        Returns:
+            dict: extract_text 的结果，另含 'hash', 'cached'
+        """
+        return self.extract_many([file_path], mode=mode)[str(file_path)]
+
+    def preview(self, file_path):
+        """快速读取文件的元数据、章节标题和开头部分（见 MODE_PREVIEW）"""
+        return self.extract(file_path, mode=MODE_PREVIEW)
+
+    def extract_many(self, file_paths, mode=MODE_FULL):
+        """
+        批量提取正文：先查缓存，未命中的在进程池中并行提取，内容相同的文件只提取一次
+
+        Args:
+            file_paths: 文件路径列表
+            mode: MODE_FULL 或 MODE_PREVIEW
+
+        Returns:
+            dict: {文件路径: 提取结果}
+        """
+        results = {}
+        pending = {}  # 内容哈希 -> 文件路径列表
+        for file_path in file_paths:
+            file_path = str(file_path)
+            if not self.supports(file_path):
+                results[file_path] = self._error_result(None, "不支持的文件类型")
+                continue
+            try:
+                content_hash = file_content_hash(file_path)
+            except OSError as e:
+                results[file_path] = self._error_result(None, f"无法读取文件: {e}")
+                continue
+            cached = self._load_cached(content_hash, mode)
+            if cached is not None:
+                results[file_path] = dict(cached, cached=True)
+            else:
+                pending.setdefault(content_hash, []).append(file_path)
+
+        for content_hash, result in self._run_in_pool(pending, mode).items():
+            if not result.get('error'):
+                self._save_cached(content_hash, result, mode)
+            for file_path in pending[content_hash]:
+                results[file_path] = dict(result, hash=content_hash, cached=False)
+        return results
+
+    def _run_in_pool(self, pending, mode=MODE_FULL):
+        """
+        在工作进程中提取，每个文件从开始执行起计时，超时的文件只终止执行它的工作进程
+
+        Args:
+            pending: {内容哈希: [文件路径, ...]}
+            mode: 提取模式
+
+        Returns:
+            dict: {内容哈希: 提取结果}
+        """
+        results = {}
+        queue = list(pending)
+        in_flight = {}  # 连接 -> (工作进程, 内容哈希, 开始时间)
+        try:
+            while queue or in_flight:
+                # 取得空闲进程后立即开始执行，开始时间即发送时间；
+                # 本线程没有正在执行的文件时等待其他线程归还进程
+                while queue:
+                    try:
+                        worker = self._acquire_worker(blocking=not in_flight)
+                    except Exception as e:
+                        content_hash = queue.pop(0)
+                        results[content_hash] = self._error_result(content_hash, f"无法启动提取进程: {e}")
+                        continue
+                    if worker is None:
+                        break
+                    content_hash = queue.pop(0)
+                    try:
+                        worker.conn.send((pending[content_hash][0], self._budget(mode), mode, self.preview_pages))
+                    except Exception as e:
+                        self._release_worker(worker, reuse=False)
+                        results[content_hash] = self._error_result(content_hash, f"无法启动提取进程: {e}")
+                        continue
+                    in_flight[worker.conn] = (worker, content_hash, time.monotonic())
+                if not in_flight:
+                    continue
+
+                nearest = min(start + self.timeout for _, _, start in in_flight.values())
+                ready = multiprocessing.connection.wait(list(in_flight),
+                                                        timeout=max(0.0, nearest - time.monotonic()))
+
+                for conn in ready:
+                    worker, content_hash, _ = in_flight.pop(conn)
+                    try:
+                        results[content_hash] = conn.recv()
+                    except (EOFError, OSError):
+                        results[content_hash] = self._error_result(content_hash, "提取进程异常退出（可能超出内存上限）")
+                        self._release_worker(worker, reuse=False)
+                        continue
+                    except Exception as e:
+                        results[content_hash] = self._error_result(content_hash, f"{type(e).__name__}: {e}")
+                    self._release_worker(worker)
+
+                now = time.monotonic()
+                for conn in [c for c, (_, _, start) in in_flight.items() if now - start >= self.timeout]:
+                    worker, content_hash, _ = in_flight.pop(conn)
+                    results[content_hash] = self._error_result(content_hash, f"提取超时（{self.timeout}秒）")
+                    self._release_worker(worker, reuse=False)
+        finally:
+            # 出错退出时终止还在执行的进程并归还名额，避免之后的提取一直等待
+            for worker, _, _ in in_flight.values():
+                self._release_worker(worker, reuse=False)
+        return results
+
+    @staticmethod
+    def _error_result(content_hash, error):
+        return {'text': '', 'truncated': False, 'pages': 0, 'error': error, 'hash': content_hash, 'cached': False,
+                'title': '', 'subject': '', 'keywords': '', 'headings': []}
+
+    def close(self):
+        """结束空闲的工作进程（之后提取时按需重新启动）"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
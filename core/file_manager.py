@@ -2,10 +2,17 @@
 # -*- coding: utf-8 -*-
 """
 文件管理器 - 管理分类后的文件
+文件记录保存在 SQLite（WAL 模式）中，每条记录一行，按分类和内容哈希建索引；
+添加一个文件只写一行，不再重写整个数据库。多条写入可以放在 batch() 中合并为一个事务。
+每个线程使用自己的连接，分类线程写入时界面线程可以同时读取。
+第一次打开时自动导入旧版的 files_db.json（只导入一次，导入记录保存在 meta 表中，JSON 文件保持不变）。
 """
 
 import os
 import json
+import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 
@@ -22,29 +29,160 @@ class FileManager:
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         
-        self.db_file = self.data_dir / "files_db.json"
-        self.files_db = self._load_database()
+        self.db_file = self.data_dir / "files.sqlite3"
+        self.json_file = self.data_dir / "files_db.json"
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        # SQLite 同一时间只允许一个写事务，写入在进程内先排队，避免等待锁超时
+        self._write_lock = threading.RLock()
+        
+        with self._write_lock, self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    category TEXT NOT NULL,
+                    content_hash TEXT,
+                    info TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_category ON files (category)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_files_content_hash ON files (content_hash)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._migrate_json()
+    
+    def _conn(self):
+        """当前线程的连接（第一次使用时创建）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_file), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _migrate_json(self):
+        """
+        导入旧版 files_db.json（只导入一次，数据库中已有的路径保持不变）
+        任何一条记录写入失败时整体回滚，不记录导入，下次打开时重新导入
+        """
+        if not self.json_file.exists() or self._json_imported(self._conn()):
+            return
+        try:
+            with open(self.json_file, 'r', encoding='utf-8') as f:
+                files_db = json.load(f)
+            with self.batch():
+                conn = self._conn()
+                for file_path, file_info in files_db.items():
+                    conn.execute(
+                        "INSERT INTO files (path, category, content_hash, info) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(path) DO NOTHING",
+                        self._row(file_path, file_info)
+                    )
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)",
+                             (json.dumps({'count': len(files_db), 'file': str(self.json_file)}, ensure_ascii=False),))
+            print(f"已从 {self.json_file} 导入 {len(files_db)} 条文件记录")
+        except Exception as e:
+            print(f"导入旧数据库失败: {e}")
+    
+    @staticmethod
+    def _json_imported(conn):
+        """旧版 JSON 是否已导入"""
+        return conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone() is not None
+    
+    @staticmethod
+    def _row(file_path, file_info):
+        """记录对应的 files 表一行 (path, category, content_hash, info)"""
+        return (file_path, file_info.get('category') or "", file_info.get('content_hash'),
+                json.dumps(file_info, ensure_ascii=False))
+    
+    @classmethod
+    def load_records(cls, data_dir="data"):
+        """
+        只读地读取所有文件记录（不创建数据库、不导入 JSON，读完即关闭连接），
+        用于只需要历史记录的场合（如分类器学习项目编号前缀）
+        
+        Args:
+            data_dir: 数据存储目录
+        
+        Returns:
+            list: 所有文件信息列表（与 get_all_files 相同；JSON 还没有导入时包含其中的记录）
+        """
+        data_dir = Path(data_dir)
+        db_file = data_dir / "files.sqlite3"
+        json_file = data_dir / "files_db.json"
+        records = {}
+        json_imported = False
+        if db_file.exists():
+            conn = sqlite3.connect(f"{db_file.resolve().as_uri()}?mode=ro", uri=True, timeout=30)
+            try:
+                for path, info in conn.execute("SELECT path, info FROM files ORDER BY rowid"):
+                    records[path] = json.loads(info)
+                json_imported = cls._json_imported(conn)
+            finally:
+                conn.close()
+        if json_file.exists() and not json_imported:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                for file_path, file_info in json.load(f).items():
+                    records.setdefault(file_path, file_info)
+        return list(records.values())
     
-    def _load_database(self):
-        """加载文件数据库"""
-        if self.db_file.exists():
+    @contextmanager
+    def batch(self):
+        """
+        把多次写入合并为一个事务（可以嵌套，最外层退出时提交，出错时回滚）
+        
+        用法:
+            with file_manager.batch():
+                for file_path, result in results.items():
+                    file_manager.add_file(file_path, result)
+        """
+        conn = self._conn()
+        with self._write_lock:
+            self._local.depth += 1
             try:
-                with open(self.db_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"加载数据库失败: {e}")
-                return {}
-        return {}
-    
-    def _save_database(self):
-        """保存文件数据库"""
+                yield
+                if self._local.depth == 1:
+                    conn.commit()
+            except BaseException:
+                if self._local.depth == 1:
+                    conn.rollback()
+                raise
+            finally:
+                self._local.depth -= 1
+    
+    def _write(self, sql, params=()):
+        """执行一条写语句（在 batch() 中时随事务提交，否则立即提交）"""
         try:
-            with open(self.db_file, 'w', encoding='utf-8') as f:
-                json.dump(self.files_db, f, ensure_ascii=False, indent=2)
+            with self.batch():
+                self._conn().execute(sql, params)
         except Exception as e:
             print(f"保存数据库失败: {e}")
     
-    def add_file(self, file_path, category_path, similarity_score=None):
+    def _upsert(self, file_path, file_info):
+        """写入一条记录；已存在时原位更新（保持添加顺序）"""
+        self._write(
+            "INSERT INTO files (path, category, content_hash, info) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET category = excluded.category, "
+            "content_hash = excluded.content_hash, info = excluded.info",
+            self._row(file_path, file_info)
+        )
+    
+    def _query(self, sql, params=()):
+        """查询记录信息列表（按添加顺序）"""
+        try:
+            rows = self._conn().execute(sql, params).fetchall()
+        except Exception as e:
+            print(f"读取数据库失败: {e}")
+            return []
+        return [json.loads(row[0]) for row in rows]
+    
+    def add_file(self, file_path, category_path, similarity_score=None, reason=None,
+                 content_hash=None, file_signature=None, taxonomy_version=None, classify_method=None,
+                 code_hint=False):
         """
         添加文件记录
         
@@ -52,6 +190,12 @@ class FileManager:
             file_path: 文件原始路径
             category_path: 分类路径（可以是字符串或元组(路径, 分数)）
             similarity_score: 相似度分数（可选，如果category_path是元组则从此参数获取）
+            reason: 分类理由（可选）
+            content_hash: 文件内容哈希（可选），内容相同的文件复用分类结果
+            file_signature: 计算哈希时的文件签名 (大小, 修改时间纳秒)（可选）
+            taxonomy_version: 分类时使用的分类树版本（可选）
+            classify_method: 得到该结果的分类方法（可选，如 "llm"/"embedding"/"fulltext_llm"）
+            code_hint: 结果是否由项目编号前缀直接给出（这样的记录不用于学习前缀）
         """
         file_path = str(file_path)
         
@@ -71,8 +215,71 @@ class FileManager:
         if similarity_score is not None:
             file_info['similarity_score'] = similarity_score
         
-        self.files_db[file_path] = file_info
-        self._save_database()
+        if reason:
+            file_info['reason'] = reason
+        
+        if taxonomy_version:
+            file_info['taxonomy_version'] = taxonomy_version
+        
+        if classify_method:
+            file_info['classify_method'] = classify_method
+        
+        if code_hint:
+            file_info['code_hint'] = True
+        
+        if content_hash:
+            file_info['content_hash'] = content_hash
+            if file_signature:
+                file_info['file_size'], file_info['file_mtime_ns'] = file_signature
+        
+        self._upsert(file_path, file_info)
+    
+    def find_by_hash(self, content_hash, classify_method=None):
+        """
+        查找内容相同的已分类文件（分类为“其他/未分类”的记录不算已分类）
+        
+        Args:
+            content_hash: 文件内容哈希
+            classify_method: 只查找用该分类方法得到的记录（None 时不限）
+        
+        Returns:
+            dict: 文件信息（内容相同的文件有多个时取最早添加的），不存在时返回 None
+        """
+        if not content_hash:
+            return None
+        for file_info in self._query("SELECT info FROM files WHERE content_hash = ? AND category != ? ORDER BY rowid",
+                                     (content_hash, "其他/未分类")):
+            if classify_method is None or file_info.get('classify_method') == classify_method:
+                return file_info
+        return None
+    
+    def get_file(self, file_path):
+        """
+        获取单个文件记录
+        
+        Args:
+            file_path: 文件路径
+        
+        Returns:
+            dict: 文件信息，不存在时返回 None
+        """
+        files = self._query("SELECT info FROM files WHERE path = ?", (str(file_path),))
+        return files[0] if files else None
+    
+    def update_file(self, file_path, **fields):
+        """
+        更新文件记录的字段（如按需生成的分类理由）
+        
+        Args:
+            file_path: 文件路径
+            **fields: 要更新的字段
+        """
+        file_path = str(file_path)
+        with self.batch():
+            file_info = self.get_file(file_path)
+            if file_info is not None:
+                file_info.update(fields)
+                self._upsert(file_path, file_info)
     
     def remove_file(self, file_path):
         """
@@ -81,10 +288,7 @@ class FileManager:
         Args:
             file_path: 文件路径
         """
-        file_path = str(file_path)
-        if file_path in self.files_db:
-            del self.files_db[file_path]
-            self._save_database()
+        self._write("DELETE FROM files WHERE path = ?", (str(file_path),))
     
     def get_files_in_category(self, category_path):
         """
@@ -92,15 +296,11 @@ class FileManager:
         
         Args:
             category_path: 分类路径
-            
+        
         Returns:
             list: 文件信息列表
         """
-        files = []
-        for file_path, file_info in self.files_db.items():
-            if file_info['category'] == category_path:
-                files.append(file_info)
-        return files
+        return self._query("SELECT info FROM files WHERE category = ? ORDER BY rowid", (category_path,))
     
     def get_all_categories(self):
         """
@@ -109,10 +309,11 @@ class FileManager:
         Returns:
             set: 分类路径集合
         """
-        categories = set()
-        for file_info in self.files_db.values():
-            categories.add(file_info['category'])
-        return categories
+        try:
+            return {row[0] for row in self._conn().execute("SELECT DISTINCT category FROM files")}
+        except Exception as e:
+            print(f"读取数据库失败: {e}")
+            return set()
     
     def get_all_files(self):
         """
@@ -121,14 +322,23 @@ class FileManager:
         Returns:
             list: 所有文件信息列表
         """
-        return list(self.files_db.values())
+        return self._query("SELECT info FROM files ORDER BY rowid")
     
     def get_file_count(self):
         """获取文件总数"""
-        return len(self.files_db)
+        return self._conn().execute("SELECT COUNT(*) FROM files").fetchone()[0]
     
     def clear_all(self):
         """清空所有文件记录"""
-        self.files_db = {}
-        self._save_database()
-
+        self._write("DELETE FROM files")
+    
+    def close(self):
+        """关闭所有线程的连接"""
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections = []
+        self._local = threading.local()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文件内容哈希
+用于按内容缓存文档提取结果、识别内容相同的上传文件（同一文件复制到不同目录时只分类一次）
+有 xxhash 时使用 xxh128，否则使用 blake2b；哈希值带算法前缀，不同算法的值不会误判为相同
+"""
+
+import hashlib
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+
+CHUNK_SIZE = 1024 * 1024
+# 超过该大小的文件使用 mmap 读取，避免逐块复制到用户态缓冲区
+MMAP_THRESHOLD = 4 * 1024 * 1024
+HASH_ALGORITHM = "xxh128" if XXHASH_AVAILABLE else "blake2b"
+
+
+def _new_digest():
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def file_content_hash(file_path, chunk_size=CHUNK_SIZE):
+    """
+    计算文件内容哈希（大文件使用 mmap，小文件分块读取）
+
+    Args:
+        file_path: 文件路径
+        chunk_size: 每次送入哈希的字节数
+
+    Returns:
+        str: "算法:十六进制哈希值"
+    """
+    digest = _new_digest()
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for start in range(0, size, chunk_size):
+                        digest.update(view[start:start + chunk_size])
+                finally:
+                    view.release()
+        else:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+    return f"{HASH_ALGORITHM}:{digest.hexdigest()}"
+
+
+def file_signature(file_path):
+    """
+    文件签名（大小和修改时间），签名不变时可以复用之前计算的哈希
+
+    Returns:
+        tuple: (大小, 修改时间纳秒)
+    """
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def group_by_hash(file_paths, hashes):
+    """
+    按内容哈希把文件分组（保持原顺序，组内第一个文件作为代表）
+
+    Args:
+        file_paths: 文件路径列表
+        hashes: {文件路径: 内容哈希}，没有哈希的文件单独成组
+
+    Returns:
+        list: [[代表文件, 相同内容的其他文件, ...], ...]
+    """
+    groups = {}
+    for file_path in file_paths:
+        content_hash = hashes.get(file_path)
+        key = content_hash if content_hash else ('path', file_path)
+        groups.setdefault(key, []).append(file_path)
+    return list(groups.values())
+
+
+class FileHasher:
+    """后台线程池计算文件内容哈希，按（路径, 大小, 修改时间）缓存结果"""
+
+    def __init__(self, max_workers=4):
+        """
+        初始化
+
+        Args:
+            max_workers: 哈希线程数（读取和哈希计算都会释放GIL）
+        """
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._futures = {}  # 文件路径 -> Future
+        self._known = {}    # 文件路径 -> (签名, 哈希)
+
+    def seed(self, file_path, signature, content_hash):
+        """
+        载入已持久化的哈希（签名一致时不再重新计算）
+
+        Args:
+            file_path: 文件路径
+            signature: file_signature 的结果
+            content_hash: 内容哈希
+        """
+        with self._lock:
+            self._known[str(file_path)] = (tuple(signature), content_hash)
+
+    def _hash(self, file_path):
+        try:
+            signature = file_signature(file_path)
+            with self._lock:
+                known = self._known.get(file_path)
+            if known and known[0] == signature:
+                return known[1]
+            content_hash = file_content_hash(file_path)
+            with self._lock:
+                self._known[file_path] = (signature, content_hash)
+            return content_hash
+        except OSError as e:
+            print(f"计算文件哈希失败 {file_path}: {e}")
+            return None
+
+    def submit(self, file_paths):
+        """
+        在后台开始计算哈希（立即返回）
+
+        Args:
+            file_paths: 文件路径列表
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="file-hasher")
+            for file_path in file_paths:
+                file_path = str(file_path)
+                future = self._futures.get(file_path)
+                if future is None or future.done():
+                    self._futures[file_path] = self._executor.submit(self._hash, file_path)
+
+    def get(self, file_path):
+        """
+        获取单个文件的哈希（后台计算未完成时等待）
+
+        Returns:
+            str: 内容哈希，无法读取时返回 None
+        """
+        file_path = str(file_path)
+        with self._lock:
+            future = self._futures.get(file_path)
+        if future is None:
+            return self._hash(file_path)
+        if future.result() is None:
+            return None
+        # 再核对一次签名：提交后文件被修改时重新计算
+        return self._hash(file_path)
+
+    def hash_many(self, file_paths):
+        """
+        获取多个文件的哈希（尚未提交的文件会先提交到后台并行计算）
+
+        Returns:
+            dict: {文件路径: 内容哈希或None}
+        """
+        file_paths = [str(file_path) for file_path in file_paths]
+        with self._lock:
+            missing = [file_path for file_path in file_paths if file_path not in self._futures]
+        self.submit(missing)
+        return {file_path: self.get(file_path) for file_path in file_paths}
+
+    def signature_of(self, file_path):
+        """已计算哈希时对应的文件签名，未计算时返回 None"""
+        with self._lock:
+            known = self._known.get(str(file_path))
+        return known[0] if known else None
+
+    def close(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
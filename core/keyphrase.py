@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+关键词摘要
+对文档文本按字符n-gram计算TF-IDF，挑出少量高权重的关键词，和文件名一起组成简短的检索查询，
+使基于文档内容的向量检索和只用文件名检索的开销相同。
+语料统计（文档频率）由 embed/build_keyphrase_stats.py 从 hdl_material_pure 物项名称和已提取的文档预先计算
+"""
+
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+
+
+DEFAULT_STATS_PATH = "data/keyphrase_stats.json"
+
+# 连续的中文字符，或字母数字组成的词（型号、标准号等）
+CJK_RUN = re.compile(r'[一-鿿]+')
+ASCII_TOKEN = re.compile(r'[A-Za-z][A-Za-z0-9\-/.]*[A-Za-z0-9]')
+# 短于此长度的字母数字词多为PDF乱码或单位符号，不作为关键词
+MIN_ASCII_TOKEN = 4
+
+
+def char_ngrams(text, n_min=2, n_max=4):
+    """
+    提取文本的字符n-gram：中文按字符切n-gram，字母数字词整体作为一项（统一大写）
+
+    Args:
+        text: 文本
+        n_min: 最短n-gram
+        n_max: 最长n-gram
+
+    Returns:
+        list: n-gram列表（含重复，用于计算词频）
+    """
+    grams = []
+    for run in CJK_RUN.findall(text or ""):
+        for n in range(n_min, n_max + 1):
+            grams.extend(run[i:i + n] for i in range(len(run) - n + 1))
+    for token in ASCII_TOKEN.findall(text or ""):
+        if len(token) >= MIN_ASCII_TOKEN:
+            grams.append(token.upper())
+    return grams
+
+
+def _overlaps(term, text):
+    """中文词与文本有相同的二字组合，或字母数字词已在文本中出现"""
+    if CJK_RUN.fullmatch(term):
+        return any(term[i:i + 2] in text for i in range(len(term) - 1))
+    return term in text.upper()
+
+
+class KeyphraseModel:
+    """字符n-gram TF-IDF 关键词模型"""
+
+    def __init__(self, n_min=2, n_max=4):
+        """
+        初始化
+
+        Args:
+            n_min: 最短n-gram
+            n_max: 最长n-gram
+        """
+        self.n_min = n_min
+        self.n_max = n_max
+        self.doc_count = 0
+        self.document_frequency = Counter()
+
+    def __len__(self):
+        return len(self.document_frequency)
+
+    def add_document(self, text):
+        """把一个文档（或一个物项名称）计入文档频率"""
+        grams = set(char_ngrams(text, self.n_min, self.n_max))
+        if grams:
+            self.doc_count += 1
+            self.document_frequency.update(grams)
+
+    def fit(self, texts):
+        """
+        统计一批文本的文档频率
+
+        Args:
+            texts: 文本可迭代对象
+
+        Returns:
+            KeyphraseModel: self
+        """
+        for text in texts:
+            self.add_document(text)
+        return self
+
+    def idf(self, term):
+        """平滑的逆文档频率；语料中没有出现过的词取最大值"""
+        return math.log((1 + self.doc_count) / (1 + self.document_frequency.get(term, 0))) + 1.0
+
+    def extract(self, text, top_k=8, min_df=1):
+        """
+        提取关键词
+
+        Args:
+            text: 文档文本
+            top_k: 返回的关键词数量
+            min_df: 语料中至少出现过多少次的n-gram才作为关键词（过滤OCR噪声和偶然的字符组合）
+
+        Returns:
+            list: [(关键词, 权重), ...]，按权重降序
+        """
+        counts = Counter(char_ngrams(text, self.n_min, self.n_max))
+        scored = []
+        for term, count in counts.items():
+            if self.doc_count and self.document_frequency.get(term, 0) < min_df:
+                continue
+            scored.append((term, (1.0 + math.log(count)) * self.idf(term)))
+        scored.sort(key=lambda item: (-item[1], -len(item[0]), item[0]))
+
+        # 去掉被已选关键词包含的短n-gram；较长的n-gram权重不低太多时替换被它包含的短词
+        selected = []
+        for term, weight in scored:
+            if any(term in chosen for chosen, _ in selected):
+                continue
+            contained = [item for item in selected if item[0] in term]
+            if contained:
+                if weight < 0.7 * max(w for _, w in contained):
+                    continue
+                selected = [item for item in selected if item not in contained]
+            selected.append((term, weight))
+            if len(selected) >= top_k:
+                break
+        return selected
+
+    def build_query(self, file_name, text, max_terms=6, max_chars=64, min_df=2):
+        """
+        由文件名和文档文本组成简短的检索查询
+
+        Args:
+            file_name: 文件名（不含扩展名）
+            text: 文档文本（预览或正文）
+            max_terms: 最多追加的关键词数
+            max_chars: 查询的最大长度
+            min_df: 见 extract
+
+        Returns:
+            tuple: (查询字符串, [(关键词, 权重), ...])
+        """
+        query = (file_name or "").strip()
+        terms = []
+        for term, weight in self.extract(text, top_k=max_terms * 3, min_df=min_df):
+            # 与文件名或已选关键词有重叠的n-gram（如"泵采购技"与"购技术要"）不再追加
+            if _overlaps(term, query):
+                continue
+            if len(query) + 1 + len(term) > max_chars:
+                break
+            query = f"{query} {term}" if query else term
+            terms.append((term, weight))
+            if len(terms) >= max_terms:
+                break
+        return query, terms
+
+    def save(self, path=DEFAULT_STATS_PATH, min_df=2):
+        """
+        保存语料统计（只保存出现次数不少于 min_df 的n-gram，未保存的按未出现处理）
+
+        Args:
+            path: 文件路径
+            min_df: 保存的最小文档频率
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'n_min': self.n_min,
+            'n_max': self.n_max,
+            'doc_count': self.doc_count,
+            'document_frequency': {term: df for term, df in self.document_frequency.items() if df >= min_df}
+        }
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATS_PATH):
+        """
+        加载语料统计
+
+        Returns:
+            KeyphraseModel: 模型；文件不存在时返回 None
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        model = cls(n_min=data.get('n_min', 2), n_max=data.get('n_max', 4))
+        model.doc_count = data.get('doc_count', 0)
+        model.document_frequency = Counter(data.get('document_frequency', {}))
+        return model
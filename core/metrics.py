@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+运行指标记录
+记录检索、LLM调用等步骤的耗时和规模，供调试和基准测试使用
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# 直方图默认分桶上界（毫秒，按 1-2-5 递增）；超过最大值的计入最后的 inf 桶
+DEFAULT_HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+class MetricsRecorder:
+    """线程安全的指标记录器（只保留最近 max_events 条事件）"""
+
+    def __init__(self, max_events=10000):
+        self._events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def record(self, name, **fields):
+        """
+        记录一条事件
+
+        Args:
+            name: 事件名称，如 'vector_query'
+            **fields: 事件字段，如 k=20, payload_bytes=1024
+        """
+        event = {'name': name, 'time': time.time()}
+        event.update(fields)
+        with self._lock:
+            self._events.append(event)
+        return event
+
+    @contextmanager
+    def timer(self, name, **fields):
+        """
+        计时上下文，退出时记录 elapsed_ms 字段
+
+        用法:
+            with metrics.timer('llm_fusion', file=file_name):
+                ...
+        """
+        start = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            fields['elapsed_ms'] = (time.perf_counter() - start) * 1000
+            self.record(name, **fields)
+
+    def events(self, name=None):
+        """
+        获取事件列表
+
+        Args:
+            name: 事件名称，为None时返回全部事件
+
+        Returns:
+            list: 事件字典列表
+        """
+        with self._lock:
+            events = list(self._events)
+        if name is None:
+            return events
+        return [e for e in events if e['name'] == name]
+
+    def summary(self, name, field):
+        """
+        汇总某类事件的数值字段
+
+        Returns:
+            dict: {'count', 'mean', 'p50', 'p95', 'max', 'total'}，没有数据时返回 {'count': 0}
+        """
+        values = [e[field] for e in self.events(name) if e.get(field) is not None]
+        if not values:
+            return {'count': 0}
+        arr = np.asarray(values, dtype=float)
+        return {
+            'count': len(values),
+            'mean': float(arr.mean()),
+            'p50': float(np.percentile(arr, 50)),
+            'p95': float(np.percentile(arr, 95)),
+            'max': float(arr.max()),
+            'total': float(arr.sum()),
+        }
+
+    def histogram(self, name, field, bounds=DEFAULT_HISTOGRAM_BOUNDS_MS):
+        """
+        某类事件数值字段的直方图
+
+        Args:
+            name: 事件名称
+            field: 字段名，如 'elapsed_ms'
+            bounds: 递增的分桶上界
+
+        Returns:
+            list: [{'le': 上界, 'count': 落在 (上一个上界, 上界] 内的数量}, ...]，最后一个桶的上界为 'inf'
+        """
+        values = [e[field] for e in self.events(name) if e.get(field) is not None]
+        counts = np.bincount(np.searchsorted(np.asarray(bounds, dtype=float), np.asarray(values, dtype=float)),
+                             minlength=len(bounds) + 1) if values else [0] * (len(bounds) + 1)
+        return [{'le': bound, 'count': int(count)} for bound, count in zip(list(bounds) + ['inf'], counts)]
+
+    def clear(self):
+        """清空所有事件"""
+        with self._lock:
+            self._events.clear()
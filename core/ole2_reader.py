@@ -0,0 +1,470 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+OLE2复合文档读取与Word 97-2003（.doc）正文提取
+纯Python实现，不依赖Word或pywin32：解析复合文档的FAT/DIFAT/目录结构，
+按需读取 WordDocument 流和表格流，根据FIB中的片段表（piece table）逐段还原正文。
+只读取用到的扇区，可以在多个进程中安全地并行使用
+"""
+
+import os
+import re
+import codecs
+import struct
+
+
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# 特殊扇区编号
+MAX_REGULAR_SECTOR = 0xFFFFFFFA
+END_OF_CHAIN = 0xFFFFFFFE
+FREE_SECTOR = 0xFFFFFFFF
+
+# 目录项类型
+STGTY_STORAGE = 1
+STGTY_STREAM = 2
+STGTY_ROOT = 5
+
+# Word FIB 字段偏移
+FIB_MAGIC = 0xA5EC
+FIB_FLAGS_OFFSET = 0x0A
+FIB_FLAG_ENCRYPTED = 0x0100
+FIB_FLAG_WHICH_TABLE = 0x0200
+FIB_CCP_TEXT_OFFSET = 0x004C
+FIB_FC_CLX_OFFSET = 0x01A2
+FIB_LCB_CLX_OFFSET = 0x01A6
+
+# 片段描述符中 fc 的压缩标志（压缩片段为 cp1252 单字节文本）
+FC_COMPRESSED = 0x40000000
+
+# 摘要信息属性集（标题、主题、关键词等）
+SUMMARY_STREAM = '\x05SummaryInformation'
+SUMMARY_PROPERTIES = {2: 'title', 3: 'subject', 4: 'author', 5: 'keywords', 6: 'comments'}
+PID_CODEPAGE = 1
+VT_I2 = 0x02
+VT_LPSTR = 0x1E
+VT_LPWSTR = 0x1F
+
+# 每次从片段中读取的最大字符数
+READ_BLOCK_CHARS = 16 * 1024
+
+# 默认拒绝超过该大小的文件，避免异常文件占用过多内存和时间
+DEFAULT_MAX_FILE_BYTES = 256 * 1024 * 1024
+
+# 压缩片段的单字节解码表（[MS-DOC] 2.4.1：按 cp1252 解码，cp1252 未定义的 0x81/0x8D/0x8F/0x90/0x9D 保留原值）
+COMPRESSED_DECODING_TABLE = ''.join(bytes([byte]).decode('cp1252', errors='ignore') or chr(byte)
+                                    for byte in range(256))
+
+# 域代码：\x13 域指令 \x14 域结果 \x15，只保留域结果
+FIELD_INSTRUCTION = re.compile('\x13[^\x13\x14\x15]*[\x14\x15]')
+CONTROL_TRANSLATION = str.maketrans({
+    '\r': '\n',    # 段落结束
+    '\x0b': '\n',  # 手动换行
+    '\x0c': '\n',  # 分页/分节符
+    '\x07': '\t',  # 表格单元格结束
+    '\x01': None,  # 嵌入图片
+    '\x08': None,  # 浮动图形锚点
+    '\x13': None,  # 跨片段的域标记
+    '\x14': None,
+    '\x15': None,
+    '\x1e': '-',   # 不间断连字符
+    '\x1f': None,  # 可选连字符
+})
+
+
+class OleStream:
+    """复合文档中的一个流，支持按偏移随机读取（只读取涉及的扇区）"""
+
+    def __init__(self, ole, sectors, size, mini=False):
+        self._ole = ole
+        self._sectors = sectors
+        self.size = size
+        self._mini = mini
+        self._sector_size = ole.mini_sector_size if mini else ole.sector_size
+
+    def read(self, offset=0, length=None):
+        """
+        读取流中的一段数据
+
+        Args:
+            offset: 起始偏移
+            length: 读取长度，None表示读到流末尾
+
+        Returns:
+            bytes: 数据（超出流末尾的部分被截掉）
+        """
+        if length is None:
+            length = self.size - offset
+        end = min(self.size, offset + max(0, length))
+        if offset >= end:
+            return b''
+        parts = []
+        position = offset
+        while position < end:
+            index, within = divmod(position, self._sector_size)
+            if index >= len(self._sectors):
+                raise ValueError("流的扇区链比声明的长度短")
+            take = min(self._sector_size - within, end - position)
+            if self._mini:
+                data = self._ole._read_mini_sector(self._sectors[index])
+            else:
+                data = self._ole._read_sector(self._sectors[index])
+            parts.append(data[within:within + take])
+            position += take
+        return b''.join(parts)
+
+
+class OleFile:
+    """OLE2复合文档（只读）"""
+
+    def __init__(self, file_path, max_file_bytes=DEFAULT_MAX_FILE_BYTES):
+        """
+        打开复合文档并读取文件头、FAT和目录
+
+        Args:
+            file_path: 文件路径
+            max_file_bytes: 文件大小上限，超过时拒绝解析
+
+        Raises:
+            ValueError: 不是复合文档或结构损坏
+        """
+        self._file = open(file_path, 'rb')
+        try:
+            self._file_size = os.fstat(self._file.fileno()).st_size
+            if max_file_bytes and self._file_size > max_file_bytes:
+                raise ValueError(f"文件过大（{self._file_size} 字节），超过上限 {max_file_bytes} 字节")
+            self._parse_header()
+            self._load_fat()
+            self._load_directory()
+            self._mini_fat = None
+            self._mini_stream = None
+        except Exception:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """关闭文件"""
+        self._file.close()
+
+    def _parse_header(self):
+        header = self._file.read(512)
+        if len(header) < 512 or header[:8] != OLE_SIGNATURE:
+            raise ValueError("不是OLE2复合文档")
+        sector_shift, mini_sector_shift = struct.unpack_from('<HH', header, 0x1E)
+        if sector_shift not in (9, 12) or mini_sector_shift != 6:
+            raise ValueError(f"不支持的扇区大小: 2^{sector_shift}")
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_sector_shift
+        (self._num_fat_sectors, self._first_dir_sector, _, self.mini_stream_cutoff,
+         self._first_mini_fat_sector, self._num_mini_fat_sectors,
+         self._first_difat_sector, self._num_difat_sectors) = struct.unpack_from('<IIIIIIII', header, 0x2C)
+        self._header_difat = struct.unpack_from('<109I', header, 0x4C)
+        self._max_sector = (self._file_size - self.sector_size) // self.sector_size + 1
+
+    def _read_sector(self, sector):
+        if sector >= self._max_sector:
+            raise ValueError(f"扇区编号越界: {sector}")
+        self._file.seek((sector + 1) * self.sector_size)
+        data = self._file.read(self.sector_size)
+        if len(data) < self.sector_size:
+            data += b'\x00' * (self.sector_size - len(data))
+        return data
+
+    def _load_fat(self):
+        """根据文件头和DIFAT扇区收集FAT扇区，读取整个FAT"""
+        fat_sectors = [s for s in self._header_difat if s <= MAX_REGULAR_SECTOR]
+        entries_per_sector = self.sector_size // 4
+        sector = self._first_difat_sector
+        for _ in range(self._num_difat_sectors):
+            if sector > MAX_REGULAR_SECTOR:
+                break
+            values = struct.unpack(f'<{entries_per_sector}I', self._read_sector(sector))
+            fat_sectors.extend(s for s in values[:-1] if s <= MAX_REGULAR_SECTOR)
+            sector = values[-1]
+        fat_sectors = fat_sectors[:self._num_fat_sectors]
+        fat_data = b''.join(self._read_sector(s) for s in fat_sectors)
+        self._fat = struct.unpack(f'<{len(fat_data) // 4}I', fat_data)
+
+    def _chain(self, start, fat):
+        """沿分配表取出扇区链（带环检测）"""
+        sectors = []
+        sector = start
+        limit = len(fat)
+        while sector <= MAX_REGULAR_SECTOR:
+            if sector >= limit or len(sectors) > limit:
+                raise ValueError("扇区链损坏")
+            sectors.append(sector)
+            sector = fat[sector]
+        return sectors
+
+    def _load_directory(self):
+        """读取目录项，建立 路径 -> 目录项 的映射"""
+        directory = b''.join(self._read_sector(s) for s in self._chain(self._first_dir_sector, self._fat))
+        entries = []
+        for offset in range(0, len(directory) - 127, 128):
+            name_length, entry_type, _, left, right, child = struct.unpack_from('<HBBIII', directory, offset + 64)
+            start, size_low, size_high = struct.unpack_from('<III', directory, offset + 116)
+            name = directory[offset:offset + max(0, min(name_length, 64) - 2)].decode('utf-16-le', errors='ignore')
+            size = size_low if self.sector_size == 512 else size_low | (size_high << 32)
+            entries.append({'name': name, 'type': entry_type, 'left': left, 'right': right,
+                            'child': child, 'start': start, 'size': size})
+        if not entries or entries[0]['type'] != STGTY_ROOT:
+            raise ValueError("复合文档缺少根目录项")
+        self._root = entries[0]
+
+        # 目录是红黑树：从根的 child 开始遍历兄弟节点，存储（storage）再递归进入
+        self._entries = {}
+        visited = set()
+        stack = [(entries[0]['child'], '')]
+        while stack:
+            index, prefix = stack.pop()
+            if index >= len(entries) or index in visited:
+                continue
+            visited.add(index)
+            entry = entries[index]
+            path = prefix + entry['name']
+            if entry['type'] in (STGTY_STREAM, STGTY_STORAGE):
+                self._entries[path] = entry
+            stack.append((entry['left'], prefix))
+            stack.append((entry['right'], prefix))
+            if entry['type'] == STGTY_STORAGE:
+                stack.append((entry['child'], path + '/'))
+
+    def list_streams(self):
+        """
+        列出所有流
+
+        Returns:
+            list: 流路径（子存储中的流以 '/' 分隔）
+        """
+        return sorted(path for path, entry in self._entries.items() if entry['type'] == STGTY_STREAM)
+
+    def exists(self, name):
+        """是否存在指定的流"""
+        entry = self._entries.get(name)
+        return entry is not None and entry['type'] == STGTY_STREAM
+
+    def _load_mini(self):
+        if self._mini_fat is not None:
+            return
+        mini_fat_data = b''
+        if self._num_mini_fat_sectors:
+            mini_fat_data = b''.join(self._read_sector(s)
+                                     for s in self._chain(self._first_mini_fat_sector, self._fat))
+        self._mini_fat = struct.unpack(f'<{len(mini_fat_data) // 4}I', mini_fat_data)
+        self._mini_stream = OleStream(self, self._chain(self._root['start'], self._fat), self._root['size'])
+
+    def _read_mini_sector(self, sector):
+        return self._mini_stream.read(sector * self.mini_sector_size, self.mini_sector_size)
+
+    def open_stream(self, name):
+        """
+        打开流
+
+        Args:
+            name: 流路径（如 "WordDocument"）
+
+        Returns:
+            OleStream: 流对象
+
+        Raises:
+            KeyError: 流不存在
+        """
+        entry = self._entries.get(name)
+        if entry is None or entry['type'] != STGTY_STREAM:
+            raise KeyError(f"流不存在: {name}")
+        if entry['size'] < self.mini_stream_cutoff:
+            self._load_mini()
+            return OleStream(self, self._chain(entry['start'], self._mini_fat), entry['size'], mini=True)
+        return OleStream(self, self._chain(entry['start'], self._fat), entry['size'])
+
+
+def _decode_compressed(data):
+    """解码压缩片段（cp1252 单字节文本）"""
+    return codecs.charmap_decode(data, 'strict', COMPRESSED_DECODING_TABLE)[0]
+
+
+def _clean_text(text):
+    """去掉域指令，把Word控制字符转换为换行/制表符"""
+    text = FIELD_INSTRUCTION.sub('', text)
+    return text.translate(CONTROL_TRANSLATION)
+
+
+def _read_piece_table(word_stream, table_stream, fc_clx, lcb_clx):
+    """
+    解析 Clx，返回片段列表 [(起始CP, 结束CP, fc, 是否压缩), ...]
+    """
+    clx = table_stream.read(fc_clx, lcb_clx)
+    position = 0
+    # 跳过 Prc（属性修改），直到片段表 Pcdt
+    while position < len(clx) and clx[position] == 0x01:
+        if position + 3 > len(clx):
+            raise ValueError("Clx 结构损坏")
+        cb_grpprl = struct.unpack_from('<H', clx, position + 1)[0]
+        position += 3 + cb_grpprl
+    if position + 5 > len(clx) or clx[position] != 0x02:
+        raise ValueError("找不到片段表")
+    lcb = struct.unpack_from('<I', clx, position + 1)[0]
+    plc = clx[position + 5:position + 5 + lcb]
+    count = (len(plc) - 4) // 12
+    if count <= 0:
+        return []
+    cps = struct.unpack_from(f'<{count + 1}I', plc, 0)
+    pieces = []
+    for i in range(count):
+        fc = struct.unpack_from('<I', plc, 4 * (count + 1) + 8 * i + 2)[0]
+        compressed = bool(fc & FC_COMPRESSED)
+        if compressed:
+            fc = (fc & ~FC_COMPRESSED) // 2
+        pieces.append((cps[i], cps[i + 1], fc, compressed))
+    return pieces
+
+
+def _decode_lpstr(data, codepage):
+    if codepage in (1200, 1201):
+        return data.decode('utf-16-le' if codepage == 1200 else 'utf-16-be', errors='ignore')
+    encoding = 'utf-8' if codepage == 65001 else f'cp{codepage}'
+    try:
+        return data.decode(encoding, errors='ignore')
+    except LookupError:
+        return data.decode('latin-1')
+
+
+def read_summary_information(ole):
+    """
+    读取复合文档的摘要信息（标题、主题、作者、关键词、备注）
+
+    Args:
+        ole: OleFile
+
+    Returns:
+        dict: 存在的字符串属性，如 {'title': ..., 'keywords': ...}；没有摘要信息时返回空字典
+    """
+    if not ole.exists(SUMMARY_STREAM):
+        return {}
+    stream = ole.open_stream(SUMMARY_STREAM)
+    data = stream.read(0, min(stream.size, 64 * 1024))
+    if len(data) < 48:
+        return {}
+    section_offset, = struct.unpack_from('<I', data, 44)
+    if section_offset + 8 > len(data):
+        return {}
+    _, count = struct.unpack_from('<II', data, section_offset)
+    entries = []
+    for i in range(min(count, 256)):
+        position = section_offset + 8 + 8 * i
+        if position + 8 > len(data):
+            break
+        entries.append(struct.unpack_from('<II', data, position))
+
+    def value_at(offset):
+        position = section_offset + offset
+        if position + 8 > len(data):
+            return None, None
+        value_type, = struct.unpack_from('<H', data, position)
+        return value_type, position + 4
+
+    codepage = 1252
+    for pid, offset in entries:
+        if pid == PID_CODEPAGE:
+            value_type, position = value_at(offset)
+            if value_type == VT_I2:
+                codepage = struct.unpack_from('<H', data, position)[0]
+
+    properties = {}
+    for pid, offset in entries:
+        name = SUMMARY_PROPERTIES.get(pid)
+        if name is None:
+            continue
+        value_type, position = value_at(offset)
+        if value_type == VT_LPSTR:
+            size, = struct.unpack_from('<I', data, position)
+            value = _decode_lpstr(data[position + 4:position + 4 + size], codepage)
+        elif value_type == VT_LPWSTR:
+            length, = struct.unpack_from('<I', data, position)
+            value = data[position + 4:position + 4 + 2 * length].decode('utf-16-le', errors='ignore')
+        else:
+            continue
+        value = value.rstrip('\x00').strip()
+        if value:
+            properties[name] = value
+    return properties
+
+
+def iter_doc_text(file_path, max_chars=None, max_file_bytes=DEFAULT_MAX_FILE_BYTES):
+    """
+    逐个片段地读取 .doc 文档正文（只包含主文档，不含页眉页脚、脚注和批注）
+
+    Args:
+        file_path: 文件路径
+        max_chars: 最多读取的字符数，None表示不限
+        max_file_bytes: 文件大小上限
+
+    Yields:
+        str: 片段文本块（已去掉域指令、转换控制字符）
+
+    Raises:
+        ValueError: 不是Word文档、文档加密或结构损坏
+    """
+    with OleFile(file_path, max_file_bytes=max_file_bytes) as ole:
+        if not ole.exists('WordDocument'):
+            raise ValueError("复合文档中没有 WordDocument 流")
+        word_stream = ole.open_stream('WordDocument')
+        fib = word_stream.read(0, FIB_LCB_CLX_OFFSET + 4)
+        if len(fib) < FIB_LCB_CLX_OFFSET + 4:
+            raise ValueError("FIB 不完整")
+        magic, = struct.unpack_from('<H', fib, 0)
+        if magic != FIB_MAGIC:
+            raise ValueError("不是Word 97-2003文档")
+        flags, = struct.unpack_from('<H', fib, FIB_FLAGS_OFFSET)
+        if flags & FIB_FLAG_ENCRYPTED:
+            raise ValueError("文档已加密")
+        table_name = '1Table' if flags & FIB_FLAG_WHICH_TABLE else '0Table'
+        if not ole.exists(table_name):
+            raise ValueError(f"复合文档中没有 {table_name} 流")
+        table_stream = ole.open_stream(table_name)
+        ccp_text, = struct.unpack_from('<I', fib, FIB_CCP_TEXT_OFFSET)
+        fc_clx, lcb_clx = struct.unpack_from('<II', fib, FIB_FC_CLX_OFFSET)
+
+        remaining = max_chars
+        for cp_start, cp_end, fc, compressed in _read_piece_table(word_stream, table_stream, fc_clx, lcb_clx):
+            if cp_start >= ccp_text:
+                break
+            # 大片段按块读取，调用方停止迭代后不再读取剩余部分
+            cp = cp_start
+            cp_stop = min(cp_end, ccp_text)
+            while cp < cp_stop:
+                length = min(cp_stop - cp, READ_BLOCK_CHARS)
+                if remaining is not None:
+                    length = min(length, remaining)
+                if length <= 0:
+                    return
+                if compressed:
+                    text = _decode_compressed(word_stream.read(fc + (cp - cp_start), length))
+                else:
+                    text = word_stream.read(fc + 2 * (cp - cp_start), 2 * length).decode('utf-16-le', errors='ignore')
+                cp += length
+                if remaining is not None:
+                    remaining -= length
+                yield _clean_text(text)
+
+
+def read_doc_text(file_path, max_chars=None, max_file_bytes=DEFAULT_MAX_FILE_BYTES):
+    """
+    读取 .doc 文档正文
+
+    Args:
+        file_path: 文件路径
+        max_chars: 最多读取的字符数（按原始字符计），None表示不限
+        max_file_bytes: 文件大小上限
+
+    Returns:
+        str: 正文文本
+    """
+    return ''.join(iter_doc_text(file_path, max_chars=max_chars, max_file_bytes=max_file_bytes))
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分类流水线（DAG执行器）
+把分类流程声明为带依赖关系的节点，每个节点可以设置超时、并发上限、执行条件和回退，
+执行器按依赖关系并发执行节点，并可同时处理多个文件
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+# 节点状态
+STATUS_OK = "ok"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+
+class PipelineNode:
+    """流水线节点"""
+
+    def __init__(self, name, func, deps=(), timeout=None, max_concurrency=None, fallback=None, when=None):
+        """
+        初始化节点
+
+        Args:
+            name: 节点名称，也是结果在上下文中的键
+            func: 节点函数 func(context) -> 结果，context 包含输入和所有依赖节点的结果
+            deps: 依赖的节点名称
+            timeout: 执行超时（秒），从开始执行算起（还没开始执行时从提交算起），超时后使用回退结果，None表示不限
+            max_concurrency: 所有文件中同时执行该节点的最大数量，None表示不限
+            fallback: 失败或超时时的回退函数 fallback(context, error) -> 结果；为None时结果为None
+            when: 执行条件 when(context) -> bool，为False时跳过节点（结果为None）
+        """
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+        self.when = when
+        self.semaphore = threading.Semaphore(max_concurrency) if max_concurrency else None
+
+    def __repr__(self):
+        return f"PipelineNode({self.name!r}, deps={list(self.deps)})"
+
+
+class Pipeline:
+    """DAG流水线执行器"""
+
+    def __init__(self, nodes=(), max_workers=16, metrics=None, name="pipeline"):
+        """
+        初始化流水线
+
+        Args:
+            nodes: PipelineNode 列表（顺序无关，按依赖关系执行）
+            max_workers: 节点执行线程数
+            metrics: MetricsRecorder，记录每个节点的耗时（事件名 'pipeline_node'）
+            name: 流水线名称（写入指标）
+        """
+        self.name = name
+        self.nodes = {}
+        self.metrics = metrics
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._order = None
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node):
+        """添加或替换节点"""
+        self.nodes[node.name] = node
+        self._order = None
+        return self
+
+    def remove_node(self, name):
+        """删除节点（依赖它的节点会在校验时报错）"""
+        self.nodes.pop(name, None)
+        self._order = None
+        return self
+
+    def topological_order(self):
+        """
+        校验依赖关系并返回拓扑顺序
+
+        Raises:
+            ValueError: 依赖了不存在的节点或存在环
+        """
+        if self._order is not None:
+            return self._order
+        for node in self.nodes.values():
+            for dep in node.deps:
+                if dep not in self.nodes:
+                    raise ValueError(f"节点 {node.name} 依赖了不存在的节点 {dep}")
+
+        order = []
+        state = {}  # 0=访问中, 1=已完成
+
+        def visit(name, stack):
+            if state.get(name) == 1:
+                return
+            if state.get(name) == 0:
+                raise ValueError(f"流水线存在循环依赖: {' -> '.join(stack + [name])}")
+            state[name] = 0
+            for dep in self.nodes[name].deps:
+                visit(dep, stack + [name])
+            state[name] = 1
+            order.append(name)
+
+        for name in self.nodes:
+            visit(name, [])
+        self._order = order
+        return order
+
+    def _submit(self, node, context, started, abandoned):
+        """把节点提交到当前的线程池"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=f"{self.name}-node")
+            return self._executor.submit(self._execute_node, node, context, started, abandoned)
+
+    def _replace_executor(self):
+        """
+        节点超时后它的线程仍被占用（线程无法中断）：之后的节点提交到新的线程池，
+        被放弃的线程不再占用名额，旧线程池在已提交的任务结束后退出
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _execute_node(self, node, context, started, abandoned):
+        """在工作线程中执行节点（并发上限在这里控制；等待期间已超时的节点不再执行）"""
+        if node.semaphore:
+            node.semaphore.acquire()
+        try:
+            if node.name in abandoned:
+                return None
+            started[node.name] = time.monotonic()
+            return node.func(context)
+        finally:
+            if node.semaphore:
+                node.semaphore.release()
+
+    def run(self, inputs):
+        """
+        处理一个输入
+
+        Args:
+            inputs: 输入字典（如 {'file_path': ...}），会作为上下文的初始内容
+
+        Returns:
+            dict: 上下文，包含输入、每个节点的结果，以及 '_status' / '_timings'（毫秒）
+        """
+        order = self.topological_order()
+
+        context = dict(inputs)
+        status = {}
+        timings = {}
+        context['_status'] = status
+        context['_timings'] = timings
+
+        submitted_at = {}
+        inputs_of = {}  # 节点名 -> 提交时的上下文副本
+        started = {}
+        abandoned = set()  # 超时后不再等待的节点
+        running = {}  # future -> node name
+        remaining = list(order)
+
+        def finish(name, value, node_status, error=None):
+            node = self.nodes[name]
+            if node_status in (STATUS_FAILED, STATUS_TIMEOUT):
+                if node.fallback is not None:
+                    try:
+                        value = node.fallback(context, error)
+                    except Exception as e:
+                        print(f"节点 {name} 回退失败: {e}")
+                        value = None
+                else:
+                    value = None
+                if error is not None and node_status == STATUS_FAILED:
+                    print(f"节点 {name} 执行失败: {error}")
+            context[name] = value
+            status[name] = node_status
+            now = time.monotonic()
+            start = started.get(name, submitted_at.get(name, now))
+            timings[name] = (now - start) * 1000
+            if self.metrics is not None:
+                self.metrics.record(
+                    'pipeline_node',
+                    pipeline=self.name,
+                    node=name,
+                    status=node_status,
+                    elapsed_ms=timings[name],
+                    queued_ms=(start - submitted_at.get(name, start)) * 1000
+                )
+
+        while remaining or running:
+            # 提交所有依赖已完成的节点
+            for name in list(remaining):
+                node = self.nodes[name]
+                if any(dep not in status for dep in node.deps):
+                    continue
+                remaining.remove(name)
+                if node.when is not None:
+                    try:
+                        should_run = node.when(context)
+                    except Exception as e:
+                        print(f"节点 {name} 条件判断失败: {e}")
+                        should_run = False
+                    if not should_run:
+                        context[name] = None
+                        status[name] = STATUS_SKIPPED
+                        timings[name] = 0.0
+                        continue
+                submitted_at[name] = time.monotonic()
+                inputs_of[name] = dict(context)
+                running[self._submit(node, inputs_of[name], started, abandoned)] = name
+
+            if not running:
+                continue
+
+            # 等待任一节点完成，或最近的超时到期
+            wait_timeout = None
+            now = time.monotonic()
+            for name in running.values():
+                node = self.nodes[name]
+                if node.timeout is None:
+                    continue
+                # 还没开始执行（等待线程或并发名额）时从提交算起，开始执行后从开始算起
+                left = started.get(name, submitted_at[name]) + node.timeout - now
+                if name not in started:
+                    left = min(left, 0.05)  # 开始执行后截止时间会推后，稍后再检查
+                wait_timeout = left if wait_timeout is None else min(wait_timeout, left)
+            done, _ = wait(list(running), timeout=max(wait_timeout, 0) if wait_timeout is not None else None,
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name = running.pop(future)
+                try:
+                    finish(name, future.result(), STATUS_OK)
+                except Exception as e:
+                    finish(name, None, STATUS_FAILED, e)
+
+            # 超时的节点：不再等待（线程无法中断，结果会被丢弃），使用回退结果
+            now = time.monotonic()
+            timed_out = False
+            for future, name in list(running.items()):
+                node = self.nodes[name]
+                if node.timeout is not None and now - started.get(name, submitted_at[name]) >= node.timeout:
+                    running.pop(future)
+                    future.cancel()
+                    abandoned.add(name)
+                    if name in started:
+                        timed_out = True
+                    finish(name, None, STATUS_TIMEOUT, TimeoutError(f"节点 {name} 超过 {node.timeout} 秒"))
+
+            if timed_out:
+                # 被放弃的线程不再占用名额；还在旧线程池中排队的节点取消后重新提交
+                self._replace_executor()
+                for future, name in list(running.items()):
+                    if future.cancel():
+                        running.pop(future)
+                        running[self._submit(self.nodes[name], inputs_of[name], started, abandoned)] = name
+
+        return context
+
+    def run_many(self, inputs_list, max_parallel=4):
+        """
+        并发处理多个输入
+
+        Args:
+            inputs_list: 输入字典列表
+            max_parallel: 同时处理的输入数量
+
+        Returns:
+            list: 与 inputs_list 一一对应的上下文（某个输入整体失败时为 None）
+        """
+        results = [None] * len(inputs_list)
+        if not inputs_list:
+            return results
+        with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(inputs_list))),
+                                thread_name_prefix=f"{self.name}-item") as item_executor:
+            futures = {item_executor.submit(self.run, inputs): i for i, inputs in enumerate(inputs_list)}
+            for future in futures:
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    print(f"流水线处理失败: {e}")
+        return results
+
+    def close(self):
+        """关闭节点线程池"""
+        self._replace_executor()
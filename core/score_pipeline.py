@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+向量检索结果后处理（数组化）
+把一批查询的距离矩阵和分类编号矩阵一次性完成：相似度换算、0.5门槛、
+分位数筛选 + 同分归并 + 按分类去重 + 最小晋级数兜底
+语义与原 Classifier._filter_quantile_with_tie 逐条处理的结果完全一致
+"""
+
+import os
+
+import numpy as np
+
+
+TIE_EPSILON = 0.0001
+
+
+class CategoryInterner:
+    """分类路径 → 整数编号（同一路径始终得到同一编号）"""
+
+    def __init__(self):
+        self._ids = {}
+        self._metadata_ids = {}
+        self.paths = []
+
+    def intern(self, key, path=None):
+        """
+        获取 key 对应的编号
+
+        Args:
+            key: 可哈希的分类键（如 (大类, 中类, 小类) 元组）
+            path: 分类路径字符串，默认用 os.sep 连接 key
+
+        Returns:
+            int: 分类编号
+        """
+        category_id = self._ids.get(key)
+        if category_id is None:
+            category_id = len(self.paths)
+            self._ids[key] = category_id
+            self.paths.append(path if path is not None else os.sep.join(key))
+        return category_id
+
+    def intern_metadata(self, metadata):
+        """
+        从检索元数据中取分类编号，没有任何分类名称时返回 -1
+        """
+        key = (metadata.get('big_class_name'), metadata.get('middle_class_name'), metadata.get('small_class_name'))
+        category_id = self._metadata_ids.get(key)
+        if category_id is None:
+            # 空名称不参与路径拼接；不同写法的空值（None/''）归到同一路径
+            parts = tuple(part for part in key if part)
+            category_id = self.intern(parts) if parts else -1
+            self._metadata_ids[key] = category_id
+        return category_id
+
+    def __len__(self):
+        return len(self.paths)
+
+
+def encode_query_results(metadatas_batch, distances_batch, interner, width=None):
+    """
+    把 collection.query 返回的批量结果编码为矩阵
+
+    Args:
+        metadatas_batch: [[metadata, ...], ...] 每个查询一行
+        distances_batch: [[distance, ...], ...]
+        interner: CategoryInterner
+        width: 列数，默认取最长的一行
+
+    Returns:
+        tuple: (distances, category_ids)，形状均为 (查询数, width)；
+               缺失位置的距离为 NaN、分类编号为 -1
+    """
+    n_queries = len(distances_batch)
+    if width is None:
+        width = max((len(row) for row in distances_batch), default=0)
+    distances = np.full((n_queries, width), np.nan)
+    category_ids = np.full((n_queries, width), -1, dtype=np.int64)
+    for row, (metadatas, row_distances) in enumerate(zip(metadatas_batch, distances_batch)):
+        n = min(len(metadatas), len(row_distances), width)
+        if n == 0:
+            continue
+        distances[row, :n] = np.asarray(row_distances[:n], dtype=float)
+        intern_metadata = interner.intern_metadata
+        category_ids[row, :n] = [intern_metadata(m or {}) for m in metadatas[:n]]
+    return distances, category_ids
+
+
+def distances_to_scores(distances):
+    """
+    余弦距离 → 相似度：1 - d/2（d > 2 时为0），限制在 [0, 1]，NaN 保持 NaN
+    """
+    distances = np.asarray(distances, dtype=float)
+    with np.errstate(invalid='ignore'):
+        scores = np.where(distances <= 2.0, 1 - distances / 2.0, 0.0)
+        scores = np.clip(scores, 0.0, 1.0)
+    scores[np.isnan(distances)] = np.nan
+    return scores
+
+
+def _first_per_category(mask, sorted_ids):
+    """在每行的排序结果中，对 mask 选中的位置按分类编号保留第一次出现的"""
+    n_rows, width = mask.shape
+    keep = np.zeros_like(mask)
+    flat_positions = np.flatnonzero(mask)
+    if flat_positions.size == 0:
+        return keep
+    rows = flat_positions // width
+    # 每行独立去重：把行号编入键中（flatnonzero 按行优先，保持排序后的先后顺序）
+    n_categories = int(sorted_ids.max()) + 2
+    keys = rows * n_categories + sorted_ids.ravel()[flat_positions] + 1
+    _, first_index = np.unique(keys, return_index=True)
+    keep.ravel()[flat_positions[first_index]] = True
+    return keep
+
+
+def _sorted_quantile(sorted_scores, n_valid, quantile):
+    """
+    每行前 n_valid 个为降序有效值时，按行计算分位数
+
+    与 np.quantile(默认 linear 方法) 逐行计算的结果逐位相同：
+    虚拟下标 (n-1)*q，取相邻两值按 numpy 的 _lerp 公式插值
+    """
+    n_rows = sorted_scores.shape[0]
+    threshold = np.full(n_rows, np.nan)
+    rows = np.flatnonzero(n_valid > 0)
+    if rows.size == 0:
+        return threshold
+    n = n_valid[rows]
+    virtual = (n - 1) * np.float64(quantile)
+    previous = np.floor(virtual)
+    gamma = virtual - previous
+    previous = np.minimum(previous.astype(np.int64), n - 1)
+    following = np.minimum(previous + 1, n - 1)
+    # 升序第 j 个 = 降序第 n-1-j 个
+    a = sorted_scores[rows, n - 1 - previous]
+    b = sorted_scores[rows, n - 1 - following]
+    diff_b_a = b - a
+    value = a + diff_b_a * gamma
+    upper = gamma >= 0.5
+    value[upper] = b[upper] - diff_b_a[upper] * (1 - gamma[upper])
+    threshold[rows] = value
+    return threshold
+
+
+def select_batch(scores, category_ids, quantile=0.9, min_advance=2, min_score=0.5):
+    """
+    对一批查询做分位数筛选 + 同分归并 + 按分类去重
+
+    Args:
+        scores: (查询数, K) 相似度矩阵，NaN 表示缺失
+        category_ids: (查询数, K) 分类编号矩阵，-1 表示没有分类路径
+        quantile: 分位数（0.9=前10%）
+        min_advance: 最小晋级数
+        min_score: 相似度下限，None 表示不设下限
+
+    Returns:
+        list: 每个查询一个 int 数组，为晋级结果在原始列中的位置，按分数从高到低排列
+    """
+    scores = np.atleast_2d(np.asarray(scores, dtype=float))
+    category_ids = np.atleast_2d(np.asarray(category_ids, dtype=np.int64))
+    n_rows, width = scores.shape
+    if width == 0:
+        return [np.empty(0, dtype=np.int64) for _ in range(n_rows)]
+
+    valid = ~np.isnan(scores) & (category_ids >= 0)
+    if min_score is not None:
+        with np.errstate(invalid='ignore'):
+            valid &= scores >= min_score
+
+    # 1. 每行降序排序（稳定排序，同分保持原顺序；无效位置排在最后）
+    order = np.argsort(np.where(valid, -scores, np.inf), axis=1, kind='stable')
+    sorted_scores = np.take_along_axis(scores, order, axis=1)
+    sorted_valid = np.take_along_axis(valid, order, axis=1)
+    sorted_ids = np.take_along_axis(category_ids, order, axis=1)
+    n_total = sorted_valid.sum(axis=1)
+
+    # 2. 分位数门槛
+    threshold = _sorted_quantile(sorted_scores, n_total, quantile)
+
+    # 3. ≥门槛 + 门槛线上的同分，按分类去重
+    with np.errstate(invalid='ignore'):
+        advance = sorted_valid & (
+            (sorted_scores >= threshold[:, None]) |
+            (np.abs(sorted_scores - threshold[:, None]) < TIE_EPSILON)
+        )
+    keep = _first_per_category(advance, sorted_ids)
+
+    # 4. 兜底：晋级数不足时取前2名（含同分）
+    fallback_rows = (n_total > min_advance) & (keep.sum(axis=1) < min_advance)
+    if fallback_rows.any():
+        second = np.where(n_total >= 2, 1, 0)
+        top2_score = sorted_scores[np.arange(n_rows), second]
+        with np.errstate(invalid='ignore'):
+            top2 = sorted_valid & (sorted_scores >= top2_score[:, None]) & fallback_rows[:, None]
+        keep[fallback_rows] = _first_per_category(top2, sorted_ids)[fallback_rows]
+
+    # 数据量不超过最小晋级数时全部晋级（不去重）
+    small_rows = n_total <= min_advance
+    keep[small_rows] = sorted_valid[small_rows]
+
+    return [order[row][keep[row]] for row in range(n_rows)]
+
+
+def filter_quantile_with_tie(data, score_key="similarity_score", quantile=0.9, min_advance=2):
+    """
+    对字典列表做分位数筛选 + 同分归并（单个查询，不设相似度下限）
+
+    Args:
+        data: 数据列表，每个元素包含score_key字段，按 'category_path' 去重
+        score_key: 分数字段名
+        quantile: 分位数
+        min_advance: 最小晋级数
+
+    Returns:
+        list: 筛选后的数据列表（按分数降序）
+    """
+    if not data:
+        return []
+    interner = CategoryInterner()
+    scores = np.array([[d[score_key] for d in data]], dtype=float)
+    category_ids = np.array([[interner.intern(d.get('category_path', ''), d.get('category_path', ''))
+                              for d in data]], dtype=np.int64)
+    positions = select_batch(scores, category_ids, quantile=quantile, min_advance=min_advance, min_score=None)[0]
+    return [data[i] for i in positions]
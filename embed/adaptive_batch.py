@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+自适应嵌入分块
+嵌入请求的大小与数据库读取批次无关：按当前分块大小切分后依次请求嵌入服务，
+根据每次请求的耗时和错误调整分块大小（耗时低于目标一半时增大，超过目标时按比例减小，出错时减半），
+出错过的分块大小作为上限，之后不再增大到该值，连续成功一段时间后上限逐步放宽。
+出错的分块拆成两半分别重试（拆分后的请求出错不再调整分块大小，避免个别坏数据把分块压到很小），
+单条文本出错时延时重试，仍然失败的文本返回 None，
+不会让同一批中其他文本的向量作废。拆分和重试的请求出错只用于定位坏数据，不计入连续出错次数，
+未拆分的请求出错和重试后仍然失败的文本连续过多（嵌入服务不可用）时抛出异常。
+"""
+
+import threading
+import time
+
+
+# 配置
+INITIAL_CHUNK_SIZE = 64
+MIN_CHUNK_SIZE = 1
+MAX_CHUNK_SIZE = 1024
+TARGET_LATENCY = 2.0       # 单次嵌入请求的目标耗时（秒）
+MAX_RETRIES = 3            # 单条文本出错后的重试次数
+RETRY_DELAY = 1.0          # 第 n 次重试前等待 n * RETRY_DELAY 秒
+MAX_CONSECUTIVE_ERRORS = 10
+RELAX_AFTER = 50           # 连续成功多少次后放宽分块上限
+
+
+class AdaptiveEmbedder:
+    """按自适应分块调用嵌入函数（多个嵌入线程共享分块大小）"""
+
+    def __init__(self, embedding_function, initial_size=INITIAL_CHUNK_SIZE, min_size=MIN_CHUNK_SIZE,
+                 max_size=MAX_CHUNK_SIZE, target_latency=TARGET_LATENCY, max_retries=MAX_RETRIES,
+                 retry_delay=RETRY_DELAY, max_consecutive_errors=MAX_CONSECUTIVE_ERRORS, metrics=None):
+        """
+        初始化
+
+        Args:
+            embedding_function: 嵌入函数 f(texts) -> vectors
+            initial_size: 初始分块大小
+            min_size: 最小分块大小
+            max_size: 最大分块大小
+            target_latency: 单次请求的目标耗时（秒）
+            max_retries: 单条文本出错后的重试次数
+            retry_delay: 重试等待的基数（秒）
+            max_consecutive_errors: 连续出错（未拆分的请求出错或文本重试后仍然失败）达到该次数时认为嵌入服务不可用
+            metrics: MetricsRecorder，每次请求记录一条 'embed_request' 事件（None 时不记录）
+        """
+        self.embedding_function = embedding_function
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = max(min_size, min(max_size, initial_size))
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_consecutive_errors = max_consecutive_errors
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._consecutive_errors = 0
+        self._ceiling = None     # 出错过的最小分块大小
+        self._successes = 0      # 上次出错以来的成功次数
+        self.calls = 0    # 嵌入请求次数
+        self.errors = 0   # 出错的请求次数
+        self.failed = 0   # 重试后仍然失败的文本数
+
+    def __call__(self, texts):
+        return self.embed(texts)
+
+    def embed(self, texts):
+        """
+        计算向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            list: 与 texts 一一对应的向量，重试后仍然失败的文本为 None
+
+        Raises:
+            Exception: 连续出错过多时抛出最后一次的异常
+        """
+        texts = list(texts)
+        vectors = [None] * len(texts)
+        pending = [(0, len(texts), 0, False)]  # (起始下标, 结束下标, 已重试次数, 是否为出错后拆分的部分)
+        while pending:
+            start, end, attempts, split = pending.pop()
+            if not split:
+                with self._lock:
+                    size = self.size
+                if end - start > size:
+                    # 按当前分块大小切分，剩余部分放回待处理
+                    pending.append((start + size, end, attempts, False))
+                    end = start + size
+            chunk = texts[start:end]
+            call_start = time.time()
+            try:
+                result = self.embedding_function(chunk)
+                if len(result) != len(chunk):
+                    raise ValueError(f"嵌入服务返回 {len(result)} 个向量，期望 {len(chunk)} 个")
+            except Exception as e:
+                self._record(len(chunk), call_start, error=True)
+                if self._on_error(len(chunk), adjust=not split):
+                    raise
+                if len(chunk) > 1:
+                    middle = (start + end) // 2
+                    pending += [(middle, end, attempts, True), (start, middle, attempts, True)]
+                elif attempts < self.max_retries:
+                    time.sleep(self.retry_delay * (attempts + 1))
+                    pending.append((start, end, attempts + 1, True))
+                else:
+                    print(f"\n✗ 嵌入失败（已重试 {attempts} 次）: {e}")
+                    if self._on_failed():
+                        raise
+                continue
+            self._record(len(chunk), call_start, error=False)
+            self._on_success(len(chunk), time.time() - call_start, adjust=not split)
+            vectors[start:end] = result
+        return vectors
+
+    def _record(self, count, call_start, error):
+        if self.metrics is not None:
+            self.metrics.record('embed_request', elapsed_ms=(time.time() - call_start) * 1000,
+                                size=count, error=error)
+
+    def _on_success(self, count, latency, adjust=True):
+        """请求成功：按耗时调整分块大小"""
+        with self._lock:
+            self.calls += 1
+            self._consecutive_errors = 0
+            if not adjust:
+                return
+            self._successes += 1
+            if self._ceiling is not None and self._successes >= RELAX_AFTER:
+                self._ceiling += max(1, self._ceiling // 4)
+                self._successes = 0
+            if latency > self.target_latency:
+                self.size = max(self.min_size, int(count * self.target_latency / latency))
+            elif latency < self.target_latency / 2 and count >= self.size:
+                limit = self.max_size if self._ceiling is None else min(self.max_size, self._ceiling - 1)
+                self.size = max(self.size, min(limit, self.size + max(1, self.size // 2)))
+
+    def _on_error(self, count, adjust=True):
+        """
+        请求出错：分块大小减半，记录分块上限（拆分后的请求 adjust=False，不调整也不计入连续出错）
+
+        Returns:
+            bool: 连续出错是否已达到上限
+        """
+        with self._lock:
+            self.calls += 1
+            self.errors += 1
+            if adjust:
+                self._consecutive_errors += 1
+                self._successes = 0
+                if count > 1:
+                    self._ceiling = count if self._ceiling is None else min(self._ceiling, count)
+                self.size = max(self.min_size, min(self.size, count // 2))
+            return self._consecutive_errors >= self.max_consecutive_errors
+
+    def _on_failed(self):
+        """
+        文本重试后仍然失败
+
+        Returns:
+            bool: 连续出错是否已达到上限
+        """
+        with self._lock:
+            self.failed += 1
+            self._consecutive_errors += 1
+            return self._consecutive_errors >= self.max_consecutive_errors
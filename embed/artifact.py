@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+向量索引导出/导入
+把一个集合的 id、向量、文档、分类元数据和构建参数打包成一个带版本和校验和的文件，
+新机器直接导入即可，不需要重新读取 MySQL 和调用嵌入服务。
+
+文件结构（小端）:
+    MAGIC(8) | 各数据段（每段按64字节对齐） | 头部JSON | 头部长度(uint64) | MAGIC(8)
+数据段:
+    vectors     float32 [条数, 维度]，可以直接 mmap（np.memmap）
+    categories  uint32 [条数]，每条记录在分类表中的下标
+    row_hashes  uint8 [条数, 16]，导入状态中的源数据行哈希（全零表示没有）
+    table       zlib 压缩的 JSON：id、文档、分类表（大类/中类/小类/小类编码去重后只存一次）和其余元数据列
+头部记录格式版本、条数、维度、构建参数和每个数据段的偏移、长度、SHA-256
+
+用法:
+    python -m embed.artifact export <集合名称> <文件> [--model 嵌入模型]
+    python -m embed.artifact import <文件> [集合名称] [--replace]
+"""
+
+import sys
+import os
+import json
+import time
+import zlib
+import struct
+import hashlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+from embed.ingest_state import IngestState, state_path_for
+
+
+# 配置
+VECTOR_DB_PATH = "./file_classification_db"
+READ_BATCH_SIZE = 5000
+WRITE_BATCH_SIZE = 1000
+DEFAULT_EMBEDDING_MODEL = "bge"
+
+MAGIC = b"HDLVEC\x00\x00"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+CHECKSUM_CHUNK = 16 * 1024 * 1024
+RECORD_PREFIX = "material_"
+CATEGORY_FIELDS = ('big_class_name', 'middle_class_name', 'small_class_name', 'small_class_code')
+
+_FOOTER = struct.Struct("<Q8s")
+
+
+class ArtifactError(Exception):
+    """导出文件损坏、格式版本不支持或校验和不一致"""
+
+
+def _pad(f):
+    """写入填充字节，使下一段从 ALIGNMENT 的整数倍处开始"""
+    remainder = f.tell() % ALIGNMENT
+    if remainder:
+        f.write(b"\x00" * (ALIGNMENT - remainder))
+
+
+def _write_section(f, sections, name, data, dtype=None, shape=None):
+    """写入一个完整的数据段并记录偏移、长度和校验和"""
+    _pad(f)
+    offset = f.tell()
+    f.write(data)
+    sections[name] = {'offset': offset, 'length': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+    if dtype is not None:
+        sections[name].update(dtype=dtype, shape=list(shape))
+
+
+def _material_id(record_id):
+    """向量库记录 id（material_<id>）对应的源数据 id，无法解析时返回 None"""
+    if not record_id.startswith(RECORD_PREFIX):
+        return None
+    try:
+        return int(record_id[len(RECORD_PREFIX):])
+    except ValueError:
+        return None
+
+
+def export_collection(collection, path, build_params=None, state=None, batch_size=READ_BATCH_SIZE):
+    """
+    导出集合（先写临时文件，完成后替换，中途失败不会留下不完整的文件）
+
+    Args:
+        collection: 向量库集合
+        path: 导出文件路径
+        build_params: 构建参数（嵌入模型等），原样写入头部
+        state: 集合的导入状态 IngestState（提供时一并导出行哈希，导入后可以直接增量同步）
+        batch_size: 每批读取数量
+
+    Returns:
+        dict: 头部信息
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    known_hashes = dict(state.iter_rows()) if state is not None else {}
+
+    total = collection.count()
+    ids, documents, category_index, row_hashes = [], [], [], []
+    category_table, category_lookup, columns = [], {}, {}
+    vectors_digest = hashlib.sha256()
+    dimension = None
+    sections = {}
+
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            _pad(f)
+            vectors_offset = f.tell()
+            offset = 0
+            with tqdm(total=total, desc="导出向量", unit="条") as pbar:
+                while offset < total:
+                    batch = collection.get(limit=batch_size, offset=offset,
+                                           include=["embeddings", "documents", "metadatas"])
+                    batch_ids = batch.get('ids') or []
+                    if not batch_ids:
+                        break
+                    embeddings = np.ascontiguousarray(batch['embeddings'], dtype='<f4')
+                    if dimension is None:
+                        dimension = embeddings.shape[1]
+                    elif embeddings.shape[1] != dimension:
+                        raise ArtifactError(f"向量维度不一致: {embeddings.shape[1]} != {dimension}")
+                    data = embeddings.tobytes()
+                    f.write(data)
+                    vectors_digest.update(data)
+
+                    batch_documents = batch.get('documents') or [None] * len(batch_ids)
+                    for row, (record_id, document, metadata) in enumerate(
+                            zip(batch_ids, batch_documents, batch['metadatas'])):
+                        metadata = metadata or {}
+                        key = tuple(metadata.get(field) for field in CATEGORY_FIELDS)
+                        index = category_lookup.get(key)
+                        if index is None:
+                            index = category_lookup[key] = len(category_table)
+                            category_table.append(list(key))
+                        category_index.append(index)
+                        # 其余元数据按列保存，缺失的值为 None
+                        for name, value in metadata.items():
+                            if name not in CATEGORY_FIELDS:
+                                columns.setdefault(name, [None] * (len(ids) + row))
+                        for name, values in columns.items():
+                            values.append(metadata.get(name))
+                        digest = known_hashes.get(_material_id(record_id))
+                        row_hashes.append(bytes.fromhex(digest) if digest else bytes(16))
+                    ids.extend(batch_ids)
+                    documents.extend(batch_documents)
+                    offset += len(batch_ids)
+                    pbar.update(len(batch_ids))
+
+            dimension = dimension or 0
+            sections['vectors'] = {'offset': vectors_offset, 'length': len(ids) * dimension * 4,
+                                   'sha256': vectors_digest.hexdigest(), 'dtype': '<f4',
+                                   'shape': [len(ids), dimension]}
+            _write_section(f, sections, 'categories', np.asarray(category_index, dtype='<u4').tobytes(),
+                           dtype='<u4', shape=(len(ids),))
+            _write_section(f, sections, 'row_hashes', b"".join(row_hashes), dtype='u1', shape=(len(ids), 16))
+            table = {'ids': ids, 'documents': documents, 'categories': category_table, 'columns': columns}
+            _write_section(f, sections, 'table',
+                           zlib.compress(json.dumps(table, ensure_ascii=False).encode('utf-8'), 6))
+
+            header = {
+                'format_version': FORMAT_VERSION,
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'count': len(ids),
+                'dimension': dimension,
+                'build_params': dict(build_params or {}),
+                'collection_metadata': dict(collection.metadata or {}),
+                'sections': sections,
+            }
+            # 内容版本：各数据段校验和的摘要，内容相同的两次导出版本相同
+            header['version'] = hashlib.sha256(
+                "".join(sections[name]['sha256'] for name in sorted(sections)).encode('ascii')
+            ).hexdigest()[:16]
+            header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+            f.write(header_bytes)
+            f.write(_FOOTER.pack(len(header_bytes), MAGIC))
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return header
+
+
+class VectorArtifact:
+    """读取导出文件（向量通过 mmap 访问，不整体读入内存）"""
+
+    def __init__(self, path):
+        """
+        打开导出文件并读取头部
+
+        Args:
+            path: 导出文件路径
+
+        Raises:
+            ArtifactError: 文件不是导出文件或格式版本不支持
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ArtifactError(f"不是向量索引导出文件: {self.path}")
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            footer_offset = f.tell()
+            header_length, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+            if magic != MAGIC or header_length > footer_offset:
+                raise ArtifactError(f"导出文件不完整: {self.path}")
+            f.seek(footer_offset - header_length)
+            try:
+                self.header = json.loads(f.read(header_length).decode('utf-8'))
+            except ValueError as e:
+                raise ArtifactError(f"导出文件头部损坏: {e}")
+        if self.header.get('format_version') != FORMAT_VERSION:
+            raise ArtifactError(f"不支持的格式版本: {self.header.get('format_version')}")
+        self._table = None
+
+    def __len__(self):
+        return self.header['count']
+
+    @property
+    def version(self):
+        """内容版本"""
+        return self.header['version']
+
+    @property
+    def build_params(self):
+        """构建参数"""
+        return self.header['build_params']
+
+    def _array(self, name):
+        section = self.header['sections'][name]
+        if not section['length']:
+            return np.zeros(section['shape'], dtype=section['dtype'])
+        return np.memmap(self.path, dtype=section['dtype'], mode='r',
+                         offset=section['offset'], shape=tuple(section['shape']))
+
+    @property
+    def vectors(self):
+        """全部向量（只读 mmap，float32 [条数, 维度]）"""
+        return self._array('vectors')
+
+    def verify(self):
+        """
+        校验所有数据段的 SHA-256
+
+        Raises:
+            ArtifactError: 校验和不一致
+        """
+        with open(self.path, 'rb') as f:
+            for name, section in self.header['sections'].items():
+                f.seek(section['offset'])
+                digest = hashlib.sha256()
+                remaining = section['length']
+                while remaining > 0:
+                    chunk = f.read(min(CHECKSUM_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+                if remaining or digest.hexdigest() != section['sha256']:
+                    raise ArtifactError(f"数据段 {name} 校验和不一致，文件可能已损坏")
+
+    def table(self):
+        """元数据表（解压后缓存）"""
+        if self._table is None:
+            section = self.header['sections']['table']
+            with open(self.path, 'rb') as f:
+                f.seek(section['offset'])
+                self._table = json.loads(zlib.decompress(f.read(section['length'])).decode('utf-8'))
+        return self._table
+
+    def records(self, batch_size=WRITE_BATCH_SIZE):
+        """
+        按批读取记录
+
+        Yields:
+            dict: {'ids', 'embeddings', 'documents', 'metadatas'}（documents 全部缺失时为 None）
+        """
+        table = self.table()
+        vectors = self.vectors
+        categories = self._array('categories')
+        category_table = table['categories']
+        columns = table['columns']
+        for start in range(0, len(self), batch_size):
+            end = min(start + batch_size, len(self))
+            metadatas = []
+            for row in range(start, end):
+                metadata = {name: values[row] for name, values in columns.items() if values[row] is not None}
+                for field, value in zip(CATEGORY_FIELDS, category_table[int(categories[row])]):
+                    if value is not None:
+                        metadata[field] = value
+                metadatas.append(metadata)
+            documents = table['documents'][start:end]
+            yield {
+                'ids': table['ids'][start:end],
+                'embeddings': np.asarray(vectors[start:end]).tolist(),
+                'documents': documents if any(document is not None for document in documents) else None,
+                'metadatas': metadatas,
+            }
+
+    def row_hashes(self):
+        """
+        导出时记录的源数据行哈希
+
+        Returns:
+            list: [(源数据 id, 行哈希)]，没有行哈希的记录不包含在内
+        """
+        hashes = self._array('row_hashes')
+        empty = bytes(16)
+        result = []
+        for record_id, digest in zip(self.table()['ids'], hashes):
+            digest = bytes(digest)
+            material_id = _material_id(record_id)
+            if digest != empty and material_id is not None:
+                result.append((material_id, digest.hex()))
+        return result
+
+
+def import_artifact(artifact, collection, state=None, batch_size=WRITE_BATCH_SIZE):
+    """
+    把导出文件写入集合（使用导出的向量，不调用嵌入服务）
+
+    Args:
+        artifact: VectorArtifact（调用前应先 verify）
+        collection: 目标集合
+        state: 目标集合的导入状态（提供时用导出的行哈希重建，之后可以直接 --incremental）
+        batch_size: 每批写入数量
+
+    Returns:
+        int: 写入的记录数
+    """
+    written = 0
+    with tqdm(total=len(artifact), desc="导入向量", unit="条") as pbar:
+        for batch in artifact.records(batch_size):
+            kwargs = {'ids': batch['ids'], 'embeddings': batch['embeddings'], 'metadatas': batch['metadatas']}
+            if batch['documents'] is not None:
+                kwargs['documents'] = batch['documents']
+            collection.upsert(**kwargs)
+            written += len(batch['ids'])
+            pbar.update(len(batch['ids']))
+
+    if state is not None:
+        state.clear()
+        row_hashes = artifact.row_hashes()
+        state.record(row_hashes)
+        # 每条记录都有行哈希时视为一次完整的全量导入
+        if row_hashes and len(row_hashes) == len(artifact):
+            state.set('checkpoint', max(material_id for material_id, _ in row_hashes))
+    return written
+
+
+def create_target_collection(client, collection_name, embedding_function, metadata=None, replace=False):
+    """
+    创建或打开导入的目标集合（与 embed/initial_a.py 一样带上项目的嵌入函数，
+    否则 Chroma 会在集合配置中记录默认嵌入函数，分类器按项目嵌入函数打开集合时报冲突）
+
+    Args:
+        client: chromadb 客户端
+        collection_name: 集合名称
+        embedding_function: 嵌入函数（查询时使用；导入时向量来自导出文件）
+        metadata: 集合元数据（None 时使用余弦距离）
+        replace: 是否先删除已有集合
+
+    Returns:
+        chromadb.Collection: 集合对象
+    """
+    if replace:
+        try:
+            client.delete_collection(collection_name)
+        except Exception:
+            pass
+    return client.get_or_create_collection(
+        name=collection_name,
+        embedding_function=embedding_function,
+        metadata=metadata or {"hnsw:space": "cosine"}
+    )
+
+
+def main():
+    """主函数"""
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    replace = "--replace" in sys.argv[1:]
+    model = DEFAULT_EMBEDDING_MODEL
+    if "--model" in sys.argv[1:]:
+        position = sys.argv.index("--model")
+        model = sys.argv[position + 1] if position + 1 < len(sys.argv) else model
+        args = [arg for arg in args if arg != model]
+    if len(args) < 2 or args[0] not in ("export", "import"):
+        print(__doc__)
+        return
+
+    import chromadb
+    from llm.model import OpenAIOfficialEmbeddingFunction
+
+    start_time = time.time()
+    client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
+
+    if args[0] == "export":
+        if len(args) < 3:
+            print(__doc__)
+            return
+        collection_name, output_path = args[1], args[2]
+        try:
+            collection = client.get_collection(name=collection_name)
+        except Exception as e:
+            print(f"✗ 集合不存在: {collection_name} ({e})")
+            return
+        state_path = state_path_for(collection_name)
+        state = IngestState(state_path) if state_path.exists() else None
+        try:
+            header = export_collection(collection, output_path, state=state, build_params={
+                'collection': collection_name,
+                'embedding_model': model,
+                'source_table': 'hdl_material_pure',
+            })
+        finally:
+            if state is not None:
+                state.close()
+        size_mb = Path(output_path).stat().st_size / 1024 / 1024
+        print(f"✓ 已导出 {header['count']:,} 条（{header['dimension']} 维），版本 {header['version']}，"
+              f"{size_mb:.1f} MB: {output_path}")
+    else:
+        try:
+            artifact = VectorArtifact(args[1])
+            print(f"校验 {args[1]}（版本 {artifact.version}，{len(artifact):,} 条）...")
+            artifact.verify()
+        except (OSError, ArtifactError) as e:
+            print(f"✗ 无法导入: {e}")
+            return
+        collection_name = args[2] if len(args) > 2 else artifact.build_params.get('collection')
+        if not collection_name:
+            print("✗ 导出文件中没有集合名称，请指定")
+            return
+        embedding_function = OpenAIOfficialEmbeddingFunction(
+            api_key="xxxxxxxx",
+            model=artifact.build_params.get('embedding_model') or DEFAULT_EMBEDDING_MODEL
+        )
+        collection = create_target_collection(client, collection_name, embedding_function,
+                                              metadata=artifact.header.get('collection_metadata'),
+                                              replace=replace)
+        if collection.count() and not replace:
+            print(f"✗ 集合 {collection_name} 已有 {collection.count():,} 条记录，使用 --replace 覆盖")
+            return
+        state = IngestState(state_path_for(collection_name))
+        try:
+            written = import_artifact(artifact, collection, state=state)
+        finally:
+            state.close()
+        print(f"✓ 已导入 {written:,} 条到 {collection_name}（嵌入模型 {artifact.build_params.get('embedding_model')}）")
+
+    print(f"耗时 {time.time() - start_time:.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
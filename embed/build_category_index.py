@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分类级向量索引构建脚本
+从物项级集合（initial_a / initial_b 生成）读取全部向量，按 small_class_code 分组，
+每个小类取归一化的平均向量作为代表向量，存入一个很小的分类级集合，
+供分类器两阶段检索的第一阶段使用
+
+用法:
+    python -m embed.build_category_index [物项集合名称]
+"""
+
+import sys
+import time
+
+import chromadb
+import numpy as np
+from tqdm import tqdm
+
+
+# 配置
+VECTOR_DB_PATH = "./file_classification_db"
+SOURCE_COLLECTION_NAME = "material_categories"
+CATEGORY_COLLECTION_SUFFIX = "_category"
+READ_BATCH_SIZE = 5000
+WRITE_BATCH_SIZE = 1000
+
+
+def category_collection_name(source_name):
+    """物项集合对应的分类级集合名称"""
+    return source_name + CATEGORY_COLLECTION_SUFFIX
+
+
+def accumulate_centroids(collection, batch_size=READ_BATCH_SIZE):
+    """
+    分批读取物项向量，按 small_class_code 累加
+
+    Args:
+        collection: 物项级集合
+        batch_size: 每批读取数量
+
+    Returns:
+        dict: {small_class_code: {'sum': 向量和, 'count': 数量, 'metadata': 分类元数据}}
+    """
+    groups = {}
+    total = collection.count()
+    offset = 0
+    with tqdm(total=total, desc="读取物项向量", unit="条") as pbar:
+        while offset < total:
+            batch = collection.get(
+                limit=batch_size,
+                offset=offset,
+                include=["embeddings", "metadatas"]
+            )
+            ids = batch.get('ids') or []
+            if not ids:
+                break
+            embeddings = np.asarray(batch['embeddings'], dtype=np.float32)
+            # 余弦空间：先把每个物项向量归一化，再求平均
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms > 0, norms, 1.0)
+
+            for vector, metadata in zip(embeddings, batch['metadatas']):
+                code = (metadata or {}).get('small_class_code')
+                if not code:
+                    continue
+                group = groups.get(code)
+                if group is None:
+                    group = groups[code] = {
+                        'sum': np.zeros_like(vector),
+                        'count': 0,
+                        'metadata': {
+                            'small_class_code': code,
+                            'big_class_name': metadata.get('big_class_name', ''),
+                            'middle_class_name': metadata.get('middle_class_name', ''),
+                            'small_class_name': metadata.get('small_class_name', ''),
+                        }
+                    }
+                group['sum'] += vector
+                group['count'] += 1
+
+            offset += len(ids)
+            pbar.update(len(ids))
+    return groups
+
+
+def write_category_collection(client, name, groups, batch_size=WRITE_BATCH_SIZE):
+    """
+    重建分类级集合并写入代表向量
+
+    Returns:
+        chromadb.Collection: 分类级集合
+    """
+    try:
+        client.delete_collection(name)
+    except Exception:
+        pass
+    collection = client.create_collection(name=name, metadata={"hnsw:space": "cosine"})
+
+    codes = sorted(groups)
+    for start in range(0, len(codes), batch_size):
+        chunk = codes[start:start + batch_size]
+        embeddings = []
+        metadatas = []
+        for code in chunk:
+            group = groups[code]
+            centroid = group['sum'] / group['count']
+            norm = np.linalg.norm(centroid)
+            embeddings.append((centroid / norm if norm > 0 else centroid).tolist())
+            metadata = dict(group['metadata'])
+            metadata['material_count'] = group['count']
+            metadatas.append(metadata)
+        collection.add(
+            ids=[f"category_{code}" for code in chunk],
+            embeddings=embeddings,
+            metadatas=metadatas
+        )
+    return collection
+
+
+def main():
+    """主函数"""
+    source_name = sys.argv[1] if len(sys.argv) > 1 else SOURCE_COLLECTION_NAME
+    target_name = category_collection_name(source_name)
+
+    print("=" * 60)
+    print("分类级向量索引构建程序")
+    print("=" * 60)
+
+    start_time = time.time()
+    client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
+    try:
+        source = client.get_collection(name=source_name)
+    except Exception as e:
+        print(f"✗ 物项集合不存在: {source_name} ({e})")
+        return
+
+    print(f"\n[1/2] 读取物项向量: {source_name}")
+    groups = accumulate_centroids(source)
+    print(f"✓ 共 {len(groups):,} 个小类")
+
+    print(f"\n[2/2] 写入分类级集合: {target_name}")
+    write_category_collection(client, target_name, groups)
+
+    print("\n" + "=" * 60)
+    print(f"完成，耗时 {time.time() - start_time:.2f} 秒")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+关键词语料统计构建脚本
+从 hdl_material_pure 表读取物项名称，并读取文档提取缓存（data/extract_cache）中已提取的正文，
+统计字符n-gram的文档频率，供分类器生成内容感知的检索查询（core/keyphrase.py）
+
+用法:
+    python -m embed.build_keyphrase_stats [提取缓存目录] [输出文件]
+"""
+
+import sys
+import json
+import time
+from pathlib import Path
+
+from tqdm import tqdm
+
+from config.db_pool import get_pool
+from core.keyphrase import KeyphraseModel, DEFAULT_STATS_PATH
+
+
+# 配置
+BATCH_SIZE = 5000
+EXTRACT_CACHE_DIR = "data/extract_cache"
+MIN_DOCUMENT_FREQUENCY = 2
+
+
+def iter_material_names(batch_size=BATCH_SIZE):
+    """
+    分批读取物项名称
+
+    Yields:
+        str: 物项名称
+    """
+    with get_pool().connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) as total FROM hdl_material_pure")
+            total = cursor.fetchone()['total']
+        last_id = 0
+        with tqdm(total=total, desc="读取物项名称", unit="条") as pbar:
+            while True:
+                # 按主键分页，每批只读取 id 大于上一批最后一条的记录
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT id, material_name FROM hdl_material_pure WHERE id > %s ORDER BY id LIMIT %s",
+                        (last_id, batch_size)
+                    )
+                    rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                for row in rows:
+                    if row['material_name']:
+                        yield row['material_name']
+                pbar.update(len(rows))
+
+
+def iter_extracted_texts(cache_dir=EXTRACT_CACHE_DIR):
+    """
+    读取提取缓存中的正文；同一文档有完整提取和预览两份缓存时取较长的一份
+
+    Yields:
+        str: 文档正文
+    """
+    texts = {}
+    for path in Path(cache_dir).glob("*/*.json"):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"跳过无法读取的缓存 {path}: {e}")
+            continue
+        key = path.name.split('.')[0]
+        text = record.get('text') or ''
+        if len(text) > len(texts.get(key, '')):
+            texts[key] = text
+    yield from texts.values()
+
+
+def main():
+    """主函数"""
+    cache_dir = sys.argv[1] if len(sys.argv) > 1 else EXTRACT_CACHE_DIR
+    output_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STATS_PATH
+
+    print("=" * 60)
+    print("关键词语料统计构建程序")
+    print("=" * 60)
+
+    start_time = time.time()
+    model = KeyphraseModel()
+
+    print("\n[1/3] 统计物项名称")
+    try:
+        model.fit(iter_material_names())
+    except Exception as e:
+        print(f"✗ 读取物项名称失败: {e}")
+        return
+    material_count = model.doc_count
+
+    print(f"\n[2/3] 统计已提取文档: {cache_dir}")
+    model.fit(iter_extracted_texts(cache_dir))
+    print(f"✓ 物项名称 {material_count:,} 条, 文档 {model.doc_count - material_count:,} 个")
+
+    print(f"\n[3/3] 保存语料统计: {output_path}")
+    model.save(output_path, min_df=MIN_DOCUMENT_FREQUENCY)
+
+    print("\n" + "=" * 60)
+    print(f"完成，共 {len(model):,} 个n-gram，耗时 {time.time() - start_time:.2f} 秒")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+导入时的嵌入去重
+hdl_material_pure 中大量行的文档文本相同（同名物项，或 _b 模板中名称+分类完全相同），
+同一次导入中每个不同的文本只调用一次嵌入服务，其余行复用已算好的向量。
+向量以 float32 保存，按文本摘要索引；超过容量时淘汰最久未使用的文本。
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# 默认最多缓存的不同文本数（1024维 float32 约 4KB/条）
+DEFAULT_MAX_ENTRIES = 200000
+
+
+def text_key(text):
+    """文本摘要（16字节），缓存只保存摘要，不保存原文"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """在多个嵌入线程之间共享的去重嵌入器"""
+
+    def __init__(self, embedding_function, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        初始化
+
+        Args:
+            embedding_function: 嵌入函数 f(texts) -> vectors（失败的文本可以返回 None）
+            max_entries: 最多缓存的不同文本数
+        """
+        self.embedding_function = embedding_function
+        self.max_entries = max_entries
+        self._vectors = OrderedDict()
+        # 正在由某个线程嵌入的文本，其他线程遇到相同文本时等待结果而不是重复请求
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.requested = 0  # 得到向量的文档数
+        self.embedded = 0   # 实际发送给嵌入服务的文本数
+
+    @property
+    def avoided(self):
+        """因去重而省去的嵌入次数"""
+        return self.requested - self.embedded
+
+    def embed(self, documents):
+        """
+        计算一批文档的向量；批内重复、已缓存或正在被其他线程嵌入的文本不会再次发送
+
+        Args:
+            documents: 文档文本列表
+
+        Returns:
+            list: 与 documents 一一对应的向量（list[float]），嵌入失败的文档为 None
+        """
+        keys = [text_key(document) for document in documents]
+        found = {}
+        failed = set()
+        # 等待的文本如果在其他线程中嵌入失败，下一轮由本线程自己嵌入
+        missing = dict(zip(keys, documents))
+        while missing:
+            own, waits = {}, []
+            with self._lock:
+                for key, document in missing.items():
+                    vector = self._vectors.get(key)
+                    if vector is not None:
+                        self._vectors.move_to_end(key)
+                        found[key] = vector
+                    elif key in self._pending:
+                        waits.append(self._pending[key])
+                    else:
+                        self._pending[key] = threading.Event()
+                        own[key] = document
+            if own:
+                failed |= self._embed_own(own, found)
+            for event in waits:
+                event.wait()
+            missing = {key: document for key, document in missing.items()
+                       if key not in found and key not in failed}
+            if missing:
+                with self._lock:
+                    for key in list(missing):
+                        vector = self._vectors.get(key)
+                        if vector is not None:
+                            found[key] = vector
+                            del missing[key]
+        with self._lock:
+            self.requested += sum(key in found for key in keys)
+        return [found[key].tolist() if key in found else None for key in keys]
+
+    def _embed_own(self, own, found):
+        """
+        嵌入本线程负责的文本，写入缓存并通知等待的线程；嵌入函数抛出的异常向上抛出
+
+        Returns:
+            set: 嵌入失败（返回 None）的文本摘要
+        """
+        failed = set()
+        try:
+            vectors = self.embedding_function(list(own.values()))
+            if len(vectors) != len(own):
+                raise ValueError(f"嵌入服务返回 {len(vectors)} 个向量，期望 {len(own)} 个")
+            with self._lock:
+                self.embedded += len(own) - sum(vector is None for vector in vectors)
+                for key, vector in zip(own, vectors):
+                    if vector is None:
+                        failed.add(key)
+                        continue
+                    vector = np.asarray(vector, dtype=np.float32)
+                    found[key] = vector
+                    self._vectors[key] = vector
+                while len(self._vectors) > self.max_entries:
+                    self._vectors.popitem(last=False)
+        finally:
+            with self._lock:
+                for key in own:
+                    self._pending.pop(key).set()
+        return failed
@@ -0,0 +1,725 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+向量库导入流水线（initial_a / initial_b 共用）
+读取、嵌入、写入三个阶段并行：一个线程按主键分页读取 hdl_material_pure，
+多个线程并发调用嵌入服务，主线程把算好的向量（embeddings=）写入向量库。
+阶段之间是有界队列，下游跟不上时上游自动等待。
+嵌入经过 EmbeddingCache（embed/embedding_cache.py），整次运行中相同的文档文本只嵌入一次；
+需要嵌入的文本再由 AdaptiveEmbedder（embed/adaptive_batch.py）按自适应的分块大小请求嵌入服务，
+个别文本嵌入失败时只有这些行计为失败，同批其他行照常写入。
+
+提供导入状态（embed/ingest_state.py）时，每批写入后记录各行的源数据哈希和全量导入断点：
+- 全量导入中断后可以从断点继续（resume）；全量导入完成后删除向量库中源表已不存在的行
+  （集合用 upsert 写入，不删除的话旧 id 会一直留在集合中，且导入状态中没有记录，增量同步也删不掉）
+- 增量同步先只读取 (id, 行哈希) 与状态比较，再读取并嵌入新增/修改的行，删除源表中已不存在的行
+行哈希只覆盖源数据字段；修改文档模板（build_document）后需要重新全量导入
+
+各阶段的耗时记录在 MetricsRecorder 中，运行结束后用 report() 生成包含耗时分布（直方图）、
+各阶段忙碌时间和瓶颈阶段的运行报告（write_report 保存为 JSON）
+"""
+
+import os
+import json
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from tqdm import tqdm
+
+from config.db_pool import get_pool
+from core.metrics import MetricsRecorder
+from embed.adaptive_batch import AdaptiveEmbedder
+from embed.embedding_cache import EmbeddingCache, DEFAULT_MAX_ENTRIES
+
+
+# 配置
+READ_BATCH_SIZE = 1000
+HASH_BATCH_SIZE = 20000  # 增量同步读取 (id, 行哈希) 的每批数量
+DELETE_BATCH_SIZE = 1000
+EMBED_WORKERS = 4
+QUEUE_SIZE = 8
+METRICS_MAX_EVENTS = 200000
+DEFAULT_REPORT_DIR = "data/ingest_reports"
+# 报告中汇总的事件：读取一批、嵌入一批、单次嵌入请求、写入一批、记录导入状态
+STAGE_EVENTS = ('ingest_read', 'ingest_embed', 'embed_request', 'ingest_write', 'ingest_state')
+
+MATERIAL_FIELDS = ('material_name', 'big_class_name', 'middle_class_name', 'small_class_name', 'small_class_code')
+# 行哈希在 MySQL 端计算，只传输32个字符；与 row_hash() 的计算方式一致
+ROW_HASH_SQL = "MD5(CONCAT_WS('|', {}))".format(
+    ", ".join(f"COALESCE({field}, '')" for field in MATERIAL_FIELDS))
+MATERIAL_COLUMNS = "id, {}, {} AS row_hash".format(", ".join(MATERIAL_FIELDS), ROW_HASH_SQL)
+
+# 队列结束标记
+_DONE = object()
+
+
+def row_hash(material):
+    """
+    计算源数据行哈希（与 ROW_HASH_SQL 相同：各字段以 '|' 连接，空值按空字符串处理）
+
+    Args:
+        material: 材料数据字典
+
+    Returns:
+        str: MD5 十六进制字符串
+    """
+    text = "|".join("" if material.get(field) is None else str(material[field]) for field in MATERIAL_FIELDS)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+class MySQLMaterialSource:
+    """从 hdl_material_pure 按主键分页读取物项"""
+
+    def __init__(self, batch_size=READ_BATCH_SIZE):
+        """
+        Args:
+            batch_size: 每批读取数量
+        """
+        self.batch_size = batch_size
+
+    def count(self):
+        """
+        获取总记录数
+
+        Returns:
+            int: 总记录数
+        """
+        with get_pool().connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) as total FROM hdl_material_pure")
+                result = cursor.fetchone()
+                return result['total'] if result else 0
+
+    def fetch_batch(self, connection, last_id):
+        """
+        分批获取材料数据（按主键分页：只读取 id 大于上一批最后一条的记录，
+        每批的查询代价与读取到第几批无关，不像 OFFSET 那样要扫描并丢弃前面所有行）
+
+        Args:
+            connection: 数据库连接
+            last_id: 上一批最后一条记录的 id（第一批传 0）
+
+        Returns:
+            list: 材料数据列表（按 id 升序）
+        """
+        with connection.cursor() as cursor:
+            sql = f"""
+                SELECT {MATERIAL_COLUMNS}
+                FROM hdl_material_pure
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+            """
+            cursor.execute(sql, (last_id, self.batch_size))
+            return cursor.fetchall()
+
+    def batches(self, after_id=0):
+        """
+        依次读取所有批次（不足一批时说明已读完，不再查询）
+
+        Args:
+            after_id: 从 id 大于该值的记录开始（断点续传）
+
+        Yields:
+            tuple: (材料数据列表, 取数耗时毫秒)
+        """
+        last_id = after_id
+        with get_pool().connection() as connection:
+            while True:
+                fetch_start = time.time()
+                materials = self.fetch_batch(connection, last_id)
+                if not materials:
+                    return
+                last_id = materials[-1]['id']
+                yield materials, (time.time() - fetch_start) * 1000
+                if len(materials) < self.batch_size:
+                    return
+
+    def hash_batches(self, batch_size=HASH_BATCH_SIZE):
+        """
+        按 id 升序读取所有行的 (id, 行哈希)（不足一批时说明已读完，不再查询）
+
+        Yields:
+            list: [(id, 行哈希), ...]
+        """
+        last_id = 0
+        with get_pool().connection() as connection:
+            while True:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT id, {ROW_HASH_SQL} AS row_hash FROM hdl_material_pure "
+                        f"WHERE id > %s ORDER BY id LIMIT %s",
+                        (last_id, batch_size)
+                    )
+                    rows = cursor.fetchall()
+                if not rows:
+                    return
+                last_id = rows[-1]['id']
+                yield [(row['id'], row['row_hash']) for row in rows]
+                if len(rows) < batch_size:
+                    return
+
+    def fetch_by_ids(self, ids):
+        """
+        按 id 读取材料数据
+
+        Args:
+            ids: id 列表
+
+        Returns:
+            tuple: (材料数据列表, 取数耗时毫秒)
+        """
+        fetch_start = time.time()
+        with get_pool().connection() as connection:
+            with connection.cursor() as cursor:
+                placeholders = ", ".join(["%s"] * len(ids))
+                cursor.execute(
+                    f"SELECT {MATERIAL_COLUMNS} FROM hdl_material_pure WHERE id IN ({placeholders}) ORDER BY id",
+                    list(ids)
+                )
+                materials = cursor.fetchall()
+        return materials, (time.time() - fetch_start) * 1000
+
+
+def build_metadata(material):
+    """
+    构建元数据
+
+    Args:
+        material: 材料数据字典
+
+    Returns:
+        dict: 元数据字典
+    """
+    metadata = {}
+    for field in ('id', 'material_name', 'big_class_name', 'middle_class_name',
+                  'small_class_name', 'small_class_code'):
+        if material.get(field):
+            metadata[field] = str(material[field])
+    return metadata
+
+
+def prepare_batch(materials, build_document):
+    """
+    把一批材料整理成向量库记录，跳过没有 id 或文档为空的材料
+
+    Args:
+        materials: 材料数据列表
+        build_document: 由材料生成嵌入文本的函数
+
+    Returns:
+        dict: {'ids', 'documents', 'metadatas', 'skipped', 'failed': 嵌入失败的行数（嵌入后填写）,
+               'row_hashes': 本批所有行的 [(id, 行哈希)]（含跳过的行）, 'last_id': 本批最后一行的 id}
+    """
+    batch = {'ids': [], 'documents': [], 'metadatas': [], 'skipped': 0, 'failed': 0, 'row_hashes': [],
+             'last_id': materials[-1].get('id') if materials else None}
+    for material in materials:
+        material_code = material.get('id', '')
+        if material_code:
+            batch['row_hashes'].append((material_code, material.get('row_hash') or row_hash(material)))
+        try:
+            document = build_document(material) if material_code else None
+        except Exception as e:
+            print(f"\n跳过无法生成文档的材料 {material_code}: {e}")
+            document = None
+        if not document:
+            batch['skipped'] += 1
+            continue
+        batch['ids'].append(f"material_{material_code}")
+        batch['documents'].append(document)
+        batch['metadatas'].append(build_metadata(material))
+    return batch
+
+
+def drop_failed(batch, embeddings):
+    """
+    去掉嵌入失败（向量为 None）的行；这些行也不记录行哈希，下次增量同步时重新处理
+
+    Args:
+        batch: prepare_batch 返回的批次（就地修改）
+        embeddings: 与 batch['ids'] 一一对应的向量
+
+    Returns:
+        list: 剩余行的向量
+    """
+    failed_ids = {record_id for record_id, vector in zip(batch['ids'], embeddings) if vector is None}
+    if not failed_ids:
+        return embeddings
+    keep = [i for i, record_id in enumerate(batch['ids']) if record_id not in failed_ids]
+    for key in ('ids', 'documents', 'metadatas'):
+        batch[key] = [batch[key][i] for i in keep]
+    batch['row_hashes'] = [(code, digest) for code, digest in batch['row_hashes']
+                           if f"material_{code}" not in failed_ids]
+    batch['failed'] = len(failed_ids)
+    return [embeddings[i] for i in keep]
+
+
+class SQLiteMaterialSource:
+    """从本地 SQLite 中的 hdl_material_pure 读取物项（embed/synthetic_materials.py 生成，用于压测）"""
+
+    def __init__(self, path, batch_size=READ_BATCH_SIZE):
+        """
+        Args:
+            path: SQLite 文件路径
+            batch_size: 每批读取数量
+        """
+        self.path = str(path)
+        self.batch_size = batch_size
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _query(self, conn, sql, params=()):
+        fetch_start = time.time()
+        materials = [dict(row) for row in conn.execute(sql, params).fetchall()]
+        return materials, (time.time() - fetch_start) * 1000
+
+    def count(self):
+        """总记录数"""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM hdl_material_pure").fetchone()[0]
+        finally:
+            conn.close()
+
+    def batches(self, after_id=0):
+        """按主键分页读取（同 MySQLMaterialSource.batches）"""
+        columns = ", ".join(('id',) + MATERIAL_FIELDS)
+        conn = self._connect()
+        try:
+            last_id = after_id
+            while True:
+                materials, elapsed_ms = self._query(
+                    conn, f"SELECT {columns} FROM hdl_material_pure WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self.batch_size))
+                if not materials:
+                    return
+                last_id = materials[-1]['id']
+                yield materials, elapsed_ms
+                if len(materials) < self.batch_size:
+                    return
+        finally:
+            conn.close()
+
+    def hash_batches(self, batch_size=HASH_BATCH_SIZE):
+        """按 id 升序读取 (id, 行哈希)；SQLite 没有 MD5，行哈希在本地计算"""
+        for materials, _ in SQLiteMaterialSource(self.path, batch_size).batches():
+            yield [(material['id'], row_hash(material)) for material in materials]
+
+    def fetch_by_ids(self, ids):
+        """按 id 读取材料数据"""
+        columns = ", ".join(('id',) + MATERIAL_FIELDS)
+        placeholders = ", ".join(["?"] * len(ids))
+        conn = self._connect()
+        try:
+            return self._query(conn, f"SELECT {columns} FROM hdl_material_pure WHERE id IN ({placeholders}) ORDER BY id",
+                               list(ids))
+        finally:
+            conn.close()
+
+
+class IngestPipeline:
+    """读取 → 嵌入（多线程）→ 写入 的导入流水线"""
+
+    def __init__(self, collection, embedding_function, build_document, source=None, state=None,
+                 embed_workers=EMBED_WORKERS, queue_size=QUEUE_SIZE, cache_size=DEFAULT_MAX_ENTRIES,
+                 chunker=None):
+        """
+        初始化
+
+        Args:
+            collection: 向量库集合
+            embedding_function: 嵌入函数 f(texts) -> vectors
+            build_document: 由材料生成嵌入文本的函数
+            source: 数据源（默认 MySQLMaterialSource）
+            state: 导入状态 IngestState（None 时不记录，不能断点续传和增量同步）
+            embed_workers: 并发嵌入线程数
+            queue_size: 每个阶段之间最多缓存的批次数
+            cache_size: 嵌入去重最多缓存的不同文本数
+            chunker: 自适应分块嵌入器（默认用 embedding_function 创建 AdaptiveEmbedder）
+        """
+        self.collection = collection
+        self.embedding_function = embedding_function
+        self.metrics = MetricsRecorder(max_events=METRICS_MAX_EVENTS)
+        self.chunker = chunker or AdaptiveEmbedder(embedding_function, metrics=self.metrics)
+        self.embedder = EmbeddingCache(self.chunker, max_entries=cache_size)
+        self.build_document = build_document
+        self.source = source or MySQLMaterialSource()
+        self.state = state
+        self.embed_workers = embed_workers
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._stop_requested = False  # 本次运行被中断或读取失败（增量同步此时不做删除）
+
+    def run(self, total=None, resume=False):
+        """
+        全量导入
+
+        Args:
+            total: 总记录数（用于进度条，None 时不显示总数）
+            resume: 从上次中断的断点继续；为False时清空导入状态重新开始
+            （导入完成后都会删除集合中源表已不存在的行）
+
+        Returns:
+            dict: 统计 {'read', 'written', 'failed', 'skipped', 'deleted', 'unchanged',
+                        'embedded': 实际嵌入的文本数, 'deduplicated': 因去重省去的嵌入次数,
+                        'embed_calls': 嵌入请求次数, 'embed_errors': 出错的嵌入请求次数, 'elapsed'}
+        """
+        after_id = 0
+        if self.state is not None:
+            if resume:
+                after_id = int(self.state.get('checkpoint', 0))
+                if after_id:
+                    print(f"从断点继续: id > {after_id}")
+            else:
+                self.state.clear()
+        stats = self._new_stats()
+        self._run_stages(self.source.batches(after_id), stats, total, checkpoint=self.state is not None)
+        if not self._stop_requested:
+            self._delete(self._stale_ids(), stats)
+        return stats
+
+    def run_incremental(self):
+        """
+        增量同步：只嵌入和写入新增、修改的行，删除源表中已不存在的行（需要导入状态）
+
+        Returns:
+            dict: 统计（同 run）
+        """
+        if self.state is None:
+            raise ValueError("增量同步需要导入状态（IngestState）")
+        stats = self._new_stats()
+        deleted = []
+        self._run_stages(self._changed_batches(stats, deleted), stats, total=None, checkpoint=False)
+        if not self._stop_requested:
+            self._delete(deleted, stats)
+        return stats
+
+    @staticmethod
+    def _new_stats():
+        return {'read': 0, 'written': 0, 'failed': 0, 'skipped': 0, 'deleted': 0, 'unchanged': 0,
+                'embedded': 0, 'deduplicated': 0, 'embed_calls': 0, 'embed_errors': 0, 'elapsed': 0.0}
+
+    def _changed_batches(self, stats, deleted):
+        """
+        比较源表与导入状态中的 (id, 行哈希)（两边都按 id 升序，归并比较），
+        按批读取新增和修改的行；已不存在的 id 放入 deleted
+
+        Yields:
+            tuple: (材料数据列表, 取数耗时毫秒)
+        """
+        known = self.state.iter_rows()
+        current = next(known, None)
+        changed = []
+        for hashes in self.source.hash_batches():
+            for row_id, source_hash in hashes:
+                while current is not None and current[0] < row_id:
+                    deleted.append(current[0])
+                    current = next(known, None)
+                if current is not None and current[0] == row_id:
+                    unchanged = current[1] == source_hash
+                    current = next(known, None)
+                    if unchanged:
+                        stats['unchanged'] += 1
+                        continue
+                changed.append(row_id)
+                if len(changed) >= self.source.batch_size:
+                    yield self.source.fetch_by_ids(changed)
+                    changed = []
+        while current is not None:
+            deleted.append(current[0])
+            current = next(known, None)
+        if changed:
+            yield self.source.fetch_by_ids(changed)
+
+    def _stale_ids(self):
+        """
+        集合中源表已不存在的行（先读取源表的全部 id，再分页读取集合中的 id 比较）
+
+        Returns:
+            list: 材料 id 列表
+        """
+        source_ids = {row_id for hashes in self.source.hash_batches() for row_id, _ in hashes}
+        stale = []
+        offset = 0
+        while True:
+            record_ids = self.collection.get(limit=DELETE_BATCH_SIZE, offset=offset, include=[])['ids']
+            if not record_ids:
+                return stale
+            offset += len(record_ids)
+            for record_id in record_ids:
+                prefix, _, row_id = record_id.partition("material_")
+                if not prefix and row_id.isdigit() and int(row_id) not in source_ids:
+                    stale.append(int(row_id))
+
+    def _delete(self, deleted, stats):
+        """从向量库和导入状态中删除源表已不存在的行"""
+        for start in range(0, len(deleted), DELETE_BATCH_SIZE):
+            chunk = deleted[start:start + DELETE_BATCH_SIZE]
+            try:
+                self.collection.delete(ids=[f"material_{row_id}" for row_id in chunk])
+                if self.state is not None:
+                    self.state.remove(chunk)
+                stats['deleted'] += len(chunk)
+            except Exception as e:
+                print(f"\n✗ 删除失败（{len(chunk)} 条）: {e}")
+                stats['failed'] += len(chunk)
+
+    def _run_stages(self, material_batches, stats, total, checkpoint):
+        """
+        运行读取/嵌入/写入三个阶段直到数据读完
+
+        Args:
+            material_batches: 产生 (材料数据列表, 取数耗时毫秒) 的迭代器，在读取线程中消费
+            stats: 统计字典（就地更新）
+            total: 进度条总数
+            checkpoint: 是否记录全量导入断点
+        """
+        self._stop.clear()
+        self._stop_requested = False
+        self.metrics.clear()
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        fetch_ms = [0.0]
+        embedded_before, avoided_before = self.embedder.embedded, self.embedder.avoided
+        calls_before, errors_before = self.chunker.calls, self.chunker.errors
+
+        threads = [threading.Thread(target=self._read_stage, args=(material_batches, embed_queue, stats, fetch_ms),
+                                    name="ingest-read", daemon=True)]
+        threads += [threading.Thread(target=self._embed_stage, args=(embed_queue, write_queue),
+                                     name=f"ingest-embed-{i}", daemon=True)
+                    for i in range(self.embed_workers)]
+        for thread in threads:
+            thread.start()
+
+        # 各批次写入完成的顺序不固定，断点只推进到连续完成的最后一批（失败的批次之后不再推进）
+        finished_batches = {}
+        next_seq = 0
+        checkpoint_blocked = False
+
+        start_time = time.time()
+        try:
+            with tqdm(total=total, desc="处理进度", unit="条") as pbar:
+                finished_workers = 0
+                while finished_workers < self.embed_workers:
+                    wait_start = time.perf_counter()
+                    item = write_queue.get()
+                    wait_ms = (time.perf_counter() - wait_start) * 1000
+                    if item is _DONE:
+                        finished_workers += 1
+                        continue
+                    batch, embeddings, error = item
+                    count = len(batch['ids'])
+                    if error is None:
+                        with self.metrics.timer('ingest_write', rows=count, wait_ms=wait_ms,
+                                                embed_queue=embed_queue.qsize(), write_queue=write_queue.qsize()):
+                            error = self._write(batch, embeddings)
+                    if error is None:
+                        stats['written'] += count
+                        if self.state is not None:
+                            with self.metrics.timer('ingest_state', rows=len(batch['row_hashes'])):
+                                self.state.record(batch['row_hashes'])
+                    else:
+                        print(f"\n✗ 批量添加失败（{count} 条）: {error}")
+                        stats['failed'] += count
+                    stats['skipped'] += batch['skipped']
+                    stats['failed'] += batch['failed']
+
+                    if checkpoint:
+                        finished_batches[batch['seq']] = (batch['last_id'], error is None and not batch['failed'])
+                        while next_seq in finished_batches and not checkpoint_blocked:
+                            last_id, ok = finished_batches.pop(next_seq)
+                            if not ok:
+                                checkpoint_blocked = True
+                                break
+                            self.state.set('checkpoint', last_id)
+                            next_seq += 1
+
+                    pbar.update(count + batch['skipped'] + batch['failed'])
+                    elapsed = time.time() - start_time
+                    pbar.set_postfix({
+                        '已处理': f"{stats['written']:,}",
+                        '失败': f"{stats['failed']:,}",
+                        '速度': f"{stats['written'] / elapsed if elapsed > 0 else 0:.1f}条/秒",
+                        '取数': f"{fetch_ms[0]:.0f}ms",
+                        '去重': f"{self.embedder.avoided - avoided_before:,}",
+                        '分块': self.chunker.size,
+                        # 两个队列的积压情况说明瓶颈在哪个阶段
+                        '待嵌入': embed_queue.qsize(),
+                        '待写入': write_queue.qsize()
+                    })
+        except BaseException:
+            self._stop_requested = True
+            raise
+        finally:
+            self._stop.set()
+            stats['elapsed'] = time.time() - start_time
+            stats['embedded'] = self.embedder.embedded - embedded_before
+            stats['deduplicated'] = self.embedder.avoided - avoided_before
+            stats['embed_calls'] = self.chunker.calls - calls_before
+            stats['embed_errors'] = self.chunker.errors - errors_before
+
+    def report(self, stats):
+        """
+        生成运行报告
+
+        Args:
+            stats: run / run_incremental 返回的统计
+
+        Returns:
+            dict: {'created_at', 'stats', 'params', 'stages': {事件名: 耗时汇总和直方图（毫秒）},
+                   'busy_seconds': {'read', 'embed', 'write'}, 'bottleneck': 忙碌时间最长的阶段}
+        """
+        stages = {}
+        for name in STAGE_EVENTS:
+            summary = self.metrics.summary(name, 'elapsed_ms')
+            if summary['count']:
+                summary['rows'] = sum(e.get('rows') or e.get('size') or 0 for e in self.metrics.events(name))
+                summary['histogram'] = self.metrics.histogram(name, 'elapsed_ms')
+            stages[name] = summary
+
+        def total_ms(name, field='elapsed_ms'):
+            return sum(e.get(field) or 0 for e in self.metrics.events(name))
+
+        # 各阶段实际工作的时间（不含等待）；嵌入阶段按线程数折算成墙钟时间
+        busy = {
+            'read': (total_ms('ingest_read') + total_ms('ingest_read', 'prepare_ms')) / 1000,
+            'embed': total_ms('ingest_embed') / 1000 / max(1, self.embed_workers),
+            'write': (total_ms('ingest_write') + total_ms('ingest_state')) / 1000,
+        }
+        return {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'stats': dict(stats),
+            'params': {
+                'read_batch_size': getattr(self.source, 'batch_size', None),
+                'embed_workers': self.embed_workers,
+                'queue_size': self.queue_size,
+                'embed_chunk_size': self.chunker.size,
+                'cache_size': self.embedder.max_entries,
+            },
+            'stages': stages,
+            'busy_seconds': busy,
+            'bottleneck': max(busy, key=busy.get) if any(busy.values()) else None,
+        }
+
+    def _put(self, target_queue, item):
+        """放入队列；队列满时等待，流水线停止时放弃"""
+        while not self._stop.is_set():
+            try:
+                target_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_stage(self, material_batches, embed_queue, stats, fetch_ms):
+        """读取线程：读取材料数据，整理成记录后放入嵌入队列"""
+        try:
+            for seq, (materials, elapsed_ms) in enumerate(material_batches):
+                fetch_ms[0] = elapsed_ms
+                stats['read'] += len(materials)
+                prepare_start = time.perf_counter()
+                batch = prepare_batch(materials, self.build_document)
+                batch['seq'] = seq
+                put_start = time.perf_counter()
+                if not self._put(embed_queue, batch):
+                    return
+                # put_wait_ms 是嵌入队列已满时的等待时间（下游跟不上）
+                self.metrics.record('ingest_read', elapsed_ms=elapsed_ms, rows=len(materials),
+                                    prepare_ms=(put_start - prepare_start) * 1000,
+                                    put_wait_ms=(time.perf_counter() - put_start) * 1000)
+        except Exception as e:
+            print(f"\n✗ 读取数据失败: {e}")
+            self._stop_requested = True
+        finally:
+            for _ in range(self.embed_workers):
+                self._put(embed_queue, _DONE)
+
+    def _embed_stage(self, embed_queue, write_queue):
+        """嵌入线程：计算一批文档的向量后放入写入队列"""
+        wait_start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                batch = embed_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if batch is _DONE:
+                break
+            embeddings, error = None, None
+            if batch['ids']:
+                # wait_ms 是等待读取线程的时间（上游跟不上）
+                with self.metrics.timer('ingest_embed', rows=len(batch['ids']),
+                                        wait_ms=(time.perf_counter() - wait_start) * 1000):
+                    try:
+                        embeddings = drop_failed(batch, self._embed(batch['documents']))
+                    except Exception as e:
+                        error = e
+            if not self._put(write_queue, (batch, embeddings, error)):
+                return
+            wait_start = time.perf_counter()
+        self._put(write_queue, _DONE)
+
+    def _embed(self, documents):
+        """计算文档向量（相同文本只嵌入一次）"""
+        return self.embedder.embed(documents)
+
+    def _write(self, batch, embeddings):
+        """
+        写入向量库（单线程调用）；使用 upsert，断点续传和增量同步重复写入同一 id 时覆盖
+
+        Returns:
+            Exception: 失败时返回异常，成功返回 None
+        """
+        if not batch['ids']:
+            return None
+        try:
+            self.collection.upsert(
+                ids=batch['ids'],
+                embeddings=embeddings,
+                documents=batch['documents'],
+                metadatas=batch['metadatas']
+            )
+            return None
+        except Exception as e:
+            return e
+
+
+def report_path_for(collection_name, report_dir=DEFAULT_REPORT_DIR):
+    """本次运行的报告路径：{report_dir}/{集合名}-{时间}.json"""
+    return Path(report_dir) / f"{collection_name}-{datetime.now():%Y%m%d-%H%M%S}.json"
+
+
+def write_report(report, path):
+    """
+    保存运行报告（JSON，先写临时文件再替换）
+
+    Args:
+        report: IngestPipeline.report 的返回值
+        path: 保存路径
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def print_report(report):
+    """打印各阶段耗时汇总"""
+    print(f"{'阶段':<14}{'次数':>8}{'条数':>10}{'平均ms':>10}{'p50':>10}{'p95':>10}{'最大':>10}{'合计秒':>10}")
+    for name, summary in report['stages'].items():
+        if not summary['count']:
+            continue
+        print(f"{name:<14}{summary['count']:>8,}{summary['rows']:>10,}{summary['mean']:>10.1f}"
+              f"{summary['p50']:>10.1f}{summary['p95']:>10.1f}{summary['max']:>10.1f}{summary['total'] / 1000:>10.2f}")
+    busy = report['busy_seconds']
+    print(f"忙碌时间: 读取 {busy['read']:.2f}s / 嵌入 {busy['embed']:.2f}s / 写入 {busy['write']:.2f}s，"
+          f"瓶颈: {report['bottleneck'] or '-'}")
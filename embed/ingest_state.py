@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+向量库导入状态
+用一个本地 SQLite 文件记录某个集合中每条物项对应的源数据行哈希，以及全量导入的断点，
+用于增量同步（只处理新增/修改/删除的行）和中断后继续导入
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+
+
+DEFAULT_STATE_DIR = "data/ingest_state"
+
+
+def state_path_for(collection_name, state_dir=DEFAULT_STATE_DIR):
+    """集合对应的状态文件路径"""
+    return Path(state_dir) / f"{collection_name}.sqlite3"
+
+
+class IngestState:
+    """导入状态（SQLite，WAL 模式）"""
+
+    def __init__(self, path):
+        """
+        打开（不存在时创建）状态文件
+
+        Args:
+            path: 状态文件路径
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS rows (id INTEGER PRIMARY KEY, row_hash TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def iter_rows(self, batch_size=10000):
+        """
+        按 id 升序遍历已导入的 (id, 行哈希)；使用独立的只读连接，遍历期间其他线程可以继续写入
+
+        Yields:
+            tuple: (id, 行哈希)
+        """
+        conn = self._connect()
+        try:
+            last_id = None
+            while True:
+                if last_id is None:
+                    rows = conn.execute("SELECT id, row_hash FROM rows ORDER BY id LIMIT ?",
+                                        (batch_size,)).fetchall()
+                else:
+                    rows = conn.execute("SELECT id, row_hash FROM rows WHERE id > ? ORDER BY id LIMIT ?",
+                                        (last_id, batch_size)).fetchall()
+                if not rows:
+                    return
+                yield from rows
+                last_id = rows[-1][0]
+        finally:
+            conn.close()
+
+    def record(self, row_hashes):
+        """
+        记录已写入向量库的行（一个事务）
+
+        Args:
+            row_hashes: [(id, 行哈希), ...]
+        """
+        if not row_hashes:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO rows (id, row_hash) VALUES (?, ?)", row_hashes)
+
+    def remove(self, ids):
+        """删除已从向量库删除的行"""
+        if not ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM rows WHERE id = ?", [(row_id,) for row_id in ids])
+
+    def get(self, key, default=None):
+        """读取元数据"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set(self, key, value):
+        """写入元数据（value 为 None 时删除）"""
+        with self._lock, self._conn:
+            if value is None:
+                self._conn.execute("DELETE FROM meta WHERE key = ?", (key,))
+            else:
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def clear(self):
+        """清空状态（重新全量导入前调用）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM rows")
+            self._conn.execute("DELETE FROM meta")
+
+    def close(self):
+        """关闭状态文件"""
+        with self._lock:
+            self._conn.close()
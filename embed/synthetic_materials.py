@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+合成物项数据生成脚本
+生成与 hdl_material_pure 结构相同的合成数据（SQLite 或 CSV），用于在没有生产库的环境中压测导入流水线。
+分类为三级编码（01 / 0101 / 010101），物项名称在各小类内按幂律分布重复，
+名称池大小由 distinct_ratio 控制，少量行的名称为空（用于覆盖跳过逻辑）。
+
+用法:
+    python -m embed.synthetic_materials <条数> <输出文件(.sqlite3/.db/.csv)> [--seed 随机种子]
+例如:
+    python -m embed.synthetic_materials 1000000 data/synthetic_materials.sqlite3
+"""
+
+import sys
+import os
+import csv
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+from tqdm import tqdm
+
+
+# 配置
+WRITE_BATCH_SIZE = 50000
+DISTINCT_RATIO = 0.3     # 各小类名称池大小 = 总行数 × 该比例 / 小类数（按幂律抽取，实际出现的不同名称更少）
+EMPTY_NAME_RATIO = 0.001
+COLUMNS = ('id', 'material_name', 'big_class_name', 'middle_class_name', 'small_class_name', 'small_class_code')
+
+BIG_CLASSES = ("泵", "阀门", "管道", "电缆", "仪表", "电机", "变压器", "开关柜", "换热器", "压缩机",
+               "风机", "轴承", "密封件", "紧固件", "焊材", "涂料", "钢材", "保温材料", "过滤器", "容器")
+MIDDLE_PREFIXES = ("离心", "往复", "高压", "低压", "不锈钢", "碳钢", "防爆", "耐腐蚀")
+SMALL_PREFIXES = ("给水", "循环", "屏蔽", "立式", "卧式", "法兰", "螺纹", "焊接", "耐高温", "通用")
+SPEC_PREFIXES = ("DN", "PN", "Φ", "M", "型号", "规格")
+
+
+def build_categories():
+    """
+    生成三级分类
+
+    Returns:
+        list: [(大类名称, 中类名称, 小类名称, 小类编码), ...]
+    """
+    categories = []
+    for i, big in enumerate(BIG_CLASSES, 1):
+        for j, middle_prefix in enumerate(MIDDLE_PREFIXES, 1):
+            middle = middle_prefix + big
+            for k, small_prefix in enumerate(SMALL_PREFIXES, 1):
+                categories.append((big, middle, small_prefix + middle, f"{i:02d}{j:02d}{k:02d}"))
+    return categories
+
+
+def generate_materials(count, seed=0, distinct_ratio=DISTINCT_RATIO, batch_size=WRITE_BATCH_SIZE):
+    """
+    按批生成合成物项（id 从 1 开始连续递增）
+
+    Args:
+        count: 总行数
+        seed: 随机种子（相同参数生成的数据相同）
+        distinct_ratio: 名称池大小占总行数的比例
+        batch_size: 每批行数
+
+    Yields:
+        list: [(id, material_name, big_class_name, middle_class_name, small_class_name, small_class_code), ...]
+    """
+    rng = np.random.default_rng(seed)
+    categories = build_categories()
+    # 每个小类的名称池大小；池内下标按幂律抽取，靠前的名称重复得多
+    pool_size = max(1, int(count * distinct_ratio / len(categories)))
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        category_ids = rng.integers(0, len(categories), size)
+        name_ids = np.minimum(rng.zipf(1.3, size) - 1, pool_size - 1)
+        empty = rng.random(size) < EMPTY_NAME_RATIO
+        rows = []
+        for offset in range(size):
+            big, middle, small, code = categories[category_ids[offset]]
+            name_id = int(name_ids[offset])
+            name = None if empty[offset] else f"{small}{SPEC_PREFIXES[name_id % len(SPEC_PREFIXES)]}{name_id}"
+            rows.append((start + offset + 1, name, big, middle, small, code))
+        yield rows
+
+
+def write_sqlite(path, count, seed=0, distinct_ratio=DISTINCT_RATIO):
+    """
+    生成 SQLite 数据库（表名 hdl_material_pure，覆盖已有文件）
+
+    Args:
+        path: 输出文件
+        count: 总行数
+        seed: 随机种子
+        distinct_ratio: 名称池大小占总行数的比例
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(str(path))
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("""
+            CREATE TABLE hdl_material_pure (
+                id INTEGER PRIMARY KEY,
+                material_name TEXT,
+                big_class_name TEXT,
+                middle_class_name TEXT,
+                small_class_name TEXT,
+                small_class_code TEXT
+            )
+        """)
+        with tqdm(total=count, desc="生成数据", unit="条") as pbar:
+            for rows in generate_materials(count, seed, distinct_ratio):
+                with conn:
+                    conn.executemany(f"INSERT INTO hdl_material_pure VALUES ({', '.join(['?'] * len(COLUMNS))})",
+                                     rows)
+                pbar.update(len(rows))
+        conn.execute("CREATE INDEX idx_material_small_class_code ON hdl_material_pure (small_class_code)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_csv(path, count, seed=0, distinct_ratio=DISTINCT_RATIO):
+    """
+    生成 CSV（UTF-8，带表头，空名称写为空字符串）
+
+    Args:
+        path: 输出文件
+        count: 总行数
+        seed: 随机种子
+        distinct_ratio: 名称池大小占总行数的比例
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        with tqdm(total=count, desc="生成数据", unit="条") as pbar:
+            for rows in generate_materials(count, seed, distinct_ratio):
+                writer.writerows(rows)
+                pbar.update(len(rows))
+
+
+def main():
+    """主函数"""
+    argv = sys.argv[1:]
+    seed = 0
+    if "--seed" in argv:
+        position = argv.index("--seed")
+        seed = int(argv[position + 1])
+        del argv[position:position + 2]
+    args = [arg for arg in argv if not arg.startswith("--")]
+    if len(args) < 2:
+        print(__doc__)
+        return
+    count, output_path = int(args[0]), args[1]
+
+    start_time = time.time()
+    if output_path.lower().endswith(".csv"):
+        write_csv(output_path, count, seed)
+    else:
+        write_sqlite(output_path, count, seed)
+    size_mb = os.path.getsize(output_path) / 1024 / 1024
+    print(f"✓ 已生成 {count:,} 条: {output_path}（{size_mb:.1f} MB，耗时 {time.time() - start_time:.2f} 秒）")
+
+
+if __name__ == "__main__":
+    main()
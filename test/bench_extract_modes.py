@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文档提取基准：完整提取 vs 快速预览（元数据 + 开头几页）
+在当前进程中直接调用 extract_text，不经过进程池和缓存，只比较解析本身的耗时
+
+用法:
+    python test/bench_extract_modes.py [样例目录] [完整提取字符预算]
+"""
+
+import sys
+import os
+import glob
+import time
+import warnings
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.extractor import extract_text, SUPPORTED_EXTENSIONS, MODE_FULL, MODE_PREVIEW
+
+
+def best_of(func, repeat=3):
+    """多次运行取最短耗时（毫秒）"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best, result
+
+
+def main():
+    sample_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "测试")
+    max_chars = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    preview_chars = 3000
+    preview_pages = 2
+
+    files = sorted(f for f in glob.glob(os.path.join(sample_dir, "*"))
+                   if os.path.splitext(f)[1].lower() in SUPPORTED_EXTENSIONS)
+    if not files:
+        print(f"样例目录中没有可提取的文件: {sample_dir}")
+        return
+
+    warnings.simplefilter("ignore")
+    totals = {}
+    print("=" * 78)
+    print(f"{'文件':<36}{'完整(ms)':>10}{'预览(ms)':>10}{'完整字符':>10}{'预览字符':>10}")
+    for file_path in files:
+        full_ms, full = best_of(lambda: extract_text(file_path, max_chars, MODE_FULL))
+        preview_ms, preview = best_of(lambda: extract_text(file_path, preview_chars, MODE_PREVIEW, preview_pages))
+        ext = os.path.splitext(file_path)[1].lower()
+        total = totals.setdefault(ext, [0, 0.0, 0.0, 0])
+        total[0] += 1
+        total[1] += full_ms
+        total[2] += preview_ms
+        total[3] += sum(1 for field in ('title', 'subject', 'keywords') if preview.get(field)) + bool(preview['headings'])
+        name = os.path.basename(file_path)
+        name = name if len(name) <= 32 else name[:15] + "…" + name[-16:]
+        print(f"{name:<36}{full_ms:>10.1f}{preview_ms:>10.1f}{len(full['text']):>10}{len(preview['text']):>10}")
+
+    print("-" * 78)
+    for ext, (count, full_ms, preview_ms, signals) in sorted(totals.items()):
+        print(f"{ext:<6} {count:>3} 个文件  完整 {full_ms / count:8.1f} ms/个  预览 {preview_ms / count:8.1f} ms/个  "
+              f"加速 {full_ms / max(preview_ms, 1e-6):5.1f}x  元数据/标题信号 {signals} 项")
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
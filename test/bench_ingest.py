@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+导入流水线压测：从合成的 hdl_material_pure（SQLite）读取，嵌入服务用固定延迟模拟，
+输出各阶段耗时汇总并保存 JSON 运行报告
+
+用法:
+    python test/bench_ingest.py [行数] [嵌入线程数] [--chroma]
+    --chroma 时写入临时的 Chroma 集合，否则写入内存
+"""
+
+import sys
+import os
+import time
+import hashlib
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from embed.ingest import IngestPipeline, SQLiteMaterialSource, print_report, report_path_for, write_report
+from embed.synthetic_materials import write_sqlite
+
+
+DIMENSION = 64
+BASE_LATENCY = 0.005      # 模拟每次嵌入请求的固定开销（秒）
+PER_TEXT_LATENCY = 0.00005
+
+
+def simulated_embedding(texts):
+    """按文本的 MD5 生成确定的向量（不同进程结果相同），耗时随请求大小增长"""
+    time.sleep(BASE_LATENCY + PER_TEXT_LATENCY * len(texts))
+    vectors = np.zeros((len(texts), DIMENSION), dtype=np.float32)
+    for i, text in enumerate(texts):
+        vectors[i, int(hashlib.md5(text.encode('utf-8')).hexdigest(), 16) % DIMENSION] = 1.0
+    return vectors.tolist()
+
+
+class MemoryCollection:
+    """只保存向量的内存集合"""
+
+    def __init__(self):
+        self.records = {}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.records.update(zip(ids, embeddings))
+
+    def get(self, limit, offset, include):
+        return {'ids': list(self.records)[offset:offset + limit]}
+
+    def delete(self, ids):
+        for record_id in ids:
+            self.records.pop(record_id, None)
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    rows = int(args[0]) if args else 100000
+    workers = int(args[1]) if len(args) > 1 else 4
+
+    data_path = os.path.join("data", "bench", f"synthetic_materials_{rows}.sqlite3")
+    if not os.path.exists(data_path):
+        write_sqlite(data_path, rows)
+
+    if "--chroma" in sys.argv[1:]:
+        import chromadb
+        client = chromadb.PersistentClient(path=tempfile.mkdtemp(prefix="bench_ingest_"))
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+    else:
+        collection = MemoryCollection()
+
+    pipeline = IngestPipeline(collection, simulated_embedding, lambda m: m['material_name'],
+                              source=SQLiteMaterialSource(data_path), embed_workers=workers)
+    stats = pipeline.run(total=rows)
+    report = pipeline.report(stats)
+    report['params'].update(rows=rows, collection=type(collection).__name__)
+    report_path = report_path_for("bench")
+    write_report(report, report_path)
+
+    print("=" * 60)
+    print(f"行数: {rows:,}  嵌入线程: {workers}  写入: {stats['written']:,}  跳过: {stats['skipped']:,}")
+    print(f"嵌入文本: {stats['embedded']:,}（去重省去 {stats['deduplicated']:,}）  "
+          f"请求: {stats['embed_calls']:,}  最终分块: {pipeline.chunker.size}")
+    print(f"耗时: {stats['elapsed']:.2f} 秒  速度: {stats['written'] / stats['elapsed']:.0f} 条/秒")
+    print_report(report)
+    print(f"报告: {report_path}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+向量检索模式基准：material_categories / material_categories_b / 两个集合集成检索 / 两阶段检索
+以文件数据库（data/files.sqlite3）中已分类的文件作为标注集，比较 top-1 准确率和每个文件的检索耗时
+
+用法:
+    python test/bench_retrieval_modes.py
+"""
+
+import sys
+import os
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.classifier import Classifier
+from core.file_manager import FileManager
+
+
+MODES = [
+    # (名称, retrieval_mode, collection_name)
+    ("material_categories", "flat", "material_categories"),
+    ("material_categories_b", "flat", "material_categories_b"),
+    ("ensemble(a+b)", "ensemble", "material_categories"),
+    ("two_stage(a)", "two_stage", "material_categories"),
+]
+
+
+def configure(classifier, mode, collection_name):
+    """切换检索模式，并重置懒加载的集合（集成检索的线程池随集合一起重建）"""
+    classifier.retrieval_mode = mode
+    classifier.collection_name = collection_name
+    classifier.category_collection_name = collection_name + "_category"
+    classifier.vector_collection = None
+    classifier.category_collection = None
+    classifier.ensemble_collections = None
+    if classifier._query_executor is not None:
+        classifier._query_executor.shutdown(wait=True)
+        classifier._query_executor = None
+
+
+def check_available(classifier, mode):
+    """
+    检查当前模式需要的集合是否都存在（检索方法会吞掉异常返回空结果，需要单独检查）
+
+    Returns:
+        str: 不可用的原因，可用时返回 None
+    """
+    try:
+        classifier._get_vector_collection()
+    except Exception as e:
+        return str(e)
+    if mode == "ensemble":
+        collections = classifier._get_ensemble_collections()
+        if len(collections) < len(classifier.ensemble_collection_names):
+            return f"只找到 {len(collections)}/{len(classifier.ensemble_collection_names)} 个集合"
+    if mode == "two_stage" and classifier._get_category_collection() is None:
+        return f"分类级集合 {classifier.category_collection_name} 不存在"
+    return None
+
+
+def main():
+    records = [r for r in FileManager.load_records() if r.get('category') and r['category'] != "其他/未分类"]
+    if not records:
+        print("没有可用的标注数据（文件数据库为空）")
+        return
+
+    classifier = Classifier(history_records=[])
+    print("=" * 80)
+    print(f"标注文件数: {len(records)}")
+    print(f"{'模式':<24}{'准确率':>8}{'平均耗时(ms)':>14}{'准确率/毫秒':>14}")
+    print("-" * 80)
+
+    for name, mode, collection_name in MODES:
+        configure(classifier, mode, collection_name)
+        reason = check_available(classifier, mode)
+        if reason is None and not classifier._get_top_score_embedding_results(records[0]['original_path']):
+            # 预热查询（不计入耗时）没有任何结果，通常是集合为空或检索出错
+            reason = "预热查询没有返回结果"
+        if reason is not None:
+            print(f"{name:<24}不可用: {reason}")
+            continue
+
+        correct = 0
+        elapsed = 0.0
+        for record in records:
+            start = time.perf_counter()
+            results = classifier._get_top_score_embedding_results(record['original_path'])
+            elapsed += time.perf_counter() - start
+            if results and results[0]['category_path'] == record['category']:
+                correct += 1
+
+        accuracy = correct / len(records)
+        avg_ms = elapsed * 1000 / len(records)
+        print(f"{name:<24}{accuracy:>8.2%}{avg_ms:>14.1f}{accuracy / avg_ms if avg_ms else 0:>14.5f}")
+
+    print("=" * 80)
+    classifier.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+向量索引导出/导入测试（使用模拟的集合；Chroma 往返测试在安装了 chromadb 时运行）
+"""
+
+import sys
+import os
+
+import numpy as np
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embed.artifact import (ArtifactError, VectorArtifact, create_target_collection, export_collection,
+                            import_artifact)
+from embed.ingest_state import IngestState
+
+
+class FakeCollection:
+    """按插入顺序保存记录的集合"""
+
+    def __init__(self, metadata=None):
+        self.metadata = metadata
+        self.ids, self.embeddings, self.documents, self.metadatas = [], [], [], []
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, limit, offset, include):
+        end = offset + limit
+        return {'ids': self.ids[offset:end], 'embeddings': np.asarray(self.embeddings[offset:end]),
+                'documents': self.documents[offset:end], 'metadatas': self.metadatas[offset:end]}
+
+    def upsert(self, ids, embeddings, metadatas, documents=None):
+        self.ids += ids
+        self.embeddings += embeddings
+        self.documents += documents or [None] * len(ids)
+        self.metadatas += metadatas
+
+
+def make_collection(count):
+    collection = FakeCollection({"hnsw:space": "cosine"})
+    rng = np.random.default_rng(0)
+    for i in range(1, count + 1):
+        small = "给水泵" if i % 2 else "屏蔽泵"
+        metadata = {'id': str(i), 'material_name': f"泵{i}", 'big_class_name': "泵",
+                    'middle_class_name': "离心泵", 'small_class_name': small, 'small_class_code': f"01010{i % 2}"}
+        if i == 3:
+            del metadata['material_name']
+        collection.upsert([f"material_{i}"], [rng.random(8, dtype=np.float32).tolist()], [metadata], [f"泵{i}"])
+    return collection
+
+
+def test_export_import_roundtrip_without_embedding(tmp_path):
+    source = make_collection(25)
+    state = IngestState(tmp_path / "source.sqlite3")
+    state.record([(i, f"{i:032x}") for i in range(1, 26)])
+    path = tmp_path / "material.hdlvec"
+    header = export_collection(source, path, build_params={'embedding_model': "bge"}, state=state, batch_size=7)
+    assert header['count'] == 25 and header['dimension'] == 8
+
+    artifact = VectorArtifact(path)
+    artifact.verify()
+    assert artifact.version == header['version'] and artifact.build_params == {'embedding_model': "bge"}
+    assert artifact.header['sections']['vectors']['offset'] % 64 == 0
+    assert np.array_equal(artifact.vectors, np.asarray(source.embeddings, dtype=np.float32))
+    # 分类字段去重后只存两种组合
+    assert len(artifact.table()['categories']) == 2
+
+    target = FakeCollection()
+    target_state = IngestState(tmp_path / "target.sqlite3")
+    assert import_artifact(artifact, target, state=target_state, batch_size=10) == 25
+    assert target.ids == source.ids and target.documents == source.documents
+    assert target.metadatas == source.metadatas
+    assert np.allclose(target.embeddings, source.embeddings)
+    assert dict(target_state.iter_rows()) == dict(state.iter_rows())
+    assert target_state.get('checkpoint') == "25"
+    state.close()
+    target_state.close()
+
+
+def test_corrupted_artifact_is_rejected(tmp_path):
+    path = tmp_path / "material.hdlvec"
+    export_collection(make_collection(5), path)
+    artifact = VectorArtifact(path)
+    data = bytearray(path.read_bytes())
+    data[artifact.header['sections']['vectors']['offset']] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ArtifactError):
+        VectorArtifact(path).verify()
+
+    path.write_bytes(bytes(data[:-4]))
+    with pytest.raises(ArtifactError):
+        VectorArtifact(path)
+
+
+def test_imported_collection_opens_like_classifier(tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    from llm.model import OpenAIOfficialEmbeddingFunction
+
+    path = tmp_path / "material.hdlvec"
+    source = make_collection(5)
+    export_collection(source, path)
+    artifact = VectorArtifact(path)
+    artifact.verify()
+
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    embedding_function = OpenAIOfficialEmbeddingFunction(api_key="xxxxxxxx", model="bge")
+    collection = create_target_collection(client, "material_collection", embedding_function,
+                                          metadata=artifact.header.get('collection_metadata'))
+    assert import_artifact(artifact, collection) == 5
+
+    # 与 Classifier._get_vector_collection 相同的打开方式（新客户端，带项目嵌入函数）
+    reopened = chromadb.PersistentClient(path=str(tmp_path / "chroma")).get_collection(
+        name="material_collection",
+        embedding_function=OpenAIOfficialEmbeddingFunction(api_key="xxxxxxxx", model="bge")
+    )
+    assert reopened.count() == 5
+    result = reopened.query(query_embeddings=[source.embeddings[0]], n_results=1)
+    assert result['ids'][0] == ["material_1"]
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分类树测试
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zlib
+
+import pytest
+
+from core.category_tree import CategoryTree, load_snapshot, save_snapshot
+from core.classifier import Classifier
+from core.pipeline import Pipeline, PipelineNode
+
+ROWS = [
+    {'category_code': code, 'cate_name': name, 'code_length': len(code)}
+    for code, name in [
+        ("01", "泵"), ("0101", "离心泵"), ("010101", "给水泵"), ("010102", "屏蔽泵"),
+        ("0102", "往复泵"), ("02", "阀门"), ("0201", "闸阀"),
+        ("0399", "孤立的二级分类"), ("039901", "孤立的三级分类"),
+    ]
+]
+
+
+def test_index_lookup_and_precomputed_choices():
+    tree = CategoryTree(ROWS)
+    assert len(tree) == 7 and tree.level_counts() == {'level1': 2, 'level2': 3, 'level3': 2}
+    assert tree.get("0399") is None and tree.get("039901") is None
+
+    node = tree.get("010102")
+    assert node.parent is tree.get("0101")
+    assert node.path_names == ["泵", "离心泵", "屏蔽泵"]
+    assert node.path == os.sep.join(["泵", "离心泵", "屏蔽泵"])
+
+    assert tree.children_of() == [{'code': "01", 'name': "泵"}, {'code': "02", 'name': "阀门"}]
+    assert tree.children_of("0101") is tree.get("0101").child_choices
+    assert tree.options_text("0101") == "- 给水泵\n- 屏蔽泵"
+    assert tree.children_of("missing") == [] and tree.options_text("missing") == ""
+
+
+def test_to_dict_keeps_nested_shape():
+    tree = CategoryTree(ROWS)
+    data = tree.to_dict()
+    assert list(data) == ["01", "02"]
+    assert data["01"]["children"]["0101"]["children"]["010101"] == {
+        'code': "010101", 'name': "给水泵", 'level': 3, 'children': {}
+    }
+    assert not CategoryTree() and CategoryTree().to_dict() == {}
+
+
+def test_snapshot_roundtrip(tmp_path):
+    path = tmp_path / "category_snapshot.json"
+    assert load_snapshot(path) is None
+    save_snapshot(ROWS, "9-1a2b3c4d", path)
+    categories, version = load_snapshot(path)
+    assert version == "9-1a2b3c4d" and categories == ROWS
+    assert CategoryTree(categories, version=version).to_dict() == CategoryTree(ROWS).to_dict()
+
+    path.write_text("{broken", encoding="utf-8")
+    assert load_snapshot(path) is None
+
+
+class FakeCategoryDB:
+    """模拟 hdl_category 表：版本查询返回记录数和CRC32异或值，记录执行过的查询"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def connection(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.db)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.db.queries.append("version" if "BIT_XOR" in sql else "categories")
+
+    def fetchone(self):
+        checksum = 0
+        for row in self.db.rows:
+            checksum ^= zlib.crc32(f"{row['category_code']}|{row['cate_name']}".encode('utf-8'))
+        return {'total': len(self.db.rows), 'checksum': checksum}
+
+    def fetchall(self):
+        return [dict(row) for row in self.db.rows]
+
+
+@pytest.fixture
+def classifier(monkeypatch, tmp_path):
+    # 不加载分类、不连接数据库，分类表由 FakeCategoryDB 模拟
+    monkeypatch.setattr(Classifier, "_load_categories", lambda self: None)
+    monkeypatch.setattr(Classifier, "_load_keyphrase_model", lambda self, *args, **kwargs: None)
+    instance = Classifier(history_records=[])
+    instance.category_snapshot_path = tmp_path / "category_snapshot.json"
+    instance.db = FakeCategoryDB(ROWS)
+    monkeypatch.setattr(instance, "_get_connection", instance.db.connection)
+    yield instance
+    instance.close()
+
+
+def test_refresh_only_rebuilds_when_version_changes(classifier):
+    classifier._load_categories_from_db()
+    held = classifier.category_tree
+    assert len(held) == 7 and load_snapshot(classifier.category_snapshot_path)[1] == held.version
+
+    # 版本不变：只查询版本，不重新加载
+    classifier.db.queries.clear()
+    assert not classifier._refresh_categories_if_changed()
+    assert classifier.db.queries == ["version"]
+    assert classifier.category_tree is held
+
+    # 版本变化：换成新分类树，已取得的旧分类树保持不变
+    classifier.db.rows = [dict(row, cate_name="高压给水泵") if row['category_code'] == "010101" else row
+                          for row in ROWS]
+    assert classifier._refresh_categories_if_changed()
+    assert classifier.category_tree is not held
+    assert classifier.category_tree.get("010101").name == "高压给水泵"
+    assert held.get("010101").name == "给水泵"
+    assert held.to_dict()["01"]["children"]["0101"]["children"]["010101"]["name"] == "给水泵"
+    assert classifier.taxonomy_version != held.version
+    assert load_snapshot(classifier.category_snapshot_path)[1] == classifier.taxonomy_version
+
+
+def test_batch_results_keep_the_starting_taxonomy_version(classifier):
+    classifier._load_categories_from_db()
+    start_tree = classifier.category_tree
+
+    def classify(ctx):
+        # 分类过程中分类表变化，后台刷新替换了分类树
+        classifier.db.rows = [row for row in ROWS if row['category_code'] != "0201"]
+        classifier._refresh_categories_if_changed()
+        return {'category_path': ctx['category_tree'].get("010101").path, 'reason': None}
+
+    classifier.fulltext_pipeline = Pipeline([PipelineNode('result', classify)])
+    results = classifier.classify_files_with_fulltext_llm(["/x/给水泵.pdf"], category_tree=start_tree)
+    assert classifier.category_tree is not start_tree
+    assert results["/x/给水泵.pdf"]['taxonomy_version'] == start_tree.version
+    assert results["/x/给水泵.pdf"]['category_path'] == os.sep.join(["泵", "离心泵", "给水泵"])
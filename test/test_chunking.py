@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文档分块与片段选择测试
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from core.chunking import split_text, score_chunks, select_top_chunks, estimate_tokens
+
+
+def test_split_text_respects_length_and_sentence_boundaries():
+    text = "泵的设计压力为10MPa。流量为100m3/h！\n材料为不锈钢. Motor is canned. " + "长" * 250
+    chunks = split_text(text, chunk_chars=60, overlap_chars=20)
+    assert chunks[0].startswith("泵的设计压力为10MPa。")
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    # 没有标点的长句被硬切，内容不丢失
+    assert sum(chunk.count("长") for chunk in chunks) >= 250
+    assert split_text("   ") == []
+
+
+def test_select_top_chunks_uses_relevance_and_token_budget():
+    chunks = ["给水泵" * 10, "闸阀" * 10, "电机" * 10, "给水泵叶轮" * 10]
+    chunk_embeddings = np.array([[1, 0], [0, 1], [0.5, 0.5], [0.9, 0.1]])
+    scores = score_chunks(chunk_embeddings, np.array([[1, 0], [0, 1]]), candidate_weights=[0.9, 0.3])
+    assert int(np.argmax(scores)) == 0
+
+    selected = select_top_chunks(chunks, scores, token_budget=80, max_chunks=3)
+    # 按文档顺序返回，且总token不超过预算
+    assert selected == sorted(selected)
+    assert 0 in selected
+    assert sum(estimate_tokens(chunks[i]) for i in selected) <= 80
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+向量检索测试：渐进扩大k的结果与一次检索 n_results 条相同
+（使用模拟的集合和嵌入函数，不需要数据库和向量库）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from core.classifier import Classifier
+from core.score_pipeline import distances_to_scores
+
+
+class FakeCollection:
+    """每个查询向量 [i] 对应一组预先给定的 (距离, 元数据)，按距离升序返回前 n_results 条"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    def query(self, query_embeddings, n_results, include, where=None):
+        self.calls.append((len(query_embeddings), n_results, where))
+        metadatas_batch, distances_batch = [], []
+        for embedding in query_embeddings:
+            hits = sorted(self.rows[int(embedding[0])], key=lambda hit: hit[0])
+            if where is not None:
+                codes = set(where['small_class_code']['$in'])
+                hits = [hit for hit in hits if hit[1].get('small_class_code') in codes]
+            hits = hits[:n_results]
+            distances_batch.append([distance for distance, _ in hits])
+            metadatas_batch.append([metadata for _, metadata in hits])
+        return {'metadatas': metadatas_batch, 'distances': distances_batch}
+
+
+def make_rows(rng, n_queries, width, n_categories):
+    rows = []
+    for _ in range(n_queries):
+        # 距离量化制造同分；大部分结果相似度 ≥0.5（距离 ≤1.0），门槛落在前20条之外
+        distances = np.round(rng.uniform(0.0, 1.2, width), 2)
+        rows.append([(float(d), {'big_class_name': "泵", 'middle_class_name': f"中类{c % 4}",
+                                 'small_class_name': f"小类{c}", 'small_class_code': f"{c:06d}"})
+                     for d, c in zip(distances, rng.integers(0, n_categories, width))])
+    return rows
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    # 不连接数据库、不加载语料统计
+    monkeypatch.setattr(Classifier, "_load_categories", lambda self: None)
+    monkeypatch.setattr(Classifier, "_load_keyphrase_model", lambda self, *args, **kwargs: None)
+    instance = Classifier(history_records=[])
+    instance.keyphrase_model = None
+    instance.embedding_function = lambda texts: [[float(text)] for text in texts]
+    yield instance
+    instance.close()
+
+
+def top_results(classifier, n_queries, **kwargs):
+    results = classifier._get_top_score_embedding_results_batch(
+        [f"/x/{i}.pdf" for i in range(n_queries)], **kwargs)
+    return [[(r['category_path'], r['similarity_score']) for r in row] for row in results]
+
+
+def test_progressive_top_k_matches_single_query(classifier):
+    rng = np.random.default_rng(5)
+    rows = make_rows(rng, 30, 150, 40)
+    classifier.vector_collection = FakeCollection(rows)
+    progressive = top_results(classifier, len(rows), n_results=100, initial_k=20)
+    single = top_results(classifier, len(rows), n_results=100, initial_k=100)
+    assert progressive == single
+    # 门槛在前20条之外时会扩大k，扩大后保留的结果比只看前20条多
+    assert sum(len(row) for row in progressive) > 2 * len(rows)
+
+
+def test_progressive_top_k_stops_when_tail_drops_below_threshold(classifier):
+    rows = [[(0.1 * i, {'big_class_name': "泵", 'middle_class_name': "离心泵",
+                        'small_class_name': f"小类{i}", 'small_class_code': f"{i:06d}"}) for i in range(100)]]
+    classifier.vector_collection = FakeCollection(rows)
+    results = top_results(classifier, 1, n_results=100, initial_k=20)
+    # 相似度 ≥0.5 的只有前11条，第一轮窗口已经包含全部，不再扩大k
+    assert classifier.vector_collection.calls == [(1, 20, None)]
+    assert results == top_results(classifier, 1, n_results=100, initial_k=100)
+
+
+class FakeCategoryCollection:
+    """分类级集合：查询向量 [i] 的候选小类为 candidates[i]"""
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+        self.calls = []
+
+    def query(self, query_embeddings, n_results, include):
+        self.calls.append((len(query_embeddings), n_results))
+        return {'metadatas': [[{'small_class_code': code} for code in self.candidates[int(e[0])][:n_results]]
+                              for e in query_embeddings]}
+
+
+class MissingCollectionClient:
+    def get_collection(self, name, **kwargs):
+        raise ValueError(f"Collection {name} does not exist")
+
+
+def per_query_expected(rows, candidates, k):
+    """每个查询单独在自己的候选小类内检索（第二阶段的参考结果）"""
+    expected = []
+    for row, codes in zip(rows, candidates):
+        hits = sorted((hit for hit in row if hit[1]['small_class_code'] in codes), key=lambda hit: hit[0])
+        expected.append([metadata['small_class_code'] for _, metadata in hits[:k]])
+    return expected
+
+
+def make_clustered_rows(rng, n_queries, n_categories, per_category):
+    """同一小类的物项距离相近（真实向量空间中物项按小类聚集）"""
+    rows = []
+    for _ in range(n_queries):
+        bases = rng.uniform(0.0, 1.2, n_categories)
+        rows.append([(float(np.round(bases[c] + rng.uniform(0, 0.05), 3)),
+                      {'big_class_name': "泵", 'middle_class_name': f"中类{c % 4}",
+                       'small_class_name': f"小类{c}", 'small_class_code': f"{c:06d}"})
+                     for c in range(n_categories) for _ in range(per_category)])
+    return rows
+
+
+def test_two_stage_selects_candidates_and_filters_in_one_query(classifier):
+    rng = np.random.default_rng(11)
+    rows = make_clustered_rows(rng, 12, 40, 5)
+    # 候选小类取每个查询最近的3个小类（与分类级集合的检索结果一致）
+    candidates = []
+    for row in rows:
+        codes = []
+        for _, metadata in sorted(row, key=lambda hit: hit[0]):
+            if metadata['small_class_code'] not in codes:
+                codes.append(metadata['small_class_code'])
+        candidates.append(codes[:3])
+    classifier.vector_collection = FakeCollection(rows)
+    classifier.category_collection = FakeCategoryCollection(candidates)
+    classifier.retrieval_mode = "two_stage"
+    classifier.category_top_n = 3
+
+    embeddings = [[float(i)] for i in range(len(rows))]
+    assert classifier._select_candidate_categories(embeddings) == candidates
+    assert classifier.category_collection.calls == [(len(rows), 3)]
+
+    metadatas_batch, distances_batch, _ = classifier._query_candidates(embeddings, 5, candidates)
+    assert [[m['small_class_code'] for m in metadatas] for metadatas in metadatas_batch] == \
+        per_query_expected(rows, candidates, 5)
+    assert all(distances == sorted(distances) for distances in distances_batch)
+    # 整批只检索一次，where 为所有候选小类的并集（被挤出的查询才单独检索）
+    n_queries, _, where = classifier.vector_collection.calls[0]
+    assert n_queries == len(rows)
+    assert set(where['small_class_code']['$in']) == {code for codes in candidates for code in codes}
+    assert len(classifier.vector_collection.calls) <= 1 + len(rows) // 4
+
+    # 候选小类之外的物项更近时（被其他查询的候选小类挤出），结果仍与逐个检索相同
+    crowded_rows = make_rows(rng, 12, 200, 40)
+    classifier.vector_collection = FakeCollection(crowded_rows)
+    metadatas_batch, _, _ = classifier._query_candidates(embeddings, 5, candidates)
+    assert [[m['small_class_code'] for m in metadatas] for metadatas in metadatas_batch] == \
+        per_query_expected(crowded_rows, candidates, 5)
+
+    # 结果只来自各自的候选小类
+    classifier.vector_collection = FakeCollection(rows)
+    for result, codes in zip(top_results(classifier, len(rows), n_results=100, initial_k=20), candidates):
+        assert result and all(path.rsplit(os.sep, 1)[-1] in {f"小类{int(c)}" for c in codes} for path, _ in result)
+
+
+def test_missing_category_collection_falls_back_for_one_call(classifier):
+    rng = np.random.default_rng(2)
+    rows = make_rows(rng, 5, 60, 20)
+    classifier.vector_collection = FakeCollection(rows)
+    classifier.chroma_client = MissingCollectionClient()
+    classifier.retrieval_mode = "two_stage"
+    two_stage = top_results(classifier, len(rows), n_results=100, initial_k=20)
+    assert classifier.retrieval_mode == "two_stage"
+
+    classifier.retrieval_mode = "flat"
+    assert two_stage == top_results(classifier, len(rows), n_results=100, initial_k=20)
+
+
+class CollectionClient:
+    def __init__(self, collections):
+        self.collections = collections
+
+    def get_collection(self, name, **kwargs):
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist")
+        return self.collections[name]
+
+
+def hit(distance, n):
+    return (distance, {'big_class_name': "泵", 'middle_class_name': "离心泵",
+                       'small_class_name': f"小类{n}", 'small_class_code': f"{n:06d}"})
+
+
+def test_ensemble_merges_collections_and_retries_missing_ones(classifier):
+    # 查询0：两个集合都没有截断；查询1、2：分别只有一个集合的窗口被截断
+    rows_a = [[hit(0.1, 1), hit(0.4, 2), hit(1.5, 3)],
+              [hit(0.1, 1), hit(0.2, 2), hit(0.3, 3), hit(0.35, 5)],
+              [hit(1.2, 1)]]
+    rows_b = [[hit(0.2, 1), hit(0.3, 4)],
+              [hit(1.6, 4)],
+              [hit(0.1, 4), hit(0.2, 6), hit(0.3, 7), hit(0.4, 8)]]
+    collection_a, collection_b = FakeCollection(rows_a), FakeCollection(rows_b)
+    classifier.vector_collection = collection_a
+    classifier.chroma_client = CollectionClient({})
+    classifier.ensemble_collection_names = [classifier.collection_name, "material_categories_b"]
+    classifier.retrieval_mode = "ensemble"
+
+    # 缺少的集合只在本次跳过，生成后下次检索自动加入
+    assert classifier._get_ensemble_collections() == [collection_a]
+    classifier.chroma_client.collections["material_categories_b"] = collection_b
+    assert classifier._get_ensemble_collections() == [collection_a, collection_b]
+    assert classifier.ensemble_collections == [collection_a, collection_b]
+
+    embeddings = [[float(i)] for i in range(3)]
+    metadatas_batch, distances_batch, truncated = classifier._query_candidates(embeddings, 3)
+    assert distances_batch[0] == [0.1, 0.2, 0.3, 0.4, 1.5]
+    assert [m['small_class_code'] for m in metadatas_batch[0]] == ["000001", "000001", "000004", "000002", "000003"]
+    assert all(distances == sorted(distances) for distances in distances_batch)
+    assert truncated == [False, True, True]
+
+    # 同一分类出现在两个集合中时只保留相似度最高的一条
+    results = top_results(classifier, 1, n_results=3, initial_k=3)[0]
+    paths = [path for path, _ in results]
+    assert len(paths) == len(set(paths))
+    assert dict(results)[os.sep.join(["泵", "离心泵", "小类1"])] == pytest.approx(float(distances_to_scores([0.1])[0]))
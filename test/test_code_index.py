@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+项目编号前缀索引测试
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.classifier import Classifier
+from core.code_index import ProjectCodeIndex
+
+
+def _path(*parts):
+    return os.sep.join(parts)
+
+
+def test_extract_codes():
+    assert ProjectCodeIndex.extract_codes("[非密]JDYYD-021-CG-013补水增压泵采购技术要求.pdf") == ["JDYYD-021-CG-013"]
+    assert ProjectCodeIndex.extract_codes("[非密]QBGCA-CG-052屏蔽泵采购技术要求.pdf") == ["QBGCA-CG-052"]
+    assert ProjectCodeIndex.extract_codes("[非密]高扬程给水泵采购技术要求.pdf") == []
+    assert ProjectCodeIndex.code_prefixes("YFJD2-013-SB9-001") == ["YFJD2-013-SB9", "YFJD2-013", "YFJD2"]
+
+
+def test_strong_prefix_answers_directly():
+    multistage = _path("泵及泵配件", "离心泵", "多级离心泵")
+    index = ProjectCodeIndex(min_support=3, min_confidence=0.8)
+    index.fit([
+        {"file_name": "YFJD2-013-SB9-001给水泵.pdf", "category": multistage},
+        {"file_name": "YFJD2-013-SB6-001B补水泵.pdf", "category": multistage},
+        {"file_name": "YFJD2-013-SB16-001给水泵组.pdf", "category": multistage},
+        {"file_name": "无编号文件.pdf", "category": multistage},
+    ])
+    hint = index.lookup("YFJD2-013-SB7-002凝水泵.pdf")
+    assert hint.strong
+    assert hint.prefix == "YFJD2-013"
+    assert hint.category_path == multistage
+
+
+def test_mixed_prefix_gives_branch_hint():
+    index = ProjectCodeIndex(min_support=3, min_confidence=0.8, hint_confidence=0.6)
+    index.fit([
+        {"file_name": "JDYYD-021-CG-005.pdf", "category": _path("泵及泵配件", "往复泵", "柱塞泵")},
+        {"file_name": "JDYYD-021-CG-007.pdf", "category": _path("泵及泵配件", "离心泵", "其他离心泵")},
+        {"file_name": "JDYYD-021-CG-013.pdf", "category": _path("通用仪器仪表", "试验机", "试验机附件")},
+        {"file_name": "JDYYD-021-CG-014.pdf", "category": "其他/未分类"},
+    ])
+    hint = index.lookup("JDYYD-021-CG-020.pdf")
+    assert not hint.strong
+    assert hint.category_path == "泵及泵配件"
+    assert (hint.count, hint.support) == (2, 3)
+    assert index.lookup("ZZZ-1-001.pdf") is None
+
+
+def test_code_hint_results_are_not_learned(monkeypatch):
+    multistage = _path("泵及泵配件", "离心泵", "多级离心泵")
+    records = [{"file_name": f"YFJD2-013-SB{i}-001给水泵.pdf", "category": multistage} for i in range(3)]
+    # 由前缀直接给出的结果不计入统计
+    index = ProjectCodeIndex(min_support=3, min_confidence=0.8).fit(
+        records[:2] + [dict(records[2], code_hint=True)])
+    assert index.lookup("YFJD2-013-SB7-002凝水泵.pdf") is None
+
+    # 分类器报告哪些文件由前缀直接给出分类
+    monkeypatch.setattr(Classifier, "_load_categories", lambda self: None)
+    monkeypatch.setattr(Classifier, "_load_keyphrase_model", lambda self, *args, **kwargs: None)
+    monkeypatch.setattr(Classifier, "_classify_single_file", lambda self, file_path, tree=None: "其他/未分类")
+    classifier = Classifier(history_records=records)
+    hinted = set()
+    results = classifier.classify_files(["/x/YFJD2-013-SB7-002凝水泵.pdf", "/x/无编号文件.pdf"],
+                                        code_hint_files=hinted)
+    assert results["/x/YFJD2-013-SB7-002凝水泵.pdf"] == multistage
+    assert hinted == {"/x/YFJD2-013-SB7-002凝水泵.pdf"}
+    classifier.close()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据库连接池测试（使用模拟连接，不需要数据库）
+"""
+
+import sys
+import os
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymysql
+import pytest
+
+from config.db_pool import ConnectionPool
+
+
+class FakeConnection:
+    """模拟的 pymysql 连接"""
+
+    def __init__(self, **params):
+        self.params = params
+        self.open = True
+        self.pings = 0
+        self.fail_ping = False
+
+    def ping(self, reconnect=True):
+        self.pings += 1
+        if self.fail_ping:
+            raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def close(self):
+        self.open = False
+
+
+def test_reuses_idle_connections_and_pings_stale_ones():
+    created = []
+    pool = ConnectionPool(max_size=2, ping_interval=0,
+                          connect=lambda **params: created.append(FakeConnection(**params)) or created[-1])
+    with pool.connection() as conn:
+        first = conn._connection
+        assert conn.params['autocommit'] and conn.params['cursorclass'] is pymysql.cursors.DictCursor
+    with pool.connection() as conn:
+        assert conn._connection is first and first.pings == 1
+
+    # ping 失败的连接被关闭并重新创建
+    first.fail_ping = True
+    with pool.connection() as conn:
+        assert conn._connection is not first and not first.open
+    assert len(created) == 2
+
+    # 连接类错误退出时连接被丢弃
+    with pytest.raises(pymysql.err.OperationalError):
+        with pool.connection() as conn:
+            broken = conn._connection
+            raise pymysql.err.OperationalError(2013, "Lost connection")
+    assert not broken.open and pool.idle_count == 0
+    pool.close()
+
+
+def test_enforces_max_size():
+    pool = ConnectionPool(max_size=2, acquire_timeout=0.05, connect=FakeConnection)
+    held = [pool.connection(), pool.connection()]
+    with pytest.raises(TimeoutError):
+        pool.connection()
+
+    # 归还后其他线程可以取得连接
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(pool.connection()))
+    held[0].close()
+    thread.start()
+    thread.join()
+    assert len(acquired) == 1
+    pool.close()
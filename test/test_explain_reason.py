@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+按需生成分类理由测试：分类时不生成理由，查看详情时生成并保存到文件记录
+（使用模拟的大模型，不需要数据库和大模型服务）
+"""
+
+import sys
+import os
+from types import SimpleNamespace
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import core.classifier
+from core.classifier import Classifier
+from core.file_manager import FileManager
+
+
+PUMP = os.sep.join(["泵及泵配件", "离心泵", "给水泵"])
+REASON = "文件名中的“给水泵”属于离心泵中的给水泵"
+
+
+class FakeLLM:
+    """按顺序返回预先给定的回复，记录每次调用的参数"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))],
+                               usage=SimpleNamespace(completion_tokens=len(reply)))
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    # 不连接数据库、不加载语料统计
+    monkeypatch.setattr(Classifier, "_load_categories", lambda self: None)
+    monkeypatch.setattr(Classifier, "_load_keyphrase_model", lambda self, *args, **kwargs: None)
+    instance = Classifier(history_records=[])
+    instance.keyphrase_model = None
+    yield instance
+    instance.close()
+
+
+def use_llm(monkeypatch, *replies):
+    llm = FakeLLM(*replies)
+    monkeypatch.setattr(core.classifier, "sync_llm", llm)
+    return llm
+
+
+def test_reason_is_deferred_then_generated_once(classifier, monkeypatch):
+    llm = use_llm(monkeypatch, '{"category":"%s"}' % PUMP.replace("\\", "\\\\"), REASON)
+    classifier.defer_reason = True
+    result = classifier._classify_with_fulltext_and_llm(
+        "/x/高扬程给水泵采购技术要求.pdf", [{'category_path': PUMP, 'similarity_score': 0.9}])
+    # 分类时只输出分类路径
+    assert result == {'category_path': PUMP, 'reason': None}
+    assert llm.calls[0]['max_tokens'] == 60
+    assert "不要输出理由" in llm.calls[0]['messages'][1]['content']
+
+    # 查看详情时用分类时的上下文生成理由，之后使用缓存
+    assert classifier.explain_classification("/x/高扬程给水泵采购技术要求.pdf") == REASON
+    assert PUMP in llm.calls[1]['messages'][1]['content']
+    assert classifier.explain_classification("/x/高扬程给水泵采购技术要求.pdf") == REASON
+    assert len(llm.calls) == 2
+
+
+def test_explain_record_persists_reason(classifier, monkeypatch, tmp_path):
+    manager = FileManager(data_dir=tmp_path)
+    manager.add_file("/x/高扬程给水泵采购技术要求.pdf", (PUMP, 0.9))
+    assert manager.get_file("/x/高扬程给水泵采购技术要求.pdf").get('reason') is None
+
+    # 生成失败时不保存，下次查看时重新生成
+    llm = use_llm(monkeypatch, RuntimeError("timeout"), REASON)
+    assert classifier.explain_record(manager, "/x/高扬程给水泵采购技术要求.pdf") is None
+    assert manager.get_file("/x/高扬程给水泵采购技术要求.pdf").get('reason') is None
+    assert classifier.explain_record(manager, "/x/高扬程给水泵采购技术要求.pdf") == REASON
+    # 本次运行中没有分类上下文时，以记录中的分类作为唯一候选
+    assert f"1. {PUMP}" in llm.calls[1]['messages'][1]['content']
+
+    record = FileManager(data_dir=tmp_path).get_file("/x/高扬程给水泵采购技术要求.pdf")
+    assert record['reason'] == REASON
+    assert (record['category'], record['similarity_score']) == (PUMP, 0.9)
+
+    # 已保存的理由直接读取，不再调用大模型
+    classifier._reason_cache.clear()
+    assert classifier.explain_record(manager, "/x/高扬程给水泵采购技术要求.pdf") == REASON
+    assert classifier.explain_record(manager, "/x/不存在.pdf") is None
+    assert len(llm.calls) == 2
+    manager.close()
+
+
+def test_double_click_shows_and_saves_reason(classifier, monkeypatch, tmp_path):
+    pytest.importorskip("PyQt5")
+    import ui.main_window as main_window
+
+    manager = FileManager(data_dir=tmp_path)
+    manager.add_file("/x/高扬程给水泵采购技术要求.pdf", PUMP)
+    llm = use_llm(monkeypatch, REASON)
+    shown = []
+    monkeypatch.setattr(main_window.QMessageBox, "information", lambda parent, title, text: shown.append(text))
+    monkeypatch.setattr(main_window.QApplication, "setOverrideCursor", lambda cursor: None)
+    monkeypatch.setattr(main_window.QApplication, "restoreOverrideCursor", lambda: None)
+
+    status_bar = SimpleNamespace(showMessage=lambda message: None)
+    window = SimpleNamespace(
+        file_manager=manager, classifier=classifier, statusBar=lambda: status_bar,
+        file_table=SimpleNamespace(item=lambda row, column: SimpleNamespace(
+            text=lambda: "/x/高扬程给水泵采购技术要求.pdf")))
+    window.show_file_details = lambda file_path: main_window.MainWindow.show_file_details(window, file_path)
+
+    main_window.MainWindow.on_file_double_clicked(window, 0, 1)
+    main_window.MainWindow.on_file_double_clicked(window, 0, 1)
+    assert len(shown) == 2 and all(REASON in text for text in shown)
+    assert manager.get_file("/x/高扬程给水泵采购技术要求.pdf")['reason'] == REASON
+    assert len(llm.calls) == 1
+    manager.close()
+
+
+def test_reason_contexts_keep_only_recent_files(classifier, monkeypatch):
+    classifier.reason_context_limit = 2
+    for i in range(3):
+        classifier._remember_reason_context(f"/x/{i}.pdf", {
+            'file_name': str(i), 'hint_text': "", 'content_text': "正文" * 1000,
+            'categories_text': f"1. {PUMP}\n2. 其他", 'category_path': PUMP})
+    assert list(classifier._reason_contexts) == ["/x/1.pdf", "/x/2.pdf"]
+
+    # 上下文已丢弃的文件以记录中的分类作为唯一候选
+    llm = use_llm(monkeypatch, REASON)
+    assert classifier.explain_classification("/x/0.pdf", PUMP) == REASON
+    assert f"1. {PUMP}\n" in llm.calls[0]['messages'][1]['content']
+    assert "正文" not in llm.calls[0]['messages'][1]['content']
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文档内容提取测试
+"""
+
+import sys
+import os
+import time
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.extractor import DocumentExtractor, TextBudget, extract_text, MODE_PREVIEW
+
+
+def test_text_budget_counts_separators_and_stops():
+    budget = TextBudget(10)
+    assert not budget.add("abcd")
+    assert budget.add("efghijk")
+    assert budget.text == "abcd\nefghi"
+    assert budget.truncated
+
+
+def test_extract_many_caches_by_content_hash(tmp_path):
+    first = tmp_path / "a.txt"
+    copy = tmp_path / "b.txt"
+    first.write_text("泵" * 300, encoding="utf-8")
+    copy.write_text("泵" * 300, encoding="utf-8")
+
+    extractor = DocumentExtractor(cache_dir=tmp_path / "cache", max_chars=100, max_workers=1)
+    try:
+        results = extractor.extract_many([first, copy, tmp_path / "c.xyz"])
+        assert results[str(first)]['text'] == "泵" * 100
+        assert results[str(first)]['truncated']
+        assert results[str(first)]['hash'] == results[str(copy)]['hash']
+        assert not results[str(first)]['cached']
+        assert results[str(tmp_path / "c.xyz")]['error']
+
+        # 再次提取直接命中缓存
+        assert extractor.extract(copy)['cached']
+
+        # 缓存是在更小的预算下截断的，扩大预算后重新提取
+        extractor.max_chars = 1000
+        result = extractor.extract(first)
+        assert not result['cached']
+        assert len(result['text']) == 300 and not result['truncated']
+    finally:
+        extractor.close()
+
+
+def test_docx_preview_reads_core_properties_and_leading_paragraphs(tmp_path):
+    docx = pytest.importorskip("docx")
+    document = docx.Document()
+    document.core_properties.title = "给水泵采购技术要求"
+    document.core_properties.keywords = "给水泵"
+    document.add_heading("1 概述", level=1)
+    for i in range(500):
+        document.add_paragraph(f"第{i}段 给水泵技术要求。")
+    document.add_heading("9 附录", level=1)
+    path = tmp_path / "spec.docx"
+    document.save(path)
+
+    result = extract_text(str(path), 200, MODE_PREVIEW)
+    assert result['error'] is None
+    assert result['title'] == "给水泵采购技术要求"
+    assert result['keywords'] == "给水泵"
+    # 只读取开头部分：后面的章节标题不会出现
+    assert result['headings'] == ["1 概述"]
+    assert len(result['text']) == 200 and result['truncated']
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="需要命名管道模拟卡住的文件")
+def test_timeout_kills_only_the_stuck_worker(tmp_path):
+    # 读取没有写入端的命名管道会一直阻塞，模拟卡住的文件
+    stuck = tmp_path / "stuck.txt"
+    os.mkfifo(stuck)
+    files = []
+    for i in range(3):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(f"给水泵{i}", encoding="utf-8")
+        files.append(path)
+
+    extractor = DocumentExtractor(cache_dir=tmp_path / "cache", timeout=3, max_workers=2)
+    try:
+        extractor.extract(files[0])  # 预先启动一个工作进程
+        stuck_results = {}
+        thread = threading.Thread(target=lambda: stuck_results.update(
+            extractor._run_in_pool({"stuck": [str(stuck)]})))
+        thread.start()
+        # 另一个线程同时提取：不受卡住的文件影响
+        results = extractor.extract_many(files[1:])
+        assert [results[str(path)]['text'] for path in files[1:]] == ["给水泵1", "给水泵2"]
+        thread.join()
+        assert "超时" in stuck_results["stuck"]['error']
+    finally:
+        extractor.close()
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="需要命名管道模拟卡住的文件")
+def test_timeout_counts_from_job_start(tmp_path):
+    stuck = tmp_path / "stuck.txt"
+    os.mkfifo(stuck)
+    path = tmp_path / "a.txt"
+    path.write_text("给水泵", encoding="utf-8")
+
+    # 只有一个工作进程：后提交的文件等待卡住的文件超时后才开始，等待时间不计入它的超时
+    extractor = DocumentExtractor(cache_dir=tmp_path / "cache", timeout=2, max_workers=1)
+    try:
+        extractor.extract(path)
+        stuck_results = {}
+        thread = threading.Thread(target=lambda: stuck_results.update(
+            extractor._run_in_pool({"stuck": [str(stuck)]})))
+        thread.start()
+        time.sleep(0.5)
+        result = extractor.extract_many([path], mode=MODE_PREVIEW)[str(path)]
+        thread.join()
+        assert result['error'] is None and result['text'] == "给水泵"
+        assert "超时" in stuck_results["stuck"]['error']
+    finally:
+        extractor.close()
+
+
+def test_worker_start_failure_does_not_leak_slots(tmp_path, monkeypatch):
+    import core.extractor
+
+    files = []
+    for i in range(3):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(f"给水泵{i}", encoding="utf-8")
+        files.append(path)
+
+    real_worker = core.extractor._Worker
+    failing = [True]
+
+    def start_worker(*args):
+        if failing[0]:
+            raise RuntimeError("提取进程启动失败")
+        return real_worker(*args)
+
+    monkeypatch.setattr(core.extractor, "_Worker", start_worker)
+    extractor = DocumentExtractor(cache_dir=tmp_path / "cache", timeout=10, max_workers=1)
+    try:
+        # 启动失败的文件记为错误，名额归还，多次失败后仍可以继续提取
+        for _ in range(3):
+            results = extractor.extract_many(files)
+            assert all("无法启动提取进程" in results[str(path)]['error'] for path in files)
+        failing[0] = False
+        results = extractor.extract_many(files)
+        assert [results[str(path)]['text'] for path in files] == ["给水泵0", "给水泵1", "给水泵2"]
+    finally:
+        extractor.close()
+
+
+def test_worker_start_failure_with_jobs_in_flight(tmp_path, monkeypatch):
+    import core.extractor
+
+    files = []
+    for i in range(3):
+        path = tmp_path / f"{i}.txt"
+        path.write_text(f"给水泵{i}", encoding="utf-8")
+        files.append(path)
+
+    real_worker = core.extractor._Worker
+    allowed = [1]
+
+    def start_worker(*args):
+        if allowed[0] <= 0:
+            raise RuntimeError("提取进程启动失败")
+        allowed[0] -= 1
+        return real_worker(*args)
+
+    monkeypatch.setattr(core.extractor, "_Worker", start_worker)
+    extractor = DocumentExtractor(cache_dir=tmp_path / "cache", timeout=10, max_workers=2)
+    try:
+        # 第一个文件在执行时其他进程启动失败：已发送的文件照常完成，名额全部归还
+        results = extractor.extract_many(files)
+        assert results[str(files[0])]['text'] == "给水泵0"
+        assert all("无法启动提取进程" in results[str(path)]['error'] for path in files[1:])
+        assert extractor._slots.acquire(blocking=False) and extractor._slots.acquire(blocking=False)
+        extractor._slots.release()
+        extractor._slots.release()
+    finally:
+        extractor.close()
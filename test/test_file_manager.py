@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文件管理器测试（SQLite 存储、旧版 JSON 迁移、批量事务）
+"""
+
+import sys
+import os
+import json
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.file_manager import FileManager
+
+
+def test_migrates_legacy_json_once(tmp_path):
+    legacy = {
+        "/x/a.pdf": {'original_path': "/x/a.pdf", 'category': "泵/离心泵", 'file_name': "a.pdf",
+                     'content_hash': "blake2b:01"},
+        "/x/b.pdf": {'original_path': "/x/b.pdf", 'category': "阀门/闸阀", 'file_name': "b.pdf", 'reason': "名称"},
+    }
+    (tmp_path / "files_db.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding='utf-8')
+    manager = FileManager(data_dir=tmp_path)
+    assert manager.get_all_files() == list(legacy.values())
+    assert manager.find_by_hash("blake2b:01")['file_name'] == "a.pdf"
+    # JSON 文件保持不变（可能受版本控制），导入记录在 meta 表中
+    assert json.loads((tmp_path / "files_db.json").read_text(encoding='utf-8')) == legacy
+    manager.clear_all()
+    manager.close()
+
+    # 再次打开时不重复导入
+    reloaded = FileManager(data_dir=tmp_path)
+    assert reloaded.get_file_count() == 0
+    reloaded.close()
+
+
+def test_failed_migration_rolls_back_and_retries(tmp_path):
+    legacy = {"/x/a.pdf": {'original_path': "/x/a.pdf", 'category': "泵/离心泵", 'file_name': "a.pdf"},
+              "/x/b.pdf": "损坏的记录"}
+    (tmp_path / "files_db.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding='utf-8')
+    manager = FileManager(data_dir=tmp_path)
+    assert manager.get_file_count() == 0
+    manager.close()
+
+    del legacy["/x/b.pdf"]
+    (tmp_path / "files_db.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding='utf-8')
+    manager = FileManager(data_dir=tmp_path)
+    assert manager.get_file_count() == 1
+    manager.close()
+
+
+def test_load_records_reads_without_creating_database(tmp_path):
+    legacy = {"/x/a.pdf": {'original_path': "/x/a.pdf", 'category': "泵/离心泵", 'file_name': "a.pdf"}}
+    (tmp_path / "files_db.json").write_text(json.dumps(legacy, ensure_ascii=False), encoding='utf-8')
+    assert FileManager.load_records(tmp_path) == list(legacy.values())
+    assert not (tmp_path / "files.sqlite3").exists()
+
+    manager = FileManager(data_dir=tmp_path)
+    manager.add_file("/x/b.pdf", "阀门/闸阀")
+    manager.update_file("/x/a.pdf", reason="名称")
+    assert FileManager.load_records(tmp_path) == manager.get_all_files()
+    manager.close()
+
+
+def test_batch_commits_once_and_keeps_insertion_order(tmp_path):
+    manager = FileManager(data_dir=tmp_path)
+    with manager.batch():
+        for i in range(5):
+            manager.add_file(f"/x/{i}.pdf", ("泵/离心泵", 0.5 + i / 10))
+        # 提交前其他线程看不到这批记录
+        seen = []
+        reader = threading.Thread(target=lambda: seen.append(manager.get_file_count()))
+        reader.start()
+        reader.join()
+        assert seen == [0]
+    assert manager.get_file_count() == 5
+
+    manager.add_file("/x/0.pdf", "阀门/闸阀")
+    manager.update_file("/x/1.pdf", reason="按需生成")
+    manager.remove_file("/x/2.pdf")
+    assert [f['file_name'] for f in manager.get_all_files()] == ["0.pdf", "1.pdf", "3.pdf", "4.pdf"]
+    assert [f['file_name'] for f in manager.get_files_in_category("泵/离心泵")] == ["1.pdf", "3.pdf", "4.pdf"]
+    assert manager.get_file("/x/1.pdf")['reason'] == "按需生成"
+    assert manager.get_file("/x/3.pdf")['similarity_score'] == 0.8
+
+    manager.clear_all()
+    assert manager.get_file_count() == 0 and manager.get_all_categories() == set()
+    manager.close()
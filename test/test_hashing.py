@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+文件内容哈希与去重测试
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import hashing
+from core.hashing import FileHasher, file_content_hash, group_by_hash
+from core.file_manager import FileManager
+
+
+def test_mmap_and_chunked_reads_agree(tmp_path, monkeypatch):
+    path = tmp_path / "big.bin"
+    path.write_bytes(os.urandom(300 * 1024))
+    chunked = file_content_hash(path, chunk_size=64 * 1024)
+    monkeypatch.setattr(hashing, "MMAP_THRESHOLD", 1)
+    assert file_content_hash(path, chunk_size=64 * 1024) == chunked
+    assert chunked.startswith(hashing.HASH_ALGORITHM + ":")
+
+
+def test_hasher_groups_copies_and_tracks_modifications(tmp_path):
+    a, b, c = tmp_path / "a.pdf", tmp_path / "b.pdf", tmp_path / "c.pdf"
+    a.write_bytes(b"spec")
+    b.write_bytes(b"spec")
+    c.write_bytes(b"other")
+
+    hasher = FileHasher(max_workers=2)
+    hasher.submit([a, b, c])
+    hashes = hasher.hash_many([str(a), str(b), str(c)])
+    assert group_by_hash([str(a), str(b), str(c)], hashes) == [[str(a), str(b)], [str(c)]]
+
+    # 文件内容变化后签名不同，重新计算
+    os.utime(c, ns=(0, 0))
+    c.write_bytes(b"spec")
+    assert hasher.get(c) == hashes[str(a)]
+    hasher.close()
+
+
+def test_file_manager_persists_hash_index(tmp_path):
+    manager = FileManager(data_dir=tmp_path)
+    manager.add_file("/x/a.pdf", ("泵/离心泵/给水泵", 0.8), content_hash="blake2b:00ff",
+                     file_signature=(4, 123))
+    reloaded = FileManager(data_dir=tmp_path)
+    record = reloaded.find_by_hash("blake2b:00ff")
+    assert record['category'] == "泵/离心泵/给水泵"
+    assert (record['file_size'], record['file_mtime_ns']) == (4, 123)
+
+    reloaded.remove_file("/x/a.pdf")
+    assert reloaded.find_by_hash("blake2b:00ff") is None
+
+
+def test_find_by_hash_skips_unclassified_and_other_methods(tmp_path):
+    manager = FileManager(data_dir=tmp_path)
+    manager.add_file("/x/a.pdf", "其他/未分类", content_hash="blake2b:01", classify_method="llm")
+    manager.add_file("/x/b.pdf", "泵/离心泵/给水泵", content_hash="blake2b:01", classify_method="embedding")
+    assert manager.find_by_hash("blake2b:01", classify_method="llm") is None
+    assert manager.find_by_hash("blake2b:01", classify_method="embedding")['file_name'] == "b.pdf"
+    assert manager.find_by_hash("blake2b:01")['file_name'] == "b.pdf"
+
+    manager.add_file("/x/c.pdf", "泵/往复泵/柱塞泵", content_hash="blake2b:01", classify_method="llm")
+    assert manager.find_by_hash("blake2b:01", classify_method="llm")['category'] == "泵/往复泵/柱塞泵"
+    manager.close()
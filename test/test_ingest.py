@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+向量库导入流水线测试（使用模拟的数据源、嵌入函数和集合，不需要数据库和嵌入服务）
+"""
+
+import sys
+import os
+import json
+import threading
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from embed.adaptive_batch import AdaptiveEmbedder
+from embed.ingest import IngestPipeline, SQLiteMaterialSource, row_hash, write_report
+from embed.ingest_state import IngestState
+from embed.synthetic_materials import write_sqlite
+
+
+def make_rows(count, start=1):
+    return [{'id': i, 'material_name': f"泵{i % 7}", 'big_class_name': "泵", 'middle_class_name': "离心泵",
+             'small_class_name': "给水泵", 'small_class_code': "010101"} for i in range(start, start + count)]
+
+
+class FakeSource:
+    """按批返回固定数据的数据源"""
+
+    def __init__(self, rows, batch_size=10):
+        self.rows = rows
+        self.batch_size = batch_size
+
+    def count(self):
+        return len(self.rows)
+
+    def batches(self, after_id=0):
+        rows = [row for row in self.rows if row['id'] > after_id]
+        for start in range(0, len(rows), self.batch_size):
+            yield rows[start:start + self.batch_size], 0.0
+
+    def hash_batches(self):
+        yield [(row['id'], row_hash(row)) for row in self.rows]
+
+    def fetch_by_ids(self, ids):
+        wanted = set(ids)
+        return [row for row in self.rows if row['id'] in wanted], 0.0
+
+
+class FakeCollection:
+    """记录写入内容的集合"""
+
+    def __init__(self):
+        self.records = {}
+        self.writer_threads = set()
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        assert len(ids) == len(embeddings) == len(documents) == len(metadatas)
+        self.writer_threads.add(threading.get_ident())
+        for record_id, embedding, metadata in zip(ids, embeddings, metadatas):
+            self.records[record_id] = (embedding, metadata)
+
+    def get(self, limit, offset, include):
+        return {'ids': list(self.records)[offset:offset + limit]}
+
+    def delete(self, ids):
+        for record_id in ids:
+            self.records.pop(record_id, None)
+
+
+def fake_embedding(texts):
+    if any("坏" in text for text in texts):
+        raise RuntimeError("嵌入服务返回错误")
+    return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_pipeline_writes_precomputed_vectors_from_one_writer():
+    rows = make_rows(95)
+    rows[3]['material_name'] = ""
+    collection = FakeCollection()
+    stats = IngestPipeline(collection, fake_embedding, lambda m: m['material_name'],
+                           source=FakeSource(rows), embed_workers=3).run(total=len(rows))
+    assert stats['read'] == 95 and stats['written'] == 94 and stats['skipped'] == 1
+    assert collection.records["material_1"] == ([2.0, 1.0], {
+        'id': "1", 'material_name': "泵1", 'big_class_name': "泵", 'middle_class_name': "离心泵",
+        'small_class_name': "给水泵", 'small_class_code': "010101"})
+    assert collection.writer_threads == {threading.get_ident()}
+
+
+def test_embedding_failure_only_fails_its_rows():
+    rows = make_rows(30)
+    rows[15]['material_name'] = "坏数据"
+    collection = FakeCollection()
+    stats = IngestPipeline(collection, fake_embedding, lambda m: m['material_name'],
+                           source=FakeSource(rows), embed_workers=2,
+                           chunker=AdaptiveEmbedder(fake_embedding, retry_delay=0)).run()
+    assert stats['written'] == 29 and stats['failed'] == 1
+    assert "material_16" not in collection.records and "material_17" in collection.records
+
+
+def test_adaptive_chunks_shrink_on_rejection_and_retry_failed_parts():
+    sizes = []
+
+    def limited_embedding(texts):
+        sizes.append(len(texts))
+        if len(texts) > 10:
+            raise RuntimeError("请求过大")
+        return fake_embedding(texts)
+
+    chunker = AdaptiveEmbedder(limited_embedding, initial_size=64, retry_delay=0)
+    texts = [f"文本{i}" for i in range(300)] + ["坏"]
+    vectors = chunker.embed(texts)
+    assert vectors[:300] == [[float(len(text)), 1.0] for text in texts[:300]]
+    assert vectors[300] is None and chunker.failed == 1
+    # 分块收敛到服务能接受的大小，坏数据只让它所在的分块拆分重试
+    assert chunker.size <= 10 and all(size <= 10 for size in sizes[-20:])
+
+
+@pytest.mark.parametrize("size", [64, 256, 1024])
+def test_bad_text_at_chunk_start_fails_only_itself(size):
+    chunker = AdaptiveEmbedder(fake_embedding, initial_size=size, max_size=size, retry_delay=0)
+    texts = ["坏"] + [f"文本{i}" for i in range(size - 1)]
+    vectors = chunker.embed(texts)
+    # 拆分和重试的出错不计入连续出错次数，不会被当成嵌入服务不可用
+    assert vectors[0] is None and chunker.failed == 1
+    assert vectors[1:] == [[float(len(text)), 1.0] for text in texts[1:]]
+
+
+def test_unavailable_service_raises():
+    def down(texts):
+        raise RuntimeError("连接被拒绝")
+
+    chunker = AdaptiveEmbedder(down, initial_size=4, retry_delay=0, max_consecutive_errors=3)
+    with pytest.raises(RuntimeError):
+        chunker.embed([f"文本{i}" for i in range(100)])
+
+
+def test_resume_and_incremental_sync_touch_only_changed_rows(tmp_path):
+    rows = make_rows(50)
+    state = IngestState(tmp_path / "state.sqlite3")
+    collection = FakeCollection()
+    embedded = []
+
+    def counting_embedding(texts):
+        embedded.extend(texts)
+        return fake_embedding(texts)
+
+    pipeline = IngestPipeline(collection, counting_embedding, lambda m: m['material_name'],
+                              source=FakeSource(rows), state=state, embed_workers=2)
+    pipeline.run()
+    assert state.get('checkpoint') == "50" and len(state) == 50
+
+    # 断点之后没有新数据，继续导入不再嵌入任何行
+    embedded.clear()
+    assert pipeline.run(resume=True)['written'] == 0 and not embedded
+
+    # 修改一行、删除一行、新增一行
+    rows[9]['material_name'] = "屏蔽泵"
+    del rows[19]
+    rows.extend(make_rows(1, start=51))
+    stats = pipeline.run_incremental()
+    # 新增的一行与已有行名称相同，复用本次运行中已算好的向量
+    assert embedded == ["屏蔽泵"]
+    assert stats['written'] == 2 and stats['deleted'] == 1 and stats['unchanged'] == 48
+    assert "material_20" not in collection.records and "material_51" in collection.records
+    assert pipeline.run_incremental()['written'] == 0
+    state.close()
+
+
+def test_full_reload_removes_rows_deleted_from_source(tmp_path):
+    state = IngestState(tmp_path / "state.sqlite3")
+    collection = FakeCollection()
+    IngestPipeline(collection, fake_embedding, lambda m: m['material_name'],
+                   source=FakeSource(make_rows(30)), state=state).run()
+    assert len(collection.records) == 30
+
+    # 不带 resume 重新全量导入：源表中已删除的行也要从集合中删除，之后增量同步才能保持一致
+    collection.records["other_1"] = ([0.0, 0.0], {})
+    rows = [row for row in make_rows(30) if row['id'] % 3]
+    stats = IngestPipeline(collection, fake_embedding, lambda m: m['material_name'],
+                           source=FakeSource(rows), state=state).run()
+    assert stats['deleted'] == 10 and len(state) == 20
+    assert set(collection.records) == {f"material_{row['id']}" for row in rows} | {"other_1"}
+    state.close()
+
+
+def test_identical_documents_are_embedded_once_per_run():
+    rows = make_rows(70)
+    embedded = []
+
+    def counting_embedding(texts):
+        embedded.extend(texts)
+        return fake_embedding(texts)
+
+    collection = FakeCollection()
+    stats = IngestPipeline(collection, counting_embedding, lambda m: m['material_name'],
+                           source=FakeSource(rows), embed_workers=3).run()
+    # 70 行只有 7 个不同的名称
+    assert sorted(embedded) == sorted(f"泵{i}" for i in range(7))
+    assert stats['written'] == 70 and stats['embedded'] == 7 and stats['deduplicated'] == 63
+    assert collection.records["material_8"][0] == collection.records["material_1"][0] == [2.0, 1.0]
+
+
+def test_sqlite_source_and_run_report(tmp_path):
+    path = tmp_path / "materials.sqlite3"
+    write_sqlite(path, 3000, seed=1)
+    source = SQLiteMaterialSource(path, batch_size=500)
+    assert source.count() == 3000
+    collection = FakeCollection()
+    pipeline = IngestPipeline(collection, fake_embedding, lambda m: m['material_name'],
+                              source=source, embed_workers=2)
+    stats = pipeline.run(total=3000)
+    assert stats['written'] + stats['skipped'] == 3000 and stats['embedded'] < stats['written']
+
+    report = pipeline.report(stats)
+    assert report['stages']['ingest_read']['count'] == 6
+    assert report['stages']['ingest_write']['rows'] == stats['written']
+    histogram = report['stages']['embed_request']['histogram']
+    assert sum(bucket['count'] for bucket in histogram) == stats['embed_calls']
+    assert report['bottleneck'] in ('read', 'embed', 'write')
+    write_report(report, tmp_path / "report.json")
+    assert json.loads((tmp_path / "report.json").read_text(encoding='utf-8'))['stats'] == stats
+
+
+class FakeMySQLPool:
+    """模拟 MySQL 连接池：按 WHERE id > %s ORDER BY id LIMIT %s 返回行，记录每次查询的参数"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def connection(self):
+        return FakeMySQLCursor(self)
+
+
+class FakeMySQLCursor:
+    """连接和游标都用这个对象模拟"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        assert "WHERE id > %s ORDER BY id LIMIT %s" in " ".join(sql.split())
+        last_id, limit = params
+        self.pool.queries.append((last_id, limit))
+        rows = sorted((row for row in self.pool.rows if row['id'] > last_id), key=lambda row: row['id'])[:limit]
+        if "row_hash" in sql:
+            rows = [dict(row, row_hash=row_hash(row)) for row in rows]
+        self.result = rows
+
+    def fetchall(self):
+        return self.result
+
+
+def test_mysql_source_pages_by_last_id(monkeypatch):
+    import embed.ingest
+
+    # id 不连续：按上一批最后一条的 id 翻页，不会跳过或重复
+    rows = make_rows(3) + make_rows(2, start=100) + make_rows(2, start=1000)
+    pool = FakeMySQLPool(rows)
+    monkeypatch.setattr(embed.ingest, "get_pool", lambda: pool)
+    source = embed.ingest.MySQLMaterialSource(batch_size=3)
+
+    batches = [materials for materials, _ in source.batches()]
+    assert [[row['id'] for row in materials] for materials in batches] == [[1, 2, 3], [100, 101, 1000], [1001]]
+    # 最后一批不足3条，不再多查一次
+    assert pool.queries == [(0, 3), (3, 3), (1000, 3)]
+
+    pool.queries.clear()
+    assert [row['id'] for materials, _ in source.batches(after_id=100) for row in materials] == [101, 1000, 1001]
+    assert pool.queries == [(100, 3), (1001, 3)]
+
+    # 行数正好是批大小的整数倍时，以空批结束
+    pool.queries.clear()
+    hashes = [pair for pairs in source.hash_batches(batch_size=7) for pair in pairs]
+    assert hashes == [(row['id'], row_hash(row)) for row in rows]
+    assert pool.queries == [(0, 7), (1001, 7)]
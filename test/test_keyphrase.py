@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+关键词摘要（字符n-gram TF-IDF）测试
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.keyphrase import KeyphraseModel, char_ngrams
+
+CORPUS = [
+    "离心泵", "给水泵", "屏蔽泵", "闸阀", "截止阀", "止回阀", "电缆", "变压器",
+    "主给水泵机械密封的技术要求", "机械密封备品备件",
+] + ["本文件规定了采购技术要求"] * 6  # 模板化的套话在已提取的文档中很常见
+
+
+def test_char_ngrams_splits_cjk_and_keeps_model_codes():
+    grams = char_ngrams("给水泵 ACP1200S03 kg")
+    assert {"给水", "水泵", "给水泵"} <= set(grams)
+    assert "ACP1200S03" in grams
+    # 过短的字母数字词被丢弃
+    assert "KG" not in grams
+
+
+def test_build_query_prefers_rare_terms_and_stays_short(tmp_path):
+    model = KeyphraseModel().fit(CORPUS)
+    text = "本文件规定了采购技术要求。" * 5 + "机械密封" * 3 + "屏蔽泵"
+    query, terms = model.build_query("采购技术要求", text, max_terms=3, max_chars=20, min_df=1)
+    words = [term for term, _ in terms]
+    assert "机械密封" in words
+    # 文件名中已有的词和被已选关键词包含的短词不重复出现
+    assert not any(word in "采购技术要求" for word in words)
+    assert "机械" not in words
+    assert query.startswith("采购技术要求") and len(query) <= 20
+
+    path = tmp_path / "stats.json"
+    model.save(path, min_df=1)
+    loaded = KeyphraseModel.load(path)
+    assert loaded.doc_count == model.doc_count
+    assert loaded.build_query("采购技术要求", text, max_terms=3, max_chars=20, min_df=1) == (query, terms)
+    assert KeyphraseModel.load(tmp_path / "missing.json") is None
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+OLE2复合文档 / .doc 正文读取测试（使用 测试/ 目录中的样例文档）
+"""
+
+import sys
+import os
+import glob
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.ole2_reader import OleFile, read_doc_text, _decode_compressed
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "测试")
+DOC_FILES = sorted(glob.glob(os.path.join(SAMPLE_DIR, "*.doc")))
+
+
+@pytest.mark.skipif(not DOC_FILES, reason="测试/ 目录中没有 .doc 样例")
+def test_reads_word_streams_and_text():
+    for file_path in DOC_FILES:
+        with OleFile(file_path) as ole:
+            assert ole.exists("WordDocument")
+        text = read_doc_text(file_path)
+        assert "密级" in text
+        # 控制字符已转换为换行/制表符
+        assert "\r" not in text and "\x07" not in text
+
+
+@pytest.mark.skipif(not DOC_FILES, reason="测试/ 目录中没有 .doc 样例")
+def test_respects_character_and_size_caps():
+    file_path = DOC_FILES[0]
+    assert len(read_doc_text(file_path, max_chars=200)) <= 200
+    with pytest.raises(ValueError):
+        read_doc_text(file_path, max_file_bytes=1024)
+
+
+def test_rejects_non_ole_files(tmp_path):
+    path = tmp_path / "fake.doc"
+    path.write_bytes(b"not a compound file" * 100)
+    with pytest.raises(ValueError):
+        read_doc_text(path)
+
+
+def test_decodes_compressed_text_as_cp1252():
+    data = bytes(range(0x20, 0x7F)) + bytes([0x80, 0x8E, 0x93, 0x94, 0x9E, 0x9F, 0xE9])
+    assert _decode_compressed(data) == bytes(range(0x20, 0x7F)).decode('ascii') + '€Ž“”žŸé'
+    # cp1252 未定义的字节保留原值，不报错
+    assert _decode_compressed(bytes([0x81, 0x8D])) == '\x81\x8d'
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+分类流水线（DAG执行器）测试
+"""
+
+import sys
+import os
+import threading
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.metrics import MetricsRecorder
+from core.pipeline import Pipeline, PipelineNode, STATUS_OK, STATUS_SKIPPED, STATUS_FAILED, STATUS_TIMEOUT
+
+
+def test_runs_in_dependency_order_and_records_timings():
+    metrics = MetricsRecorder()
+    pipeline = Pipeline([
+        # 声明顺序与执行顺序无关
+        PipelineNode('total', lambda ctx: ctx['double'] + ctx['square'], deps=['double', 'square']),
+        PipelineNode('double', lambda ctx: ctx['x'] * 2),
+        PipelineNode('square', lambda ctx: ctx['x'] ** 2),
+    ], metrics=metrics)
+    context = pipeline.run({'x': 3})
+    assert context['total'] == 15
+    assert set(context['_status'].values()) == {STATUS_OK}
+    assert {e['node'] for e in metrics.events('pipeline_node')} == {'total', 'double', 'square'}
+    pipeline.close()
+
+
+def test_skip_failure_and_timeout_fallbacks():
+    def boom(ctx):
+        raise RuntimeError("boom")
+
+    pipeline = Pipeline([
+        PipelineNode('skipped', lambda ctx: 1, when=lambda ctx: False),
+        PipelineNode('failed', boom, fallback=lambda ctx, error: 'fallback'),
+        PipelineNode('slow', lambda ctx: time.sleep(1) or 'late', timeout=0.05,
+                     fallback=lambda ctx, error: 'timeout'),
+        PipelineNode('after', lambda ctx: (ctx['skipped'], ctx['failed'], ctx['slow']),
+                     deps=['skipped', 'failed', 'slow']),
+    ])
+    start = time.monotonic()
+    context = pipeline.run({})
+    assert time.monotonic() - start < 0.8
+    assert context['after'] == (None, 'fallback', 'timeout')
+    assert context['_status']['skipped'] == STATUS_SKIPPED
+    assert context['_status']['failed'] == STATUS_FAILED
+    assert context['_status']['slow'] == STATUS_TIMEOUT
+    pipeline.close()
+
+
+def test_run_many_respects_node_concurrency_limit():
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def limited(ctx):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+        return ctx['i']
+
+    pipeline = Pipeline([PipelineNode('limited', limited, max_concurrency=2)], max_workers=8)
+    contexts = pipeline.run_many([{'i': i} for i in range(10)], max_parallel=8)
+    assert [c['limited'] for c in contexts] == list(range(10))
+    assert peak[0] <= 2
+    pipeline.close()
+
+
+def test_rejects_cycles_and_unknown_dependencies():
+    with pytest.raises(ValueError):
+        Pipeline([PipelineNode('a', lambda ctx: 1, deps=['b']),
+                  PipelineNode('b', lambda ctx: 1, deps=['a'])]).run({})
+    with pytest.raises(ValueError):
+        Pipeline([PipelineNode('a', lambda ctx: 1, deps=['missing'])]).run({})
+
+
+def test_blocked_node_does_not_starve_later_nodes():
+    release = threading.Event()
+    pipeline = Pipeline([
+        # 唯一的线程被永远不返回的节点占用
+        PipelineNode('blocked', lambda ctx: release.wait(), timeout=0.3,
+                     fallback=lambda ctx, error: 'blocked-fallback'),
+        # 排队等待线程的节点从提交时开始计算超时
+        PipelineNode('queued', lambda ctx: 'queued', timeout=0.05,
+                     fallback=lambda ctx, error: 'queued-fallback'),
+        PipelineNode('after', lambda ctx: (ctx['blocked'], ctx['queued']), deps=['blocked', 'queued']),
+    ], max_workers=1)
+    try:
+        start = time.monotonic()
+        context = pipeline.run({})
+        assert time.monotonic() - start < 2
+        assert context['after'] == ('blocked-fallback', 'queued-fallback')
+        assert context['_status']['queued'] == STATUS_TIMEOUT
+        # 被放弃的线程不再占用名额，再次处理时同样按时得到回退结果
+        context = pipeline.run({})
+        assert context['after'] == ('blocked-fallback', 'queued-fallback')
+    finally:
+        release.set()
+        pipeline.close()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+向量检索结果后处理测试：数组化流水线与原逐条处理实现的结果必须一致
+"""
+
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from core.score_pipeline import (CategoryInterner, encode_query_results, distances_to_scores,
+                                 select_batch, filter_quantile_with_tie)
+
+
+def legacy_filter_quantile_with_tie(data, score_key="similarity_score", quantile=0.9, min_advance=2):
+    """原 Classifier._filter_quantile_with_tie 的逐条实现（参考结果）"""
+    if not data:
+        return []
+    sorted_data = sorted(data, key=lambda x: x[score_key], reverse=True)
+    n_total = len(sorted_data)
+    if n_total <= min_advance:
+        return sorted_data
+    scores = [d[score_key] for d in sorted_data]
+    threshold = np.quantile(scores, quantile)
+    advance_candidates = [d for d in sorted_data if d[score_key] >= threshold]
+    tie_score = threshold
+    tie_candidates = [d for d in sorted_data if abs(d[score_key] - tie_score) < 0.0001]
+    seen_paths = set()
+    advance_data = []
+    for d in advance_candidates + tie_candidates:
+        path = d.get('category_path', '')
+        if path not in seen_paths:
+            seen_paths.add(path)
+            advance_data.append(d)
+    advance_data = sorted(advance_data, key=lambda x: x[score_key], reverse=True)
+    if len(advance_data) < min_advance:
+        if n_total >= 2:
+            top2_score = sorted_data[1][score_key]
+        else:
+            top2_score = sorted_data[0][score_key]
+        seen_paths = set()
+        advance_data = []
+        for d in sorted_data:
+            if d[score_key] >= top2_score:
+                path = d.get('category_path', '')
+                if path not in seen_paths:
+                    seen_paths.add(path)
+                    advance_data.append(d)
+    return advance_data
+
+
+def legacy_postprocess(metadatas, distances):
+    """原 _get_top_score_embedding_results 的逐条后处理（参考结果）"""
+    classification_results = []
+    for i, metadata in enumerate(metadatas):
+        distance = distances[i] if i < len(distances) else None
+        if distance is None:
+            continue
+        similarity_score = 1 - (distance / 2.0) if distance <= 2.0 else 0.0
+        similarity_score = max(0.0, min(1.0, similarity_score))
+        if similarity_score < 0.5:
+            continue
+        category_path = []
+        if metadata.get('big_class_name'):
+            category_path.append(metadata['big_class_name'])
+        if metadata.get('middle_class_name'):
+            category_path.append(metadata['middle_class_name'])
+        if metadata.get('small_class_name'):
+            category_path.append(metadata['small_class_name'])
+        if category_path:
+            classification_results.append({
+                'category_path': os.sep.join(category_path),
+                'similarity_score': similarity_score,
+                'distance': distance,
+                'metadata': metadata
+            })
+    if not classification_results:
+        return []
+    return legacy_filter_quantile_with_tie(classification_results)
+
+
+def make_batch(rng, n_queries, k, n_categories, tie_step=0.01, fixed_width=False):
+    """生成带大量同分的随机检索结果"""
+    metadatas_batch, distances_batch = [], []
+    for _ in range(n_queries):
+        width = k if fixed_width else int(rng.integers(0, k + 1))
+        # 量化距离以制造同分
+        distances = np.round(np.sort(rng.uniform(0.0, 1.4, width)) / tie_step) * tie_step
+        metadatas = []
+        for _ in range(width):
+            c = int(rng.integers(0, n_categories))
+            metadata = {'big_class_name': f"大类{c % 3}", 'middle_class_name': f"中类{c % 7}",
+                        'small_class_name': f"小类{c}"}
+            if c == 0:
+                metadata = {}
+            metadatas.append(metadata)
+        metadatas_batch.append(metadatas)
+        distances_batch.append(distances.tolist())
+    return metadatas_batch, distances_batch
+
+
+def run_pipeline(metadatas_batch, distances_batch):
+    interner = CategoryInterner()
+    distances, category_ids = encode_query_results(metadatas_batch, distances_batch, interner)
+    scores = distances_to_scores(distances)
+    positions = select_batch(scores, category_ids, quantile=0.9, min_advance=2, min_score=0.5)
+    return [[(interner.paths[category_ids[row, p]], scores[row, p]) for p in row_positions]
+            for row, row_positions in enumerate(positions)]
+
+
+def test_pipeline_matches_legacy():
+    rng = np.random.default_rng(7)
+    for tie_step in (0.001, 0.02, 0.2):
+        metadatas_batch, distances_batch = make_batch(rng, 200, 40, 12, tie_step=tie_step)
+        expected = [[(r['category_path'], r['similarity_score']) for r in legacy_postprocess(m, d)]
+                    for m, d in zip(metadatas_batch, distances_batch)]
+        assert run_pipeline(metadatas_batch, distances_batch) == expected
+
+
+def test_filter_quantile_with_tie_matches_legacy():
+    rng = np.random.default_rng(3)
+    for _ in range(300):
+        n = int(rng.integers(0, 15))
+        data = [{'category_path': f"p{int(rng.integers(0, 5))}",
+                 'similarity_score': float(np.round(rng.uniform(0, 1), 1))} for _ in range(n)]
+        for min_advance in (1, 2, 3):
+            assert filter_quantile_with_tie(data, min_advance=min_advance) == \
+                legacy_filter_quantile_with_tie(data, min_advance=min_advance)
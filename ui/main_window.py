@@ -9,12 +9,15 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QMessageBox, QSplitter, QTableWidget,
                              QTableWidgetItem, QHeaderView, QAbstractItemView,
                              QFrame, QSizePolicy, QDialog, QDialogButtonBox,
-                             QListWidget, QListWidgetItem, QScrollArea, QComboBox)
+                             QListWidget, QListWidgetItem, QScrollArea, QComboBox,
+                             QCheckBox, QApplication)
 from PyQt5.QtCore import Qt, pyqtSignal, QSize
 from PyQt5.QtGui import QIcon, QFont, QPalette, QColor
 import os
+from config.db_pool import close_pool
 from core.file_manager import FileManager
 from core.classifier import Classifier
+from core.hashing import FileHasher, group_by_hash
 
 
 class MainWindow(QMainWindow):
@@ -23,7 +26,16 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.file_manager = FileManager()
-        self.classifier = Classifier()
+        self.classifier = Classifier(history_records=self.file_manager.get_all_files())
+        # 分类时不生成理由，查看文件详情时再按需生成
+        self.classifier.defer_reason = True
+        # 上传后在后台计算内容哈希，内容相同的文件只分类一次
+        self.file_hasher = FileHasher()
+        for file_info in self.file_manager.get_all_files():
+            if file_info.get('content_hash') and 'file_size' in file_info:
+                self.file_hasher.seed(file_info['original_path'],
+                                      (file_info['file_size'], file_info.get('file_mtime_ns')),
+                                      file_info['content_hash'])
         self.uploaded_files = []  # 存储上传的文件路径
         self.classify_method = "llm"  # 默认使用LLM分类方法
         self.init_ui()
@@ -77,6 +89,11 @@ class MainWindow(QMainWindow):
         self.method_combo.currentIndexChanged.connect(self.on_method_changed)
         toolbar_layout.addWidget(self.method_combo)
         
+        # 重新分类选项：勾选后内容相同的文件也重新分类，不复用已有结果
+        self.force_reclassify_check = QCheckBox("重新分类")
+        self.force_reclassify_check.setToolTip("勾选后已分类过的内容也重新分类，不复用已有结果")
+        toolbar_layout.addWidget(self.force_reclassify_check)
+        
         # 分类按钮
         self.classify_btn = QPushButton("🚀 开始分类")
         self.classify_btn.setObjectName("successButton")
@@ -182,6 +199,7 @@ class MainWindow(QMainWindow):
         self.file_table.setShowGrid(False)
         self.file_table.verticalHeader().setVisible(False)
         self.file_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.file_table.cellDoubleClicked.connect(self.on_file_double_clicked)
         right_layout.addWidget(self.file_table)
         
         splitter.addWidget(right_container)
@@ -491,6 +509,7 @@ class MainWindow(QMainWindow):
                 new_files.append(file_path)
         
         if new_files:
+            self.file_hasher.submit(new_files)
             self.update_file_count()
             self.classify_btn.setEnabled(len(self.uploaded_files) > 0)
             self.statusBar().showMessage(f"成功添加 {len(new_files)} 个文件")
@@ -539,35 +558,95 @@ class MainWindow(QMainWindow):
             self.statusBar().showMessage(f"正在分类文件（{method_name}）...")
             self.classify_btn.setEnabled(False)
             
-            # 根据选择的分类方法调用不同的分类函数
+            # 整批文件使用同一个分类树，后台刷新分类不影响本次分类，结果记录该分类树的版本
+            category_tree = self.classifier.category_tree
+            
+            # 按内容哈希去重：用同一分类方法分类过的内容直接复用结果（“其他/未分类”的结果不复用，
+            # 勾选“重新分类”时都不复用），相同内容的多个文件只分类一个
+            hashes = self.file_hasher.hash_many(self.uploaded_files)
+            force_reclassify = self.force_reclassify_check.isChecked()
             results = {}
-            if self.classify_method == "fulltext_llm":
-                # 使用全文LLM分类方法
-                for file_path in self.uploaded_files:
-                    result = self.classifier.classify_with_fulltext_llm(file_path)
+            reasons = {}
+            versions = {}
+            hinted = set()  # 由项目编号前缀直接给出分类的文件
+            groups = []
+            reused_count = 0
+            for group in group_by_hash(self.uploaded_files, hashes):
+                record = None
+                if not force_reclassify:
+                    record = self.file_manager.find_by_hash(hashes.get(group[0]),
+                                                            classify_method=self.classify_method)
+                if record is None:
+                    groups.append(group)
+                    continue
+                for file_path in group:
+                    if record.get('similarity_score') is not None:
+                        results[file_path] = (record['category'], record['similarity_score'])
+                    else:
+                        results[file_path] = record['category']
+                    reasons[file_path] = record.get('reason')
+                    versions[file_path] = record.get('taxonomy_version')
+                    if record.get('code_hint'):
+                        hinted.add(file_path)
+                    reused_count += 1
+            to_classify = [group[0] for group in groups]
+            
+            # 根据选择的分类方法调用不同的分类函数
+            if to_classify and self.classify_method == "fulltext_llm":
+                # 使用全文LLM分类方法（多个文件在分类流水线上并发处理）
+                fulltext_results = self.classifier.classify_files_with_fulltext_llm(to_classify,
+                                                                                    category_tree=category_tree)
+                for file_path in to_classify:
+                    result = fulltext_results.get(file_path)
                     if result:
+                        reasons[file_path] = result.get('reason')
                         # result是dict格式: {'category_path': '...', 'reason': '...', 'similarity_score': ...}
                         results[file_path] = result['category_path']
                         # 如果有相似度分数，也保存
                         if result.get('similarity_score') is not None:
                             results[file_path] = (result['category_path'], result['similarity_score'])
+                        if result.get('code_hint'):
+                            hinted.add(file_path)
                     else:
                         results[file_path] = "其他/未分类"
-            else:
+            elif to_classify:
                 # 使用原有的分类方法
                 use_embedding = (self.classify_method == "embedding")
-                results = self.classifier.classify_files(self.uploaded_files, use_embedding=use_embedding)
+                results.update(self.classifier.classify_files(to_classify, use_embedding=use_embedding,
+                                                              category_tree=category_tree,
+                                                              code_hint_files=hinted))
+            
+            # 同一内容的其他文件使用代表文件的结果
+            for group in groups:
+                for file_path in group[1:]:
+                    results[file_path] = results.get(group[0], "其他/未分类")
+                    reasons[file_path] = reasons.get(group[0])
+                    if group[0] in hinted:
+                        hinted.add(file_path)
+                    reused_count += 1
             
-            # 保存分类结果到文件管理器
-            for file_path, result in results.items():
-                # result可能是字符串（LLM分类）或元组(路径, 分数)（向量检索分类）
-                self.file_manager.add_file(file_path, result)
+            # 保存分类结果到文件管理器（整批一个事务）
+            with self.file_manager.batch():
+                for file_path, result in results.items():
+                    # result可能是字符串（LLM分类）或元组(路径, 分数)（向量检索分类）
+                    self.file_manager.add_file(file_path, result, reason=reasons.get(file_path),
+                                               content_hash=hashes.get(file_path),
+                                               file_signature=self.file_hasher.signature_of(file_path),
+                                               taxonomy_version=versions.get(file_path, category_tree.version),
+                                               classify_method=self.classify_method,
+                                               code_hint=file_path in hinted)
+            
+            # 只有新分类的文件计入项目编号前缀索引（复用的结果和相同内容的副本不重复计数，
+            # 由前缀索引本身给出的结果不计入，避免错误的前缀自我强化）
+            for file_path in to_classify:
+                if file_path not in hinted:
+                    self.classifier.code_index.learn(file_path, results.get(file_path))
             
             self.statusBar().showMessage("分类完成")
             QMessageBox.information(
                 self,
                 "分类完成",
-                f"成功分类 {len(results)} 个文件\n使用方法: {method_name}"
+                f"成功分类 {len(results)} 个文件（其中 {reused_count} 个内容重复，复用已有结果）\n使用方法: {method_name}"
             )
             
             # 刷新界面
@@ -801,6 +880,42 @@ class MainWindow(QMainWindow):
             
             self.file_table.setCellWidget(row, 4, btn_widget)
     
+    def on_file_double_clicked(self, row, column):
+        """双击文件行时显示文件详情（分类理由按需生成）"""
+        path_item = self.file_table.item(row, 1)
+        if path_item is None:
+            return
+        self.show_file_details(path_item.text())
+    
+    def show_file_details(self, file_path):
+        """显示文件详情"""
+        file_info = self.file_manager.get_file(file_path)
+        if not file_info:
+            return
+        
+        reason = file_info.get('reason')
+        if not reason:
+            # 第一次查看时生成理由，并保存到文件记录中
+            self.statusBar().showMessage("正在生成分类理由...")
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            try:
+                reason = self.classifier.explain_record(self.file_manager, file_path)
+            finally:
+                QApplication.restoreOverrideCursor()
+            self.statusBar().showMessage("")
+        
+        similarity_score = file_info.get('similarity_score')
+        score_text = f"{similarity_score:.2%}" if similarity_score is not None else "-"
+        QMessageBox.information(
+            self,
+            "文件详情",
+            f"文件名：{file_info['file_name']}\n"
+            f"原路径：{file_info['original_path']}\n"
+            f"分类：{file_info['category']}\n"
+            f"相似度：{score_text}\n\n"
+            f"分类理由：\n{reason or '无法生成分类理由'}"
+        )
+    
     def open_file(self, file_path):
         """打开文件"""
         import subprocess
@@ -853,6 +968,11 @@ class MainWindow(QMainWindow):
         """窗口关闭事件，确保关闭数据库连接"""
         if hasattr(self, 'classifier') and self.classifier:
             self.classifier.close()
+        if hasattr(self, 'file_hasher'):
+            self.file_hasher.close()
+        if hasattr(self, 'file_manager'):
+            self.file_manager.close()
+        close_pool()
         event.accept()
 
 